@@ -14,12 +14,125 @@ class Config:
     DB_NAME = os.environ.get("DB_NAME")
     DB_USER = os.environ.get("DB_USER")
     DB_PASS = os.environ.get("DB_PASS")
+    # Timeout por sentencia y deadline total de la petición HTTP
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30000))
+    REQUEST_TIMEOUT_S = float(os.environ.get("REQUEST_TIMEOUT_S", 60))
+    # Cada cuánto se comprueba si el cliente se desconectó durante una consulta
+    DB_DISCONNECT_POLL_S = float(os.environ.get("DB_DISCONNECT_POLL_S", 0.5))
+
+    # Nodos (JSON): [{"name", "role": "primary"|"replica", "dsn" o host/port/...}]
+    # Sin DB_NODES se usa un único primario con DB_HOST/DB_PORT/...
+    DB_NODES = os.environ.get("DB_NODES", "")
+    DB_ROUTING_STRATEGY = os.environ.get("DB_ROUTING_STRATEGY", "least_loaded")  # o round_robin
+    # Destino de las consultas de catálogo (esquema) y del SQL generado: primary | replica
+    DB_CATALOG_ROUTE = os.environ.get("DB_CATALOG_ROUTE", "replica")
+    DB_READ_ROUTE = os.environ.get("DB_READ_ROUTE", "replica")
+    DB_MAX_REPLICA_LAG_S = float(os.environ.get("DB_MAX_REPLICA_LAG_S", 30))
+    DB_HEALTH_CHECK_INTERVAL_S = float(os.environ.get("DB_HEALTH_CHECK_INTERVAL_S", 15))
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    # Sentencias preparadas por forma de SQL (literales como parámetros), por conexión
+    DB_PREPARED_STATEMENTS = (
+        os.environ.get("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+    )
+    DB_PREPARED_CACHE_SIZE = int(os.environ.get("DB_PREPARED_CACHE_SIZE", 100))
 
     # AWS Bedrock
     PROFILE_ARN = os.environ.get("PROFILE_ARN", "tu_profile_arn_here")
     AWS_REGION = os.environ.get("AWS_REGION", "us-east-2")
+    # Endpoint alternativo de bedrock-runtime (p. ej. el doble de benchmarks/loadtest)
+    BEDROCK_ENDPOINT_URL = os.environ.get("BEDROCK_ENDPOINT_URL") or None
+    BEDROCK_STREAMING = (
+        os.environ.get("BEDROCK_STREAMING", "true").lower() == "true"
+    )
+
+    # Gráficos: por defecto el código se genera localmente con plantillas y el
+    # LLM solo elige los ejes. LLM_CHART_CODE=true vuelve a pedir chart_code al modelo.
+    LLM_CHART_CODE = os.environ.get("LLM_CHART_CODE", "false").lower() == "true"
+    BEDROCK_MAX_TOKENS = int(
+        os.environ.get("BEDROCK_MAX_TOKENS", 2500 if LLM_CHART_CODE else 800)
+    )
+
+    # Costo por 1K tokens (USD) para la contabilidad de uso de Bedrock
+    BEDROCK_INPUT_COST_PER_1K = float(os.environ.get("BEDROCK_INPUT_COST_PER_1K", 0.003))
+    BEDROCK_OUTPUT_COST_PER_1K = float(os.environ.get("BEDROCK_OUTPUT_COST_PER_1K", 0.015))
+    BEDROCK_CACHE_READ_COST_PER_1K = float(os.environ.get("BEDROCK_CACHE_READ_COST_PER_1K", 0.0003))
+    BEDROCK_CACHE_WRITE_COST_PER_1K = float(os.environ.get("BEDROCK_CACHE_WRITE_COST_PER_1K", 0.00375))
+    # Alerta de prompt inflado: tokens de entrada por llamada (0 = desactivada)
+    PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 6000))
+
+    # Cassette de respuestas de Bedrock (JSONL) para reproducir tráfico real:
+    # "record" guarda cada respuesta; "replay" responde desde el archivo sin
+    # llamar a Bedrock (benchmarks/replay.py). Vacío = desactivado
+    BEDROCK_CASSETTE_PATH = os.environ.get("BEDROCK_CASSETTE_PATH", "")
+    BEDROCK_CASSETTE_MODE = os.environ.get("BEDROCK_CASSETTE_MODE", "record")  # record | replay
+    # En replay, esperar la duración grabada de cada llamada
+    BEDROCK_CASSETTE_DELAY = (
+        os.environ.get("BEDROCK_CASSETTE_DELAY", "false").lower() == "true"
+    )
 
     # Security
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
+    # Token de los endpoints /admin (header X-Admin-Token). Vacío = desactivados
+    ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+    # Profiler por muestreo bajo demanda (POST /admin/profile)
+    PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", 5))
+    PROFILER_MAX_SECONDS = float(os.environ.get("PROFILER_MAX_SECONDS", 300))
+
+    # Guardia de costo (EXPLAIN) antes de ejecutar SQL generado
+    QUERY_COST_GUARD = os.environ.get("QUERY_COST_GUARD", "true").lower() == "true"
+    QUERY_COST_ACTION = os.environ.get("QUERY_COST_ACTION", "reject")  # reject | warn
+    QUERY_MAX_TOTAL_COST = float(os.environ.get("QUERY_MAX_TOTAL_COST", 500000))
+    QUERY_MAX_ROWS = int(os.environ.get("QUERY_MAX_ROWS", 5000000))
+    QUERY_LARGE_TABLE_ROWS = int(os.environ.get("QUERY_LARGE_TABLE_ROWS", 1000000))
+    QUERY_REJECT_LARGE_SEQ_SCANS = (
+        os.environ.get("QUERY_REJECT_LARGE_SEQ_SCANS", "false").lower() == "true"
+    )
+
+    # Paginación de resultados (primera página inline + cursor)
+    RESULT_PAGE_SIZE = int(os.environ.get("RESULT_PAGE_SIZE", 100))
+    RESULT_MAX_ROWS = int(os.environ.get("RESULT_MAX_ROWS", 10000))
+    RESULT_CACHE_TTL_S = int(os.environ.get("RESULT_CACHE_TTL_S", 600))
+    RESULT_CACHE_MAX_ROWS = int(os.environ.get("RESULT_CACHE_MAX_ROWS", 500000))
+
+    # Validación local de tablas/columnas contra el esquema cacheado
+    SCHEMA_CHECK = os.environ.get("SCHEMA_CHECK", "true").lower() == "true"
+
+    # Analytics de consultas: historial acotado e instantáneas (0 = sin instantáneas)
+    ANALYTICS_HISTORY_SIZE = int(os.environ.get("ANALYTICS_HISTORY_SIZE", 1000))
+    ANALYTICS_TOP_K = int(os.environ.get("ANALYTICS_TOP_K", 50))
+    ANALYTICS_SNAPSHOT_INTERVAL_S = float(os.environ.get("ANALYTICS_SNAPSHOT_INTERVAL_S", 0))
+    ANALYTICS_SNAPSHOT_PATH = os.environ.get(
+        "ANALYTICS_SNAPSHOT_PATH", "data/analytics_snapshot.json"
+    )
+
+    # Trazas por petición (X-Request-ID, Server-Timing y un registro por petición)
+    TRACE_LOG = os.environ.get("TRACE_LOG", "true").lower() == "true"
+    # Solo se registran las peticiones que tardan al menos este tiempo
+    TRACE_MIN_DURATION_MS = float(os.environ.get("TRACE_MIN_DURATION_MS", 0))
 
     CONVERSATIONS_URL = os.getenv("CONVERSATIONS_URL")
+    # Escritura en segundo plano: lotes, reintentos y spool local si el servicio no responde
+    CONVERSATION_BATCH_SIZE = int(os.environ.get("CONVERSATION_BATCH_SIZE", 50))
+    CONVERSATION_FLUSH_INTERVAL_S = float(os.environ.get("CONVERSATION_FLUSH_INTERVAL_S", 0.2))
+    CONVERSATION_MAX_RETRIES = int(os.environ.get("CONVERSATION_MAX_RETRIES", 3))
+    CONVERSATION_RETRY_BACKOFF_S = float(os.environ.get("CONVERSATION_RETRY_BACKOFF_S", 0.5))
+    CONVERSATION_QUEUE_SIZE = int(os.environ.get("CONVERSATION_QUEUE_SIZE", 10000))
+    CONVERSATION_SPOOL_PATH = os.environ.get(
+        "CONVERSATION_SPOOL_PATH", "data/conversation_spool.jsonl"
+    )
+    # Gráficos y resultados grandes como artefactos (la conversación guarda la referencia)
+    CONVERSATION_ARTIFACTS = (
+        os.environ.get("CONVERSATION_ARTIFACTS", "true").lower() == "true"
+    )
+    ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "data/artifacts")
+    ARTIFACT_MAX_BYTES = int(os.environ.get("ARTIFACT_MAX_BYTES", 1024 * 1024 * 1024))
+    ARTIFACT_MAX_ITEM_BYTES = int(os.environ.get("ARTIFACT_MAX_ITEM_BYTES", 50 * 1024 * 1024))
+    ARTIFACT_PREVIEW_ROWS = int(os.environ.get("ARTIFACT_PREVIEW_ROWS", 20))
+    # URL pública de esta API para armar los enlaces (vacío = rutas relativas)
+    ARTIFACT_BASE_URL = os.environ.get("ARTIFACT_BASE_URL", "")
+
+    # Batch (/rag/nl-to-sql/batch)
+    BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", 500))
+    BATCH_BEDROCK_CONCURRENCY = int(os.environ.get("BATCH_BEDROCK_CONCURRENCY", 4))
+    BATCH_DB_CONCURRENCY = int(os.environ.get("BATCH_DB_CONCURRENCY", 8))
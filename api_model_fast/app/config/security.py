@@ -0,0 +1,34 @@
+"""
+Autenticación de los endpoints de administración (/admin).
+
+Se habilitan con ADMIN_TOKEN y se autentican con el header X-Admin-Token. Sin
+token configurado responden 404, como si no existieran.
+"""
+
+import hmac
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+from app.config.config import Config
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+async def require_admin(
+    x_admin_token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER)
+) -> None:
+    """Dependencia de FastAPI: exige el token de administración"""
+    if not Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(
+        x_admin_token.encode(), Config.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=401,
+            detail={
+                "error": "Token de administración inválido",
+                "status": "error",
+                "error_type": "unauthorized",
+            },
+        )
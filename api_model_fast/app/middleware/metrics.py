@@ -0,0 +1,45 @@
+import time
+
+from app.utils.metrics import REQUEST_DURATION, REQUESTS_IN_FLIGHT
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: peticiones en curso y duración por ruta. La duración
+    incluye el envío completo del cuerpo (respuestas en streaming)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            # Plantilla de la ruta (no la URL) para acotar la cardinalidad
+            route = scope.get("route")
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status["code"]),
+            )
+
+
+# Configurar en main.py
+def setup_metrics(app):
+    app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,46 @@
+import time
+
+from app.utils.profiler import profiler
+
+# Las rutas de administración no se perfilan (el propio POST /admin/profile espera)
+EXCLUDED_PREFIX = "/admin"
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI: con una sesión del profiler activa, registra el inicio y la
+    latencia de cada petición para el filtro por ruta, latencia o número de
+    peticiones. Sin sesión solo cuesta una comprobación
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        session = profiler.session
+        if (
+            scope["type"] != "http"
+            or session is None
+            or scope["path"].startswith(EXCLUDED_PREFIX)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        token = session.request_started(scope["path"])
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Las tareas e hilos que lance la petición heredan su token
+        bound = profiler.bind_request(session, token)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.unbind_request(bound)
+            session.request_finished(token, (time.perf_counter() - start) * 1000)
+
+
+# Configurar en main.py
+def setup_profiling(app):
+    app.add_middleware(ProfilingMiddleware)
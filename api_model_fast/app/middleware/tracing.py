@@ -0,0 +1,58 @@
+import logging
+import time
+
+from app.config.config import Config
+from app.utils.serialization import dumps
+from app.utils.tracing import REQUEST_ID_HEADER, new_request_id, server_timing, start_trace
+
+trace_logger = logging.getLogger("app.trace")
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI: asigna o propaga X-Request-ID, abre la traza de la petición,
+    agrega los headers X-Request-ID y Server-Timing a la respuesta y registra un
+    resumen compacto de la traza al terminar
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")
+        request_id = new_request_id(incoming)
+        trace = start_trace(request_id, f"{scope['method']} {scope['path']}")
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                total_ms = (time.perf_counter() - start) * 1000
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (REQUEST_ID_HEADER.lower().encode(), request_id.encode()),
+                    (b"server-timing", server_timing(trace, total_ms).encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            trace.root.end = time.perf_counter()
+            response_time = trace.root.end - start
+            if Config.TRACE_LOG and response_time * 1000 >= Config.TRACE_MIN_DURATION_MS:
+                trace_logger.info(
+                    dumps({**trace.to_dict(), "status": status["code"]}).decode(),
+                    extra={"request_id": request_id, "response_time": response_time},
+                )
+
+
+# Configurar en main.py
+def setup_tracing(app):
+    app.add_middleware(TracingMiddleware)
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+
+from app.config.config import Config
+from app.config.security import require_admin
+from app.services.query_analytics import query_analytics
+from app.utils.exceptions import ProfilerBusyError, exception_to_dict
+from app.utils.profiler import profiler
+from app.utils.serialization import JSONBytesResponse, dumps
+
+# Crear el router de FastAPI (todas las rutas exigen X-Admin-Token)
+admin_router = APIRouter(
+    prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)]
+)
+
+
+@admin_router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    request: Request,
+    seconds: float = Query(10, gt=0, description="Duración máxima de la sesión"),
+    requests: Optional[int] = Query(
+        None, ge=1, description="Terminar tras N peticiones (que cumplan el filtro)"
+    ),
+    path: Optional[str] = Query(None, description="Perfilar solo rutas con este prefijo"),
+    min_latency_ms: float = Query(
+        0, ge=0, description="Conservar solo muestras de peticiones más lentas que esto"
+    ),
+    interval_ms: float = Query(None, ge=1, le=1000, description="Intervalo de muestreo"),
+    include_idle: bool = Query(False, description="Incluir hilos ociosos"),
+):
+    """
+    Perfila el worker que atiende la petición y devuelve las pilas en formato
+    collapsed (flamegraph.pl, speedscope, inferno).
+
+    La sesión termina al vencer `seconds` (acotado por PROFILER_MAX_SECONDS), al
+    completarse `requests` peticiones o si el cliente se desconecta. Con varios
+    workers, cada llamada perfila solo al que la recibe (header X-Profile-Pid).
+    """
+    options = {
+        "seconds": min(seconds, Config.PROFILER_MAX_SECONDS),
+        "max_requests": requests,
+        "path_prefix": path,
+        "min_latency_ms": min_latency_ms,
+        "include_idle": include_idle,
+    }
+    if interval_ms is not None:
+        options["interval_ms"] = interval_ms
+
+    try:
+        session = profiler.start(**options)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=exception_to_dict(e))
+
+    try:
+        while not session.done.is_set():
+            if await request.is_disconnected():
+                break
+            await asyncio.sleep(0.2)
+    finally:
+        profiler.stop(session)
+
+    summary = session.summary()
+    filename = time.strftime("profile-%Y%m%d-%H%M%S.collapsed", time.gmtime(session.started_at))
+    return PlainTextResponse(
+        session.collapsed(),
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Pid": str(os.getpid()),
+            "X-Profile-Samples": str(summary["samples"]),
+            "X-Profile-Requests": f"{summary['requests_kept']}/{summary['requests_seen']}",
+            "X-Profile-Duration": str(summary["duration_s"]),
+        },
+    )
+
+
+@admin_router.get("/analytics/recent")
+async def recent_queries(
+    limit: int = Query(
+        20, ge=1, le=Config.ANALYTICS_HISTORY_SIZE, description="Últimas consultas a devolver"
+    ),
+):
+    """Últimas consultas registradas (pregunta y SQL generado de cualquier usuario)"""
+    return JSONBytesResponse(dumps({"recent": query_analytics.recent(limit)}))
@@ -1,6 +1,10 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 
+from app.services.conversation_service import conversation_writer
+from app.services.database_service import db_service
+from app.services.statement_cache import statement_stats
+
 # Crear el router de FastAPI
 health_router = APIRouter(tags=["Health"])
 
@@ -15,4 +19,19 @@ async def health_check():
     return {
         "status": "OK", 
         "message": "API funcionando correctamente"
-    }
\ No newline at end of file
+    }
+
+
+@health_router.get("/health/db")
+async def database_health():
+    """Estado de los nodos de base de datos: salud, retraso de réplicas, pools y sentencias preparadas"""
+    return {
+        **db_service.router.get_stats(),
+        "prepared_statements": statement_stats.get_stats(),
+    }
+
+
+@health_router.get("/health/conversations")
+async def conversations_health():
+    """Estado del escritor de conversaciones: cola, reintentos y spool"""
+    return conversation_writer.get_stats()
@@ -0,0 +1,86 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.routes.rag_api import pipeline_flight
+from app.services.database_service import db_service
+from app.services.result_cache import result_cache
+from app.services.sql_analyzer import analyze_sql
+from app.services.statement_cache import statement_stats
+from app.utils.logging_config import get_logging_stats
+from app.utils.metrics import registry
+
+# Crear el router de FastAPI
+metrics_router = APIRouter(tags=["Metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _pool_connections():
+    return {
+        (node.name, node.role, state): value
+        for node in db_service.router.nodes
+        for state, value in (("in_use", node.in_use), ("idle", len(node.idle)))
+    }
+
+
+def _cache_events():
+    analysis = analyze_sql.cache_info()
+    prepared = statement_stats.get_stats()
+    flight = pipeline_flight.get_stats()
+    return {
+        ("sql_analysis", "hit"): analysis.hits,
+        ("sql_analysis", "miss"): analysis.misses,
+        ("prepared_statement", "hit"): prepared["hits"],
+        ("prepared_statement", "miss"): prepared["misses"],
+        ("single_flight", "hit"): flight["suppressed"],
+        ("single_flight", "miss"): flight["executions"],
+    }
+
+
+def _dropped_logs():
+    stats = get_logging_stats()
+    return {("queue_full",): stats["dropped"], ("sampled",): stats["sampled_out"]}
+
+
+registry.callback(
+    "db_pool_connections",
+    "Conexiones por nodo y estado",
+    _pool_connections,
+    ("node", "role", "state"),
+)
+registry.callback(
+    "db_node_healthy",
+    "1 si el nodo está disponible",
+    lambda: {(node.name,): int(node.healthy) for node in db_service.router.nodes},
+    ("node",),
+)
+registry.callback(
+    "rag_cache_events_total",
+    "Aciertos y fallos de cachés",
+    _cache_events,
+    ("cache", "result"),
+    kind="counter",
+)
+registry.callback(
+    "result_cache_rows",
+    "Filas guardadas en la caché de resultados paginados",
+    lambda: result_cache.get_stats()["cached_rows"],
+)
+registry.callback(
+    "log_queue_size",
+    "Logs pendientes en la cola del listener",
+    lambda: get_logging_stats()["queue_size"],
+)
+registry.callback(
+    "log_records_dropped_total",
+    "Logs descartados por cola llena o por muestreo",
+    _dropped_logs,
+    ("reason",),
+    kind="counter",
+)
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,21 +1,35 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Any
+from typing import Annotated, Awaitable, Callable, Dict, Any, List, Optional, Tuple
 import pandas as pd
+import asyncio
 import time
 
+from app.config.config import Config
+
 from app.services.enhanced_bedrock_service import EnhancedBedrockService
 from app.services.database_service import db_service
 from app.services.chart_service import chart_service
 from app.services.security_validator import SQLSecurityValidator, get_security_validator
-from app.services.conversation_service import save_conversation
+from app.services.schema_checker import get_schema_checker
+from app.services.result_cache import result_cache
+from app.services.artifact_store import artifact_store
+from app.services.conversation_service import CONVERSATION_ID_PATTERN, save_conversation
 from app.utils.exceptions import (
     DatabaseError,
     BedrockError,
+    QueryCancelledError,
+    QueryTimeoutError,
     RAGError,
+    SchemaReferenceError,
     SecurityValidationError,
+    ValidationError,
 )
 from app.utils.logging_config import log_rag_success, log_rag_error
+from app.utils.metrics import count_error, track_stage
+from app.utils.serialization import JSONBytesResponse, PreEncodedDict, dumps
+from app.utils.single_flight import SingleFlight
 
 # Crear el router de FastAPI
 rag_router = APIRouter(prefix="/rag", tags=["RAG"])
@@ -24,6 +38,10 @@ rag_router = APIRouter(prefix="/rag", tags=["RAG"])
 _rag_service = None
 
 
+# Coalescencia de preguntas idénticas en curso (dashboards que disparan la misma consulta)
+pipeline_flight = SingleFlight("rag_pipeline")
+
+
 def get_rag_service() -> EnhancedBedrockService:
     """Obtiene la instancia singleton del servicio RAG"""
     global _rag_service
@@ -37,12 +55,471 @@ class NLToSQLRequest(BaseModel):
     pregunta: str = Field(
         ..., min_length=1, max_length=500, description="Pregunta en lenguaje natural"
     )
-    id: str | None = None
+    id: str | None = Field(
+        None,
+        pattern=CONVERSATION_ID_PATTERN,
+        description="ID de la conversación (ObjectId de 24 caracteres hexadecimales)",
+    )
+
+
+class PaginationInfo(BaseModel):
+    offset: int
+    page_size: int
+    returned_rows: int
+    total_rows: int
+    truncated: bool
+    has_more: bool
+    next_cursor: Optional[str] = None
+    expires_in: int
+
+
+class QueryResults(BaseModel):
+    columns: List[str] = []
+    data: List[List[Any]] = []
+    pagination: Optional[PaginationInfo] = None
+    # Operaciones sin filas
+    rows_affected: Optional[int] = None
+    message: Optional[str] = None
+
+
+class VisualizationInfo(BaseModel):
+    needs_chart: bool
+    chart_type: str
+    detection_confidence: float
+
+
+class ChartInfo(BaseModel):
+    needs_chart: bool
+    chart_generated: bool
+    chart_type: Optional[str] = None
+    chart_image: Optional[str] = Field(None, description="PNG como data URI")
+    chart_code: Optional[str] = None
+    reason: Optional[str] = None
+    error: Optional[str] = None
+
+
+class NLToSQLResponse(BaseModel):
+    id: Optional[str] = Field(None, alias="_id", description="ID de la conversación")
+    pregunta: str
+    sql_generado: str
+    confidence_score: float
+    tables_used: List[str]
+    title: str
+    resultados: QueryResults
+    rag_enhanced: bool
+    visualization: VisualizationInfo
+    chart: ChartInfo
+    status: str
+    response_time: float
+
+
+class NLToSQLBatchRequest(BaseModel):
+    preguntas: List[Annotated[str, Field(min_length=1, max_length=500)]] = Field(
+        ...,
+        min_length=1,
+        max_length=Config.BATCH_MAX_QUESTIONS,
+        description="Preguntas en lenguaje natural",
+    )
+    persist: bool = Field(
+        False, description="Guardar cada resultado en el servicio de conversaciones"
+    )
+    stream: bool = Field(
+        True, description="Devolver cada resultado (NDJSON) a medida que termina"
+    )
+
+
+def _resolve_future(future: asyncio.Future, value: Any) -> None:
+    """Resuelve un future si todavía no tiene resultado"""
+    if not future.done():
+        future.set_result(value)
+
+
+async def _run_limited(semaphore: Optional[asyncio.Semaphore], func, *args):
+    """Ejecuta una función bloqueante en un hilo, respetando un límite de concurrencia"""
+    if semaphore is None:
+        return await asyncio.to_thread(func, *args)
+    async with semaphore:
+        return await asyncio.to_thread(func, *args)
+
+
+def _discard(task: asyncio.Future) -> None:
+    """Cancela una tarea que ya no se usará, consumiendo su excepción si la tuvo"""
+    task.cancel()
+    # La tarea puede terminar con un error en vez de cancelada (ya había fallado, o
+    # falla al atender la cancelación): nadie la espera, así que se consume aquí
+    # para que asyncio no avise "Task exception was never retrieved"
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+
+def _statement_timeout_ms(sql_query: str, deadline: Optional[float]) -> int:
+    """statement_timeout para la consulta: el menor entre la config y el deadline"""
+    timeout_ms = Config.DB_STATEMENT_TIMEOUT_MS
+    if deadline is None:
+        return timeout_ms
+
+    remaining_ms = int((deadline - time.time()) * 1000)
+    if remaining_ms <= 0:
+        raise QueryTimeoutError(
+            "Se agotó el tiempo de la petición antes de ejecutar la consulta",
+            sql_query=sql_query,
+            timeout_ms=0,
+        )
+    return min(timeout_ms, remaining_ms) if timeout_ms else remaining_ms
+
+
+async def _generate_and_execute(
+    pregunta: str,
+    rag_service: EnhancedBedrockService,
+    security_validator: SQLSecurityValidator,
+    enhanced_prompt: Optional[str] = None,
+    bedrock_limit: Optional[asyncio.Semaphore] = None,
+    db_limit: Optional[asyncio.Semaphore] = None,
+    deadline: Optional[float] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> Tuple[Dict[str, Any], str, Dict[str, Any]]:
+    """
+    Genera el SQL con Bedrock y lo ejecuta.
+
+    Con streaming, la validación y ejecución del SQL arrancan en cuanto el modelo
+    termina de emitir `sql_query`, mientras sigue generando el resto (chart_code).
+    Los semáforos opcionales limitan la concurrencia de cada etapa (modo batch).
+    La consulta usa como statement_timeout el mínimo entre DB_STATEMENT_TIMEOUT_MS
+    y el tiempo restante hasta `deadline`, y se cancela en PostgreSQL si el
+    cliente se desconecta.
+    """
+    loop = asyncio.get_running_loop()
+    sql_ready = loop.create_future()
+    schema_checker = get_schema_checker(rag_service.rag_pipeline.schema_selector)
+
+    def on_sql_ready(sql_query: str) -> None:
+        loop.call_soon_threadsafe(_resolve_future, sql_ready, sql_query)
+
+    def prepare_sql(sql_query: str) -> str:
+        with track_stage("sql_validation"):
+            # Validar seguridad de la consulta SQL
+            if not security_validator.validate_sql_query(sql_query):
+                raise SecurityValidationError("Consulta SQL no segura")
+
+            # Sanitizar consulta SQL
+            safe_sql_query = security_validator.sanitize_sql_query(sql_query)
+
+            # Verificar tablas y columnas contra el esquema cacheado (sin ir a la base)
+            if schema_checker is not None:
+                schema_checker.check(sql_query, pregunta)
+
+        # Rechazar consultas que exceden el presupuesto del planificador (EXPLAIN)
+        with track_stage("cost_check"):
+            security_validator.check_query_cost(safe_sql_query, pregunta)
+
+        return safe_sql_query
+
+    async def run_sql(sql_query: str) -> Tuple[str, Dict[str, Any]]:
+        safe_sql_query = await asyncio.to_thread(prepare_sql, sql_query)
+
+        # Ejecutar SQL con el tiempo que queda hasta el deadline de la petición
+        with track_stage("db_execution"):
+            resultados_db = await db_service.execute_query_cancellable(
+                safe_sql_query,
+                timeout_ms=_statement_timeout_ms(safe_sql_query, deadline),
+                is_disconnected=is_disconnected,
+                prepared=Config.DB_PREPARED_STATEMENTS,
+            )
+        return safe_sql_query, resultados_db
+
+    async def validate_and_execute(sql_query: str) -> Tuple[str, Dict[str, Any]]:
+        if db_limit is None:
+            return await run_sql(sql_query)
+        async with db_limit:
+            return await run_sql(sql_query)
+
+    generation = asyncio.ensure_future(
+        _run_limited(
+            bedrock_limit,
+            rag_service.nl_to_sql_with_rag,
+            pregunta,
+            on_sql_ready,
+            enhanced_prompt,
+        )
+    )
+    await asyncio.wait({generation, sql_ready}, return_when=asyncio.FIRST_COMPLETED)
+
+    execution = None
+    if sql_ready.done():
+        execution = asyncio.ensure_future(
+            validate_and_execute(sql_ready.result())
+        )
+
+    try:
+        resultado = await generation
+    except Exception:
+        if execution is not None:
+            _discard(execution)
+        raise
+    finally:
+        sql_ready.cancel()
+
+    # Sin streaming, o si el parseo final difiere del SQL anticipado, ejecutar ahora
+    if execution is None:
+        execution = asyncio.ensure_future(
+            validate_and_execute(resultado["sql_query"])
+        )
+    elif sql_ready.result() != resultado["sql_query"]:
+        _discard(execution)
+        execution = asyncio.ensure_future(
+            validate_and_execute(resultado["sql_query"])
+        )
+
+    safe_sql_query, resultados_db = await execution
+    return resultado, safe_sql_query, resultados_db
+
+
+def _build_chart_data(
+    resultado: Dict[str, Any], resultados_db: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """Genera el gráfico de los resultados si la consulta lo requiere"""
+    if not (resultado.get("needs_chart") and resultados_db.get("data")):
+        return None
+
+    try:
+        # Crear DataFrame con los resultados
+        with track_stage("dataframe_build"):
+            df = pd.DataFrame(
+                resultados_db["data"], columns=resultados_db.get("columns", [])
+            )
+
+        # Generar gráfico (código local por plantilla salvo LLM_CHART_CODE)
+        if not df.empty:
+            chart_fields = resultado.get("chart_fields") or {}
+            with track_stage("chart_render"):
+                chart_code = chart_service.resolve_chart_code(
+                    df,
+                    resultado.get("chart_type"),
+                    chart_fields,
+                    resultado.get("title", ""),
+                )
+                chart_base64 = chart_service.generate_chart(
+                    df,
+                    {**chart_fields, "chart_code": chart_code},
+                )
+
+            return {
+                "needs_chart": True,
+                "chart_type": resultado.get("chart_type", "bar"),
+                "chart_image": f"data:image/png;base64,{chart_base64}",
+                "chart_code": chart_code,
+                "chart_generated": True,
+            }
+
+        return {
+            "needs_chart": True,
+            "chart_type": resultado.get("chart_type", "bar"),
+            "chart_generated": False,
+            "reason": "No hay datos suficientes para generar el gráfico",
+        }
+    except Exception as chart_error:
+        return {
+            "needs_chart": True,
+            "chart_type": resultado.get("chart_type", "bar"),
+            "chart_generated": False,
+            "error": str(chart_error),
+        }
+
+
+async def _run_pipeline(
+    pregunta: str,
+    rag_service: EnhancedBedrockService,
+    security_validator: SQLSecurityValidator,
+    start_time: float,
+    enhanced_prompt: Optional[str] = None,
+    bedrock_limit: Optional[asyncio.Semaphore] = None,
+    db_limit: Optional[asyncio.Semaphore] = None,
+    deadline: Optional[float] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> Dict[str, Any]:
+    """Ejecuta el pipeline completo (RAG, Bedrock, SQL y gráfico) para una pregunta"""
+    # Usar servicio mejorado con RAG, ejecutando el SQL en cuanto esté disponible
+    resultado, safe_sql_query, resultados_db = await _generate_and_execute(
+        pregunta,
+        rag_service,
+        security_validator,
+        enhanced_prompt=enhanced_prompt,
+        bedrock_limit=bedrock_limit,
+        db_limit=db_limit,
+        deadline=deadline,
+        is_disconnected=is_disconnected,
+    )
+
+    # Preparar datos para gráfico si es necesario
+    chart_data = _build_chart_data(resultado, resultados_db)
+
+    # Construir respuesta completa
+    response_time = time.time() - start_time
+    response = {
+        "pregunta": pregunta,
+        "sql_generado": safe_sql_query,
+        "confidence_score": resultado.get("confidence_score", 0.0),
+        "tables_used": resultado.get("tables_used", []),
+        "title": resultado.get("title", ""),
+        # Primera página inline; el resto queda en caché detrás de un cursor.
+        # Se serializa una vez y los bytes se reutilizan en la respuesta y al persistir
+        "resultados": PreEncodedDict(result_cache.paginate(resultados_db)),
+        "rag_enhanced": True,
+        "visualization": {
+            "needs_chart": resultado.get("needs_chart", False),
+            "chart_type": resultado.get("chart_type", "none"),
+            "detection_confidence": resultado.get("confidence_score", 0.0),
+        },
+        "status": "success",
+        "response_time": round(response_time, 3),
+    }
+
+    # Agregar datos del gráfico si existe
+    if chart_data:
+        response["chart"] = chart_data
+    else:
+        response["chart"] = {"needs_chart": False, "chart_generated": False}
+
+    # Log exitoso
+    log_rag_success(
+        pregunta=pregunta,
+        sql_query=safe_sql_query,
+        confidence=resultado.get("confidence_score", 0.0),
+        time_taken=response_time,
+        schema_tables=resultado.get("schema_tables"),
+        tables_used=resultado.get("tables_used", []),
+        chart_type=resultado.get("chart_type", "none"),
+    )
+
+    return response
+
+
+def _single_flight_key(pregunta: str, rag_service: EnhancedBedrockService) -> str:
+    """Clave de coalescencia: pregunta normalizada + versión del esquema"""
+    normalized = " ".join(pregunta.lower().split()).strip(" ¿?¡!.")
+    schema_version = rag_service.rag_pipeline.schema_selector.schema_version
+    return f"{schema_version}:{normalized}"
+
+
+class _WaitingClients:
+    """Clientes que esperan una misma ejecución coalescida"""
+
+    def __init__(self):
+        self.checks: List[Callable[[], Awaitable[bool]]] = []
+
+    async def all_disconnected(self) -> bool:
+        """True solo si ya no queda ningún cliente esperando el resultado"""
+        for check in list(self.checks):
+            if not await check():
+                return False
+        return True
 
 
-@rag_router.post("/nl-to-sql", response_model=Dict[str, Any])
+_waiting_clients: Dict[str, _WaitingClients] = {}
+
+
+async def _run_pipeline_coalesced(
+    pregunta: str,
+    rag_service: EnhancedBedrockService,
+    security_validator: SQLSecurityValidator,
+    start_time: float,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    **pipeline_kwargs,
+) -> Dict[str, Any]:
+    """
+    Ejecuta el pipeline compartiendo una única ejecución entre peticiones idénticas
+    concurrentes. Cada llamador recibe su propia copia superficial de la respuesta
+    (con su pregunta y tiempo), de modo que `_id` y la conversación son independientes.
+    La consulta compartida solo se cancela cuando todos los clientes se desconectaron.
+    """
+    key = _single_flight_key(pregunta, rag_service)
+    clients = _waiting_clients.setdefault(key, _WaitingClients())
+    if is_disconnected is not None:
+        clients.checks.append(is_disconnected)
+
+    try:
+        shared_response, _ = await pipeline_flight.do(
+            key,
+            lambda: _run_pipeline(
+                pregunta,
+                rag_service,
+                security_validator,
+                start_time,
+                is_disconnected=clients.all_disconnected if clients.checks else None,
+                **pipeline_kwargs,
+            ),
+        )
+    finally:
+        if is_disconnected is not None:
+            clients.checks.remove(is_disconnected)
+        if not clients.checks and _waiting_clients.get(key) is clients:
+            del _waiting_clients[key]
+
+    return {
+        **shared_response,
+        "pregunta": pregunta,
+        "response_time": round(time.time() - start_time, 3),
+    }
+
+
+def _error_response(e: Exception) -> Tuple[int, Dict[str, Any]]:
+    """Traduce una excepción del pipeline a (status HTTP, detalle del error)"""
+    if isinstance(e, SecurityValidationError):
+        return 400, {
+            "error": f"Error de validación de seguridad: {str(e)}",
+            "status": "error",
+            "error_type": "security_validation_error",
+            "operation": e.operation,
+            "dangerous_pattern": e.dangerous_pattern,
+        }
+    if isinstance(e, SchemaReferenceError):
+        return 422, {
+            "error": f"Referencias inválidas en el SQL generado: {e.message}",
+            "status": "error",
+            "error_type": "schema_reference_error",
+            "unknown_tables": e.details["unknown_tables"],
+            "unknown_columns": e.details["unknown_columns"],
+        }
+    if isinstance(e, QueryTimeoutError):
+        return 504, {
+            "error": f"La consulta excedió el tiempo máximo: {str(e)}",
+            "status": "error",
+            "error_type": "query_timeout",
+        }
+    if isinstance(e, QueryCancelledError):
+        return 499, {
+            "error": f"Consulta cancelada: {str(e)}",
+            "status": "error",
+            "error_type": "query_cancelled",
+        }
+    if isinstance(e, BedrockError):
+        return 500, {
+            "error": f"Error en el servicio de IA: {str(e)}",
+            "status": "error",
+            "error_type": "bedrock_error",
+        }
+    if isinstance(e, DatabaseError):
+        return 500, {
+            "error": f"Error en la base de datos: {str(e)}",
+            "status": "error",
+            "error_type": "database_error",
+        }
+    if isinstance(e, RAGError):
+        return 500, {
+            "error": f"Error en el sistema RAG: {str(e)}",
+            "status": "error",
+            "error_type": "rag_error",
+        }
+    return 500, {
+        "error": f"Error interno del servidor: {str(e)}",
+        "status": "error",
+        "error_type": "internal_error",
+    }
+
+
+@rag_router.post("/nl-to-sql", response_model=NLToSQLResponse)
 async def rag_natural_language_to_sql(
     request: NLToSQLRequest,
+    http_request: Request,
     rag_service: EnhancedBedrockService = Depends(get_rag_service),
     security_validator: SQLSecurityValidator = Depends(get_security_validator),
 ):
@@ -54,153 +531,185 @@ async def rag_natural_language_to_sql(
     conversation_id = request.id
 
     try:
-        # Usar servicio mejorado con RAG
-        resultado = rag_service.nl_to_sql_with_rag(pregunta)
+        response = await _run_pipeline_coalesced(
+            pregunta,
+            rag_service,
+            security_validator,
+            start_time,
+            deadline=start_time + Config.REQUEST_TIMEOUT_S,
+            is_disconnected=http_request.is_disconnected,
+        )
 
-        # Validar seguridad de la consulta SQL
-        if not security_validator.validate_sql_query(resultado["sql_query"]):
-            raise SecurityValidationError("Consulta SQL no segura")
+        response = await save_conversation(conversation_id, response)
 
-        # Sanitizar consulta SQL
-        safe_sql_query = security_validator.sanitize_sql_query(resultado["sql_query"])
+        # El modelo documenta la respuesta; se serializa con orjson sin revalidarla
+        return JSONBytesResponse(dumps(response))
 
-        # Ejecutar SQL
-        resultados_db = db_service.execute_query(safe_sql_query)
+    except Exception as e:
+        response_time = time.time() - start_time
+        log_rag_error(pregunta, f"{type(e).__name__}: {str(e)}", response_time)
+        status_code, detail = _error_response(e)
+        count_error(detail.get("error_type"))
+        raise HTTPException(status_code=status_code, detail=detail)
 
-        # Preparar datos para gráfico si es necesario
-        chart_data = None
-        if resultado.get("needs_chart") and resultados_db.get("data"):
-            try:
-                # Crear DataFrame con los resultados
-                df = pd.DataFrame(
-                    resultados_db["data"], columns=resultados_db.get("columns", [])
-                )
 
-                # Generar gráfico
-                if not df.empty and resultado.get("chart_fields"):
-                    chart_base64 = chart_service.generate_chart(
-                        df,
-                        resultado.get("chart_fields", {}),
-                    )
-
-                    chart_data = {
-                        "needs_chart": True,
-                        "chart_type": resultado.get("chart_type", "bar"),
-                        "chart_image": f"data:image/png;base64,{chart_base64}",
-                        "chart_code": resultado.get("chart_code", ""),
-                        "chart_generated": True,
-                    }
-                else:
-                    chart_data = {
-                        "needs_chart": True,
-                        "chart_type": resultado.get("chart_type", "bar"),
-                        "chart_generated": False,
-                        "reason": "No hay datos suficientes o código de gráfico faltante",
-                    }
-            except Exception as chart_error:
-                chart_data = {
-                    "needs_chart": True,
-                    "chart_type": resultado.get("chart_type", "bar"),
-                    "chart_generated": False,
-                    "error": str(chart_error),
-                }
-
-        # Construir respuesta completa
-        response_time = time.time() - start_time
-        response = {
-            "pregunta": pregunta,
-            "sql_generado": safe_sql_query,
-            "confidence_score": resultado.get("confidence_score", 0.0),
-            "tables_used": resultado.get("tables_used", []),
-            "title": resultado.get("title", ""),
-            "resultados": resultados_db,
-            "rag_enhanced": True,
-            "visualization": {
-                "needs_chart": resultado.get("needs_chart", False),
-                "chart_type": resultado.get("chart_type", "none"),
-                "detection_confidence": resultado.get("confidence_score", 0.0),
-            },
-            "status": "success",
-            "response_time": round(response_time, 3),
-        }
+@rag_router.post("/nl-to-sql/batch")
+async def rag_natural_language_to_sql_batch(
+    request: NLToSQLBatchRequest,
+    http_request: Request,
+    rag_service: EnhancedBedrockService = Depends(get_rag_service),
+    security_validator: SQLSecurityValidator = Depends(get_security_validator),
+):
+    """
+    Procesa varias preguntas en una sola petición.
 
-        # Agregar datos del gráfico si existe
-        if chart_data:
-            response["chart"] = chart_data
-        else:
-            response["chart"] = {"needs_chart": False, "chart_generated": False}
-
-        # Log exitoso
-        log_rag_success(
-            pregunta=pregunta,
-            sql_query=safe_sql_query,
-            confidence=resultado.get("confidence_score", 0.0),
-            time_taken=response_time,
+    Los prompts se generan por lotes (esquema cacheado y una pasada del detector de
+    gráficos) y las etapas de Bedrock y base de datos corren con concurrencia
+    limitada. Cada resultado incluye su `index` y, con `stream=true`, se envía como
+    una línea NDJSON en cuanto termina.
+    """
+    batch_start = time.time()
+    preguntas = [pregunta.strip() for pregunta in request.preguntas]
+
+    try:
+        prompts = await asyncio.to_thread(
+            rag_service.rag_pipeline.enhance_prompts_batch, preguntas
         )
+    except Exception as e:
+        log_rag_error(f"[batch x{len(preguntas)}]", f"{type(e).__name__}: {str(e)}")
+        status_code, detail = _error_response(e)
+        count_error(detail.get("error_type"))
+        raise HTTPException(status_code=status_code, detail=detail)
 
-        response = await save_conversation(conversation_id, response)
+    bedrock_limit = asyncio.Semaphore(Config.BATCH_BEDROCK_CONCURRENCY)
+    db_limit = asyncio.Semaphore(Config.BATCH_DB_CONCURRENCY)
 
-        return response
+    async def process_item(index: int, pregunta: str, prompt: str) -> Dict[str, Any]:
+        start_time = time.time()
+        try:
+            response = await _run_pipeline_coalesced(
+                pregunta,
+                rag_service,
+                security_validator,
+                start_time,
+                enhanced_prompt=prompt,
+                bedrock_limit=bedrock_limit,
+                db_limit=db_limit,
+                is_disconnected=http_request.is_disconnected,
+            )
+            if request.persist:
+                response = await save_conversation(None, response)
+            return {"index": index, "status": "success", "result": response}
+        except Exception as e:
+            log_rag_error(
+                pregunta, f"{type(e).__name__}: {str(e)}", time.time() - start_time
+            )
+            _, detail = _error_response(e)
+            count_error(detail.get("error_type"))
+            return {"index": index, "pregunta": pregunta, **detail}
 
-    except BedrockError as e:
-        response_time = time.time() - start_time
-        log_rag_error(pregunta, f"BedrockError: {str(e)}", response_time)
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": f"Error en el servicio de IA: {str(e)}",
-                "status": "error",
-                "error_type": "bedrock_error",
-            },
-        )
-    except DatabaseError as e:
-        response_time = time.time() - start_time
-        log_rag_error(pregunta, f"DatabaseError: {str(e)}", response_time)
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": f"Error en la base de datos: {str(e)}",
-                "status": "error",
-                "error_type": "database_error",
-            },
+    tasks = [
+        asyncio.ensure_future(process_item(index, pregunta, prompt))
+        for index, (pregunta, prompt) in enumerate(zip(preguntas, prompts))
+    ]
+
+    if request.stream:
+
+        async def stream_results():
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    item = await next_done
+                    yield dumps(item) + b"\n"
+            finally:
+                # Si el cliente se desconecta, no seguir procesando
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+    results = await asyncio.gather(*tasks)
+    succeeded = sum(1 for item in results if item["status"] == "success")
+
+    return JSONBytesResponse(
+        dumps(
+            {
+                "total": len(results),
+                "succeeded": succeeded,
+                "failed": len(results) - succeeded,
+                "results": results,
+                "response_time": round(time.time() - batch_start, 3),
+            }
         )
-    except RAGError as e:
-        response_time = time.time() - start_time
-        log_rag_error(pregunta, f"RAGError: {str(e)}", response_time)
+    )
+
+
+@rag_router.get("/analytics")
+async def query_analytics_summary(
+    rag_service: EnhancedBedrockService = Depends(get_rag_service),
+):
+    """Agregados de uso (confianza, tablas, gráficos); las consultas están en /admin"""
+    return JSONBytesResponse(dumps(rag_service.get_query_analytics()))
+
+
+@rag_router.get("/single-flight/stats")
+async def single_flight_stats():
+    """Contadores de coalescencia: ejecuciones reales y duplicados suprimidos"""
+    return pipeline_flight.get_stats()
+
+
+@rag_router.get("/results/{token}")
+async def get_result_page(token: str):
+    """Devuelve la siguiente página de un resultado a partir del cursor opaco"""
+    try:
+        page = result_cache.get_page(token)
+    except ValidationError as e:
         raise HTTPException(
-            status_code=500,
-            detail={
-                "error": f"Error en el sistema RAG: {str(e)}",
-                "status": "error",
-                "error_type": "rag_error",
-            },
+            status_code=400,
+            detail={"error": e.message, "status": "error", "error_type": "invalid_cursor"},
         )
-    except Exception as e:
-        response_time = time.time() - start_time
-        log_rag_error(pregunta, f"Exception: {str(e)}", response_time)
+
+    if page is None:
         raise HTTPException(
-            status_code=500,
+            status_code=410,
             detail={
-                "error": f"Error interno del servidor: {str(e)}",
+                "error": "El resultado expiró; vuelva a realizar la consulta",
                 "status": "error",
-                "error_type": "internal_error",
+                "error_type": "result_expired",
             },
         )
 
-    except SecurityValidationError as e:
-        response_time = time.time() - start_time
-        log_rag_error(pregunta, f"SecurityValidationError: {str(e)}", response_time)
+    return JSONBytesResponse(dumps({**page, "status": "success"}))
+
+
+@rag_router.get("/results-cache/stats")
+async def result_cache_stats():
+    """Ocupación de la caché de resultados paginados"""
+    return result_cache.get_stats()
+
+
+@rag_router.get("/artifacts/{digest}")
+async def get_artifact(digest: str):
+    """Sirve un gráfico o resultado guardado por las conversaciones (inmutable)"""
+    found = await asyncio.to_thread(artifact_store.get, digest)
+    if found is None:
         raise HTTPException(
-            status_code=400,
+            status_code=404,
             detail={
-                "error": f"Error de validación de seguridad: {str(e)}",
+                "error": "Artefacto inexistente o desalojado",
                 "status": "error",
-                "error_type": "security_validation_error",
-                "dangerous_pattern": e.dangerous_pattern,
+                "error_type": "artifact_not_found",
             },
         )
 
+    path, content_type = found
+    return FileResponse(
+        path,
+        media_type=content_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"{digest}"'},
+    )
+
 
-def get_security_validator() -> SQLSecurityValidator:
-    """Dependencia para el validador de seguridad SQL"""
-    return SQLSecurityValidator()
+@rag_router.get("/artifacts-store/stats")
+async def artifact_store_stats():
+    """Cantidad y tamaño de los artefactos guardados"""
+    return await asyncio.to_thread(artifact_store.get_stats)
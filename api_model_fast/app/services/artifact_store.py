@@ -0,0 +1,177 @@
+"""
+Almacén local de artefactos direccionado por contenido.
+
+Los gráficos (PNG) y los resultados (JSON) se guardan una sola vez bajo su
+SHA-256 en ARTIFACT_DIR y se sirven por `GET /rag/artifacts/{digest}`; las
+conversaciones guardan solo la referencia. El almacén está acotado por tamaño
+total (ARTIFACT_MAX_BYTES) y desaloja los artefactos menos usados.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config.config import Config
+from app.utils.logging_config import get_logger
+from app.utils.serialization import dumps
+
+logger = get_logger(__name__)
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "json": "application/json",
+}
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ArtifactStore:
+    """Archivos inmutables por digest con desalojo LRU por tamaño total"""
+
+    def __init__(
+        self,
+        root: str = None,
+        max_bytes: int = None,
+        max_item_bytes: int = None,
+        base_url: str = None,
+    ):
+        self.root = root or Config.ARTIFACT_DIR
+        self.max_bytes = max_bytes or Config.ARTIFACT_MAX_BYTES
+        self.max_item_bytes = max_item_bytes or Config.ARTIFACT_MAX_ITEM_BYTES
+        self.base_url = (Config.ARTIFACT_BASE_URL if base_url is None else base_url).rstrip("/")
+        self._lock = threading.Lock()
+        # digest -> (extensión, tamaño), del menos al más usado
+        self._index: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+
+    # ------------------------------------------------------------------
+    # Índice
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        """Reconstruye el índice desde el disco (orden LRU por fecha de acceso)"""
+        if self._loaded:
+            return
+        entries = []
+        if os.path.isdir(self.root):
+            for shard in os.scandir(self.root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    digest, _, ext = entry.name.partition(".")
+                    if DIGEST_PATTERN.match(digest) and ext in CONTENT_TYPES:
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, digest, ext, stat.st_size))
+        for _, digest, ext, size in sorted(entries):
+            self._index[digest] = (ext, size)
+            self._total_bytes += size
+        self._loaded = True
+
+    def _path(self, digest: str, ext: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.{ext}")
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def put(self, data: bytes, ext: str) -> Optional[Dict[str, Any]]:
+        """
+        Guarda un artefacto (idempotente) y devuelve su referencia
+
+        Returns:
+            Dict con artifact, url, content_type y size, o None si excede el tamaño máximo
+        """
+        if ext not in CONTENT_TYPES:
+            raise ValueError(f"Tipo de artefacto no soportado: {ext}")
+        if len(data) > self.max_item_bytes:
+            logger.debug(f"Artefacto de {len(data)} bytes excede ARTIFACT_MAX_ITEM_BYTES")
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._load()
+            if digest in self._index:
+                self._index.move_to_end(digest)
+            else:
+                path = self._path(digest, ext)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Escritura atómica: nunca se sirve un archivo a medias
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, "wb") as tmp:
+                    tmp.write(data)
+                os.replace(tmp_path, path)
+                self._index[digest] = (ext, len(data))
+                self._total_bytes += len(data)
+                self._evict()
+
+        return self.reference(digest, ext, len(data))
+
+    def put_json(self, obj: Any) -> Optional[Dict[str, Any]]:
+        return self.put(dumps(obj), "json")
+
+    def reference(self, digest: str, ext: str, size: int) -> Dict[str, Any]:
+        return {
+            "artifact": digest,
+            "url": f"{self.base_url}/rag/artifacts/{digest}",
+            "content_type": CONTENT_TYPES[ext],
+            "size": size,
+        }
+
+    def _evict(self) -> None:
+        # Se conserva al menos el artefacto recién guardado
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            digest, (ext, size) = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(digest, ext))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Artefacto {digest[:12]} desalojado por tamaño del almacén")
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def get(self, digest: str) -> Optional[Tuple[str, str]]:
+        """
+        Ruta y content type de un artefacto
+
+        Returns:
+            (ruta, content_type) o None si no existe o fue desalojado
+        """
+        if not DIGEST_PATTERN.match(digest):
+            return None
+        with self._lock:
+            self._load()
+            entry = self._index.get(digest)
+            if entry is None:
+                return None
+            self._index.move_to_end(digest)
+        ext, _ = entry
+        path = self._path(digest, ext)
+        try:
+            # La fecha de modificación conserva el orden LRU entre reinicios
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                if self._index.pop(digest, None):
+                    self._total_bytes -= entry[1]
+            return None
+        return path, CONTENT_TYPES[ext]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._load()
+            return {
+                "artifacts": len(self._index),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Instancia global del servicio
+artifact_store = ArtifactStore()
@@ -0,0 +1,165 @@
+"""
+Cassette de respuestas de Bedrock para reproducir tráfico real.
+
+En modo "record" cada llamada a Bedrock agrega una línea JSONL con la pregunta,
+el texto devuelto, el uso de tokens, la duración y la huella del prompt; la
+primera vez que aparece una versión del esquema se guarda también el esquema
+extraído (para levantar un catálogo equivalente sin la base de producción). En
+modo "replay" las respuestas salen del archivo, sin llamar a Bedrock: es lo que
+usa `benchmarks/replay.py` para volver a pasar preguntas de los logs por el
+pipeline y comparar tablas, SQL y latencias.
+
+Las entradas se buscan por la pregunta normalizada, no por el prompt: si el
+prompt cambió (otra selección de tablas, otras instrucciones) la respuesta
+grabada se reutiliza igual y el cambio queda anotado en la traza.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.config.config import Config
+from app.utils.exceptions import BedrockError
+from app.utils.logging_config import get_logger
+from app.utils.tracing import annotate
+
+logger = get_logger(__name__)
+
+
+def cassette_key(pregunta: str) -> str:
+    """Pregunta normalizada (minúsculas, espacios y signos de los extremos)"""
+    return " ".join(pregunta.lower().split()).strip(" ¿?¡!.")
+
+
+def prompt_digest(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class BedrockCassette:
+    """Grabación y reproducción de respuestas de Bedrock en un archivo JSONL"""
+
+    def __init__(self, path: str = None, mode: str = None, delay: bool = None):
+        self.path = Config.BEDROCK_CASSETTE_PATH if path is None else path
+        self.mode = (mode or Config.BEDROCK_CASSETTE_MODE).lower()
+        self.delay = Config.BEDROCK_CASSETTE_DELAY if delay is None else delay
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._schemas: Dict[str, Dict[str, Any]] = {}
+        self._recorded_schemas: Optional[set] = None
+
+    @property
+    def recording(self) -> bool:
+        return bool(self.path) and self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return bool(self.path) and self.mode == "replay"
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Entradas por pregunta (la última grabada gana) y esquemas por versión"""
+        if self._entries is not None:
+            return self._entries
+        entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as cassette_file:
+                for line in cassette_file:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if entry.get("type") == "schema":
+                        self._schemas[entry["schema_version"]] = entry["schema"]
+                    else:
+                        entries[entry["key"]] = entry
+        self._entries = entries
+        logger.info(f"📼 Cassette de Bedrock cargado: {len(entries)} respuestas ({self.path})")
+        return entries
+
+    def lookup(self, pregunta: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._load().get(cassette_key(pregunta))
+
+    def schemas(self) -> Dict[str, Dict[str, Any]]:
+        """Esquemas grabados por versión"""
+        with self._lock:
+            self._load()
+            return dict(self._schemas)
+
+    def replay(self, pregunta: str, prompt: str) -> Tuple[str, Dict[str, Any]]:
+        """Texto y uso grabados para `pregunta`; BedrockError si no hay grabación"""
+        entry = self.lookup(pregunta)
+        if entry is None:
+            raise BedrockError(f"Sin respuesta grabada en el cassette para: {pregunta[:100]}")
+
+        annotate("cassette", "replay")
+        if entry.get("prompt_sha1") != prompt_digest(prompt):
+            annotate("cassette_prompt_changed", True)
+        if self.delay and entry.get("duration_ms"):
+            time.sleep(entry["duration_ms"] / 1000)
+        return entry["text"], entry.get("usage") or {}
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def record(
+        self,
+        pregunta: str,
+        prompt: str,
+        text: str,
+        usage: Dict[str, Any],
+        duration_s: float,
+        schema_version: str = None,
+        schema: Dict[str, Any] = None,
+    ) -> None:
+        """Agrega la respuesta al cassette (y el esquema si su versión es nueva)"""
+        lines = []
+        with self._lock:
+            if self._recorded_schemas is None:
+                self._recorded_schemas = set(self._existing_schema_versions())
+            if schema_version and schema is not None and schema_version not in self._recorded_schemas:
+                self._recorded_schemas.add(schema_version)
+                lines.append({"type": "schema", "schema_version": schema_version, "schema": schema})
+            lines.append(
+                {
+                    "type": "response",
+                    "key": cassette_key(pregunta),
+                    "pregunta": pregunta,
+                    "prompt_sha1": prompt_digest(prompt),
+                    "schema_version": schema_version,
+                    "text": text,
+                    "usage": usage,
+                    "duration_ms": round(duration_s * 1000, 1),
+                    "recorded_at": time.time(),
+                }
+            )
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as cassette_file:
+                    for line in lines:
+                        cassette_file.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+            except OSError as e:
+                # Grabar no debe romper la petición
+                logger.warning(f"⚠️ No se pudo escribir el cassette de Bedrock: {e}")
+
+    def _existing_schema_versions(self):
+        if not os.path.exists(self.path):
+            return []
+        versions = []
+        with open(self.path, encoding="utf-8") as cassette_file:
+            for line in cassette_file:
+                if line.startswith('{"type": "schema"'):
+                    versions.append(json.loads(line)["schema_version"])
+        return versions
+
+
+# Instancia global del servicio
+bedrock_cassette = BedrockCassette()
@@ -1,6 +1,15 @@
 import boto3
 from app.config.config import Config
 from app.utils.exceptions import BedrockError
+from app.utils.tracing import REQUEST_ID_HEADER, current_request_id
+
+
+def _add_request_id(request, **kwargs):
+    """Hook de botocore: reenvía el X-Request-ID de la petición en curso a Bedrock"""
+    request_id = current_request_id()
+    if request_id is not None:
+        request.headers[REQUEST_ID_HEADER] = request_id
+
 
 class BedrockService:
     def __init__(self):
@@ -10,10 +19,13 @@ class BedrockService:
     def _initialize_bedrock_client(self):
         """Inicializa el cliente de Bedrock"""
         try:
-            return boto3.client(
+            client = boto3.client(
                 service_name="bedrock-runtime",
-                region_name=self.config.AWS_REGION
+                region_name=self.config.AWS_REGION,
+                endpoint_url=self.config.BEDROCK_ENDPOINT_URL,
             )
+            client.meta.events.register("before-send.bedrock-runtime", _add_request_id)
+            return client
         except Exception as e:
             raise BedrockError(f"Error inicializando cliente Bedrock: {str(e)}")
     
@@ -2,6 +2,7 @@ import torch
 from transformers import DistilBertForSequenceClassification, DistilBertTokenizer
 import os
 import re
+from typing import List
 from app.utils.exceptions import ModelLoadingError
 from app.utils.logging_config import get_logger
 
@@ -86,30 +87,63 @@ class ChartDetector:
         """Predice si el texto requiere gráfico y el tipo usando el modelo fine-tuned"""
         try:
             resultado = self._predict_with_model(text)
-            return {
-                "needs_chart": resultado['necesita_grafico'],
-                "chart_type": resultado['tipo_grafico'],
-                "confidence": resultado['confianza'],
-                "reasoning": self._generate_reasoning(
-                    text, 
-                    resultado['necesita_grafico'], 
-                    resultado['tipo_grafico'], 
-                    resultado['confianza']
-                )
-            }
+            return self._format_prediction(text, resultado)
         except Exception as e:
             logger.warning(f"Error en predicción con modelo, usando fallback: {str(e)}")
             return self._fallback_detection(text)
-    
+
+    def predict_batch(self, texts: List[str], batch_size: int = 32) -> List[dict]:
+        """
+        Predice varios textos en lotes (una pasada del modelo por lote)
+
+        Args:
+            texts: Consultas en lenguaje natural
+            batch_size: Cantidad de textos por pasada del modelo
+
+        Returns:
+            Lista de predicciones en el mismo orden y formato que `predict`
+        """
+        predicciones = []
+        for start in range(0, len(texts), batch_size):
+            lote = texts[start:start + batch_size]
+            try:
+                resultados = self._predict_batch_with_model(lote, padding='longest')
+                predicciones.extend(
+                    self._format_prediction(text, resultado)
+                    for text, resultado in zip(lote, resultados)
+                )
+            except Exception as e:
+                logger.warning(f"Error en predicción por lotes, usando fallback: {str(e)}")
+                predicciones.extend(self._fallback_detection(text) for text in lote)
+        return predicciones
+
+    def _format_prediction(self, text: str, resultado: dict) -> dict:
+        """Convierte el resultado del modelo al formato usado por el pipeline"""
+        return {
+            "needs_chart": resultado['necesita_grafico'],
+            "chart_type": resultado['tipo_grafico'],
+            "confidence": resultado['confianza'],
+            "reasoning": self._generate_reasoning(
+                text, 
+                resultado['necesita_grafico'], 
+                resultado['tipo_grafico'], 
+                resultado['confianza']
+            )
+        }
+
     def _predict_with_model(self, text: str) -> dict:
         """Predicción basada en modelo fine-tuned"""
+        return self._predict_batch_with_model([text])[0]
+
+    def _predict_batch_with_model(self, texts: List[str], padding='max_length') -> List[dict]:
+        """Predicción basada en modelo fine-tuned para un lote de textos"""
         self.model.eval()
-        texto_limpio = self.preprocess_text(text)
+        textos_limpios = [self.preprocess_text(text) for text in texts]
 
         encoding = self.tokenizer(
-            texto_limpio,
+            textos_limpios,
             truncation=True,
-            padding='max_length',
+            padding=padding,
             max_length=128,
             return_tensors='pt'
         )
@@ -120,11 +154,21 @@ class ChartDetector:
         with torch.no_grad():
             outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
             predictions = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            predicted_class = torch.argmax(predictions, dim=1).item()
-            confidence = predictions[0][predicted_class].item()
+            confidences, predicted_classes = torch.max(predictions, dim=1)
 
         reverse_mapping = {v: k for k, v in self.label_mapping.items()}
-        tipo_grafico = reverse_mapping[predicted_class]
+
+        return [
+            self._apply_keyword_heuristics(
+                text, reverse_mapping[predicted_class], confidence
+            )
+            for text, predicted_class, confidence in zip(
+                texts, predicted_classes.tolist(), confidences.tolist()
+            )
+        ]
+
+    def _apply_keyword_heuristics(self, text: str, tipo_grafico: str, confidence: float) -> dict:
+        """Ajusta predicciones 'ninguno' de baja confianza con palabras clave"""
         necesita_grafico = tipo_grafico != 'ninguno'
 
         if confidence < 0.7 and tipo_grafico == 'ninguno':
@@ -3,16 +3,41 @@ import seaborn as sns
 import pandas as pd
 import io
 import base64
+from app.config.config import Config
+from app.services.chart_templates import build_chart_code
 from app.utils.exceptions import ChartError
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
 
 
 class ChartService:
     def __init__(self):
         plt.switch_backend("Agg")  # Para evitar problemas en entornos sin GUI
 
+    def resolve_chart_code(self, df, chart_type, chart_fields, title=""):
+        """
+        Obtiene el código del gráfico: plantillas locales por defecto y código
+        escrito por el LLM solo si LLM_CHART_CODE está habilitado (o como fallback)
+        """
+        llm_code = (chart_fields or {}).get("chart_code")
+
+        if Config.LLM_CHART_CODE and llm_code:
+            return llm_code
+
+        try:
+            return build_chart_code(df, chart_type, chart_fields, title)
+        except ChartError as e:
+            if llm_code:
+                logger.warning(
+                    f"Plantilla local no aplicable, usando chart_code del LLM: {e.message}"
+                )
+                return llm_code
+            raise
+
     def generate_chart(self, df, chart_fields):
         """
-        Genera un gráfico a partir de un DataFrame y el código generado por IA
+        Genera un gráfico a partir de un DataFrame y el código del gráfico
         """
         try:
             # Obtener el código del gráfico
@@ -42,8 +67,12 @@ class ChartService:
             # Limpiar cualquier figura previa
             plt.close("all")
 
-            # Ejecutar el código generado
-            exec(chart_code, namespace)
+            # Ejecutar el código generado; si falla, no dejar sus figuras abiertas
+            try:
+                exec(chart_code, namespace)
+            except Exception:
+                plt.close("all")
+                raise
 
             # Convertir el gráfico a base64
             return self._plot_to_base64()
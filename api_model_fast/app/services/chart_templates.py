@@ -0,0 +1,306 @@
+"""
+Generador local de código de gráficos a partir de plantillas.
+
+Produce el mismo tipo de `chart_code` que antes escribía el LLM (matplotlib/seaborn
+sobre un DataFrame `df`), eligiendo las columnas a partir de `chart_type`,
+`chart_fields` y de los tipos de datos del DataFrame resultante.
+"""
+
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import pandas as pd
+from pandas.api import types as ptypes
+
+from app.utils.exceptions import ChartError
+
+# Tipos soportados por las plantillas
+SUPPORTED_CHART_TYPES = {"bar", "line", "scatter", "pie", "histogram", "area", "box_plot"}
+
+# Nombres alternativos (incluye las etiquetas del ChartDetector)
+CHART_TYPE_ALIASES = {
+    "barras": "bar",
+    "lineal": "line",
+    "linea": "line",
+    "dispersion": "scatter",
+    "circular": "pie",
+    "pastel": "pie",
+    "histograma": "histogram",
+    "box": "box_plot",
+    "boxplot": "box_plot",
+}
+
+# Máximo de categorías a dibujar en barras / circular
+MAX_CATEGORIES = 30
+MAX_PIE_SLICES = 10
+
+
+def normalize_chart_type(chart_type: Optional[str]) -> Optional[str]:
+    """Normaliza el tipo de gráfico a uno de SUPPORTED_CHART_TYPES (o None)"""
+    if not chart_type or not isinstance(chart_type, str):
+        return None
+    normalized = chart_type.strip().lower().replace(" ", "_")
+    normalized = CHART_TYPE_ALIASES.get(normalized, normalized)
+    return normalized if normalized in SUPPORTED_CHART_TYPES else None
+
+
+def _first_value(series: pd.Series):
+    """Primer valor no nulo de una serie (o None)"""
+    index = series.first_valid_index()
+    return None if index is None else series.loc[index]
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    """Columna numérica, incluyendo Decimals que psycopg2 devuelve como object"""
+    if ptypes.is_bool_dtype(series):
+        return False
+    if ptypes.is_numeric_dtype(series):
+        return True
+    if ptypes.is_object_dtype(series):
+        value = _first_value(series)
+        return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+    return False
+
+
+def _is_temporal(series: pd.Series) -> bool:
+    """Columna de fecha/hora (datetime64 o objetos date/datetime)"""
+    if ptypes.is_datetime64_any_dtype(series):
+        return True
+    if ptypes.is_object_dtype(series):
+        return isinstance(_first_value(series), (date, datetime, time))
+    return False
+
+
+def _field(chart_fields: Dict, key: str, columns: List[str]) -> Optional[str]:
+    """Devuelve chart_fields[key] solo si corresponde a una columna real"""
+    value = chart_fields.get(key) if isinstance(chart_fields, dict) else None
+    if isinstance(value, str) and value in columns:
+        return value
+    return None
+
+
+class _ColumnProfile:
+    """Clasificación de columnas del DataFrame por tipo de dato"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.numeric = [c for c in df.columns if _is_numeric(df[c])]
+        self.temporal = [c for c in df.columns if _is_temporal(df[c])]
+        self.categorical = [
+            c for c in df.columns if c not in self.numeric and c not in self.temporal
+        ]
+        # Columnas numéricas guardadas como object (Decimal) que hay que convertir
+        self.needs_cast = [c for c in self.numeric if ptypes.is_object_dtype(df[c])]
+
+    def first(self, *groups: List[str], exclude: tuple = ()) -> Optional[str]:
+        for group in groups:
+            for col in group:
+                if col not in exclude:
+                    return col
+        return None
+
+
+def build_chart_code(
+    df: pd.DataFrame,
+    chart_type: Optional[str],
+    chart_fields: Optional[Dict] = None,
+    title: str = "",
+) -> str:
+    """
+    Genera código Python (matplotlib/seaborn) para graficar `df`
+
+    Args:
+        df: DataFrame con los resultados de la consulta
+        chart_type: Tipo de gráfico (bar, line, scatter, pie, histogram, area, box_plot)
+        chart_fields: Campos sugeridos por el LLM (x_axis, y_axis, category_field, color_field)
+        title: Título del gráfico
+
+    Returns:
+        str: Código listo para ejecutarse con `df`, `plt`, `sns` y `pd` en el namespace
+
+    Raises:
+        ChartError: Si no hay columnas adecuadas para el tipo de gráfico
+    """
+    if df is None or df.empty:
+        raise ChartError("No hay datos para generar el gráfico", chart_type=chart_type)
+
+    chart_fields = chart_fields or {}
+    kind = normalize_chart_type(chart_type) or "bar"
+    profile = _ColumnProfile(df)
+    columns = list(df.columns)
+
+    x = _field(chart_fields, "x_axis", columns)
+    y = _field(chart_fields, "y_axis", columns)
+    hue = _field(chart_fields, "color_field", columns) or _field(
+        chart_fields, "category_field", columns
+    )
+
+    # Completar ejes según el tipo de gráfico y los tipos de datos
+    if kind in ("line", "area"):
+        x = x or profile.first(profile.temporal, profile.categorical, profile.numeric)
+    elif kind in ("scatter", "histogram"):
+        x = x or profile.first(profile.numeric)
+    else:
+        x = x or profile.first(profile.categorical, profile.temporal)
+
+    if y is None or y not in profile.numeric:
+        y = profile.first(profile.numeric, exclude=(x,))
+    if hue in (x, y):
+        hue = None
+
+    if x is None and kind != "box_plot":
+        raise ChartError(
+            f"No se encontró una columna adecuada para el eje X ({kind})",
+            chart_type=kind,
+        )
+    if kind in ("line", "area", "scatter", "box_plot") and y is None:
+        raise ChartError(
+            f"El gráfico {kind} necesita una columna numérica para el eje Y",
+            chart_type=kind,
+        )
+
+    lines = ["plt.figure(figsize=(10, 6))"]
+    for col in profile.needs_cast:
+        lines.append(f"df[{col!r}] = pd.to_numeric(df[{col!r}], errors='coerce')")
+
+    lines.extend(_TEMPLATES[kind](x, y, hue, profile))
+
+    lines.append(f"plt.title({(title or _default_title(kind, x, y))!r})")
+    lines.append("plt.tight_layout()")
+    return "\n".join(lines)
+
+
+def _default_title(kind: str, x: Optional[str], y: Optional[str]) -> str:
+    if x and y:
+        return f"{y} por {x}"
+    return str(x or y or kind)
+
+
+def _bar(x, y, hue, profile) -> List[str]:
+    if hue and y:
+        return [
+            f"sns.barplot(data=df, x={x!r}, y={y!r}, hue={hue!r}, errorbar=None)",
+            f"plt.xlabel({x!r})",
+            f"plt.ylabel({y!r})",
+            "plt.xticks(rotation=45, ha='right')",
+            "plt.grid(axis='y', alpha=0.3)",
+        ]
+    if y:
+        aggregate = f"data = df.groupby({x!r}, sort=False)[{y!r}].sum().head({MAX_CATEGORIES})"
+        ylabel = y
+    else:
+        aggregate = f"data = df[{x!r}].value_counts().head({MAX_CATEGORIES})"
+        ylabel = "cantidad"
+    return [
+        aggregate,
+        "plt.bar(data.index.astype(str), data.values, color='#4C72B0')",
+        f"plt.xlabel({x!r})",
+        f"plt.ylabel({ylabel!r})",
+        "plt.xticks(rotation=45, ha='right')",
+        "plt.grid(axis='y', alpha=0.3)",
+    ]
+
+
+def _line(x, y, hue, profile) -> List[str]:
+    lines = []
+    if x in profile.temporal:
+        lines.append(f"df[{x!r}] = pd.to_datetime(df[{x!r}], errors='coerce')")
+    if hue:
+        lines.append(
+            f"sns.lineplot(data=df.sort_values({x!r}), x={x!r}, y={y!r}, hue={hue!r}, marker='o')"
+        )
+    else:
+        lines.extend(
+            [
+                f"data = df.sort_values({x!r})",
+                f"plt.plot(data[{x!r}], data[{y!r}], marker='o', linewidth=2)",
+            ]
+        )
+    lines.extend(
+        [
+            f"plt.xlabel({x!r})",
+            f"plt.ylabel({y!r})",
+            "plt.grid(True, alpha=0.3)",
+            "plt.xticks(rotation=45)",
+        ]
+    )
+    return lines
+
+
+def _area(x, y, hue, profile) -> List[str]:
+    lines = []
+    if x in profile.temporal:
+        lines.append(f"df[{x!r}] = pd.to_datetime(df[{x!r}], errors='coerce')")
+    lines.append(f"data = df.groupby({x!r})[{y!r}].sum().sort_index()")
+    if x in profile.categorical:
+        lines.extend(
+            [
+                "positions = range(len(data))",
+                "plt.xticks(positions, data.index.astype(str), rotation=45, ha='right')",
+            ]
+        )
+    else:
+        lines.extend(["positions = data.index", "plt.xticks(rotation=45)"])
+    lines.extend(
+        [
+            "plt.fill_between(positions, data.values, alpha=0.4, color='#4C72B0')",
+            "plt.plot(positions, data.values, linewidth=2, color='#4C72B0')",
+            f"plt.xlabel({x!r})",
+            f"plt.ylabel({y!r})",
+            "plt.grid(True, alpha=0.3)",
+        ]
+    )
+    return lines
+
+
+def _scatter(x, y, hue, profile) -> List[str]:
+    plot = (
+        f"sns.scatterplot(data=df, x={x!r}, y={y!r}, hue={hue!r}, alpha=0.7)"
+        if hue
+        else f"plt.scatter(df[{x!r}], df[{y!r}], alpha=0.7, color='#4C72B0')"
+    )
+    return [plot, f"plt.xlabel({x!r})", f"plt.ylabel({y!r})", "plt.grid(True, alpha=0.3)"]
+
+
+def _pie(x, y, hue, profile) -> List[str]:
+    if y:
+        aggregate = f"data = df.groupby({x!r}, sort=False)[{y!r}].sum().nlargest({MAX_PIE_SLICES})"
+    else:
+        aggregate = f"data = df[{x!r}].value_counts().head({MAX_PIE_SLICES})"
+    return [
+        aggregate,
+        "plt.pie(data.values, labels=data.index.astype(str), autopct='%1.1f%%', startangle=90)",
+        "plt.axis('equal')",
+    ]
+
+
+def _histogram(x, y, hue, profile) -> List[str]:
+    return [
+        f"plt.hist(df[{x!r}].dropna(), bins=30, edgecolor='black', alpha=0.7, color='#4C72B0')",
+        f"plt.xlabel({x!r})",
+        "plt.ylabel('frecuencia')",
+        "plt.grid(axis='y', alpha=0.3)",
+    ]
+
+
+def _box_plot(x, y, hue, profile) -> List[str]:
+    if x and y:
+        return [
+            f"sns.boxplot(data=df, x={x!r}, y={y!r})",
+            f"plt.xlabel({x!r})",
+            f"plt.ylabel({y!r})",
+            "plt.xticks(rotation=45, ha='right')",
+        ]
+    column = y or x
+    return [f"plt.boxplot(df[{column!r}].dropna())", f"plt.ylabel({column!r})"]
+
+
+_TEMPLATES = {
+    "bar": _bar,
+    "line": _line,
+    "area": _area,
+    "scatter": _scatter,
+    "pie": _pie,
+    "histogram": _histogram,
+    "box_plot": _box_plot,
+}
@@ -1,101 +1,487 @@
-from datetime import date, datetime
-from decimal import Decimal
+"""
+Persistencia de conversaciones fuera del camino crítico de la respuesta.
+
+El `_id` de la conversación se asigna localmente (formato ObjectId) y los
+mensajes se encolan; un escritor en segundo plano los agrupa por conversación y
+los envía a `POST {CONVERSATIONS_URL}/multiple-messages`, que hace upsert por
+`_id` y agrega los mensajes (reenviarlos los duplicaría). El título de una
+conversación nueva va aparte (`PATCH /{_id}`) y se reintenta por separado, sin
+volver a enviar los mensajes. Si el servicio no responde tras los reintentos, lo
+pendiente se guarda en un spool JSONL local y se reenvía cuando vuelve a estar
+disponible; lo que el servicio rechaza (4xx) va a `<spool>.rejected` y no se
+reintenta.
+
+Con CONVERSATION_ARTIFACTS los gráficos y los resultados grandes se guardan en el
+almacén de artefactos y el mensaje lleva solo la URL y una vista previa.
+"""
+
+import asyncio
+import base64
+import binascii
+import os
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
 import httpx
-from typing import Dict, Any, Optional
+
 from app.config.config import Config
+from app.services.artifact_store import artifact_store
+from app.utils.logging_config import get_logger
+from app.utils.metrics import observe_stage
+from app.utils.serialization import PreEncodedDict, dumps, loads
+from app.utils.tracing import REQUEST_ID_HEADER, current_request_id
+
+logger = get_logger(__name__)
+
+# Marca de fin para el escritor
+_STOP = object()
+
+# `_id` de conversación aceptado desde el cliente (ObjectId en hexadecimal; vacío = nueva)
+CONVERSATION_ID_PATTERN = r"^([0-9a-fA-F]{24})?$"
+
+# 4xx que sí pueden resolverse reintentando
+RETRYABLE_CLIENT_ERRORS = {408, 429}
+
+# Resultado de un envío
+_SENT, _FAILED, _REJECTED = "sent", "failed", "rejected"
+
+
+class _ObjectIdGenerator:
+    """Ids de 12 bytes con el formato de ObjectId de MongoDB (timestamp, aleatorio, contador)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._random = secrets.token_bytes(5)
+        self._counter = random.randint(0, 0xFFFFFF)
+
+    def new_id(self) -> str:
+        with self._lock:
+            self._counter = (self._counter + 1) & 0xFFFFFF
+            counter = self._counter
+        return (
+            int(time.time()).to_bytes(4, "big")
+            + self._random
+            + counter.to_bytes(3, "big")
+        ).hex()
+
+
+_object_ids = _ObjectIdGenerator()
+
+
+def new_conversation_id() -> str:
+    """Asigna un `_id` de conversación sin consultar al servicio"""
+    return _object_ids.new_id()
+
+
+def build_messages(response_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Mensajes (pregunta y respuesta) de una respuesta del pipeline"""
+    timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    return [
+        {
+            "isUser": True,
+            "content": response_data["pregunta"],
+            "timestamp": timestamp,
+        },
+        {
+            "isUser": False,
+            "content": {
+                "query_sql": response_data["sql_generado"],
+                # Si la respuesta ya se serializó, se reutilizan esos bytes
+                "query_result": response_data["resultados"],
+                "chart_base64": (response_data.get("chart") or {}).get("chart_image"),
+            },
+            "timestamp": timestamp,
+        },
+    ]
+
+
+CHART_DATA_URI_PREFIX = "data:image/png;base64,"
+
+
+def slim_content(content: Any, preview_rows: int = None) -> Any:
+    """
+    Reemplaza el gráfico y los resultados del mensaje por referencias a artefactos
+
+    `chart_base64` pasa a ser la URL del PNG (válida como `src` de una imagen) y
+    `query_result` conserva columns, las primeras filas y la referencia al
+    resultado completo. Es idempotente: el contenido ya reducido no cambia.
+    """
+    if not isinstance(content, dict):
+        return content
+    preview_rows = Config.ARTIFACT_PREVIEW_ROWS if preview_rows is None else preview_rows
+    content = dict(content)
+
+    chart = content.get("chart_base64")
+    if isinstance(chart, str) and chart.startswith(CHART_DATA_URI_PREFIX):
+        try:
+            png = base64.b64decode(chart[len(CHART_DATA_URI_PREFIX):], validate=True)
+        except (ValueError, binascii.Error):
+            png = None
+        ref = artifact_store.put(png, "png") if png else None
+        if ref is not None:
+            content["chart_base64"] = ref["url"]
+
+    result = content.get("query_result")
+    if (
+        isinstance(result, dict)
+        and "artifact" not in result
+        and len(result.get("data") or []) > preview_rows
+    ):
+        ref = (
+            artifact_store.put(result.json, "json")
+            if isinstance(result, PreEncodedDict)
+            else artifact_store.put_json(result)
+        )
+        if ref is not None:
+            content["query_result"] = {
+                **{key: value for key, value in result.items() if key != "data"},
+                "data": result["data"][:preview_rows],
+                "preview_rows": preview_rows,
+                "artifact": ref,
+            }
+
+    return content
+
+
+class ConversationWriter:
+    """Cola de escritura en segundo plano hacia el servicio de conversaciones"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        batch_size: int = None,
+        flush_interval_s: float = None,
+        max_retries: int = None,
+        backoff_s: float = None,
+        queue_size: int = None,
+        spool_path: str = None,
+        transport: httpx.AsyncBaseTransport = None,
+    ):
+        self.base_url = (base_url if base_url is not None else Config.CONVERSATIONS_URL or "").rstrip("/")
+        self.batch_size = batch_size or Config.CONVERSATION_BATCH_SIZE
+        self.flush_interval_s = (
+            Config.CONVERSATION_FLUSH_INTERVAL_S if flush_interval_s is None else flush_interval_s
+        )
+        self.max_retries = Config.CONVERSATION_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_s = Config.CONVERSATION_RETRY_BACKOFF_S if backoff_s is None else backoff_s
+        self.queue_size = queue_size or Config.CONVERSATION_QUEUE_SIZE
+        self.spool_path = spool_path or Config.CONVERSATION_SPOOL_PATH
+        self._transport = transport
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "enqueued": 0,
+            "sent": 0,
+            "requests": 0,
+            "retries": 0,
+            "spooled": 0,
+            "replayed": 0,
+            "rejected": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """Crea el cliente HTTP compartido y lanza el escritor"""
+        if not self.enabled or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=60),
+            transport=self._transport,
+        )
+        self._task = asyncio.create_task(self._run(), name="conversation-writer")
+        logger.info("📝 Escritor de conversaciones iniciado")
+
+    async def stop(self, timeout_s: float = 10.0) -> None:
+        """Envía lo pendiente (o lo guarda en el spool) y cierra el cliente"""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        try:
+            await asyncio.wait_for(self._task, timeout_s)
+        except asyncio.TimeoutError:
+            logger.warning("El escritor de conversaciones no terminó a tiempo")
+        self._task = None
+
+        # Lo que no alcanzó a enviarse queda en el spool para el próximo arranque
+        pending = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                pending.append(item)
+        if pending:
+            self._spool(pending)
+        self._queue = None
+
+        await self._client.aclose()
+        self._client = None
+
+    # ------------------------------------------------------------------
+    # Encolado
+    # ------------------------------------------------------------------
+
+    def enqueue(self, conversation_id: Optional[str], response_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Encola la pregunta y la respuesta y devuelve la respuesta con su `_id`
+
+        Args:
+            conversation_id: ID de la conversación existente (None para nueva)
+            response_data: Diccionario con los datos de respuesta
+        """
+        if not self.enabled:
+            logger.debug("CONVERSATIONS_URL no configurada: la conversación no se guarda")
+            return response_data
+
+        is_new = not conversation_id
+        conversation_id = conversation_id or new_conversation_id()
+        response_data["_id"] = conversation_id
+
+        item = {
+            "_id": conversation_id,
+            "messages": build_messages(response_data),
+            "title": response_data.get("title") if is_new else None,
+            "request_id": current_request_id(),
+        }
+
+        self._stats["enqueued"] += 1
+        if self._queue is None:
+            # Sin el escritor en marcha (p. ej. fuera del lifespan) el spool no pierde datos
+            self._spool([item])
+            return response_data
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            logger.warning("Cola de conversaciones llena, se guarda en el spool")
+            self._spool([item])
+        return response_data
+
+    # ------------------------------------------------------------------
+    # Escritor
+    # ------------------------------------------------------------------
+
+    async def _run(self) -> None:
+        await self._replay_spool()
+        stopping = False
+        while not stopping:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            if batch[-1] is _STOP:
+                stopping = True
+                batch.pop()
+            if not batch:
+                continue
+
+            try:
+                if await self._flush(batch, retries=0 if stopping else None):
+                    await self._replay_spool()
+            except Exception as e:
+                # Un error inesperado no debe detener al escritor
+                logger.error(f"Error en el escritor de conversaciones: {str(e)}")
+                self._spool(batch)
+
+    async def _flush(self, items: List[Dict[str, Any]], retries: int = None) -> bool:
+        """Envía los items agrupados por conversación; lo que falla va al spool"""
+        if Config.CONVERSATION_ARTIFACTS:
+            items = await asyncio.to_thread(self._slim, items)
+
+        grouped: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            group = grouped.setdefault(item["_id"], {"_id": item["_id"], "messages": [], "title": None})
+            group["messages"].extend(item["messages"])
+            group["title"] = group["title"] or item.get("title")
+            if item.get("request_id"):
+                group.setdefault("request_ids", []).append(item["request_id"])
+
+        for group in grouped.values():
+            # Ids de las peticiones de origen, para correlacionar en el servicio de conversaciones
+            request_ids = group.pop("request_ids", None)
+            if request_ids:
+                group["request_id"] = ",".join(dict.fromkeys(request_ids))
+
+        # Cada envío devuelve la parte que quedó pendiente (None si terminó)
+        results = await asyncio.gather(
+            *(self._send(group, retries) for group in grouped.values())
+        )
+        failed = [pending for pending in results if pending is not None]
+        if failed:
+            self._spool(failed)
+        return not failed
+
+    @staticmethod
+    def _slim(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        slimmed = []
+        for item in items:
+            try:
+                messages = [
+                    {**message, "content": slim_content(message["content"])}
+                    for message in item["messages"]
+                ]
+                item = {**item, "messages": messages}
+            except OSError as e:
+                # Sin almacén disponible se envía el contenido completo
+                logger.warning(f"No se pudieron guardar artefactos: {str(e)}")
+            slimmed.append(item)
+        return slimmed
+
+    async def _send(self, group: Dict[str, Any], retries: int = None) -> Optional[Dict[str, Any]]:
+        retries = self.max_retries if retries is None else retries
+        start = time.perf_counter()
+        try:
+            return await self._send_group(group, retries)
+        finally:
+            observe_stage("persistence", time.perf_counter() - start)
+
+    async def _send_group(self, group: Dict[str, Any], retries: int) -> Optional[Dict[str, Any]]:
+        """Guarda mensajes y título; devuelve lo pendiente para el spool (None si no queda nada)"""
+        headers = {"Content-Type": "application/json"}
+        if group.get("request_id"):
+            headers[REQUEST_ID_HEADER] = group["request_id"]
+
+        if group["messages"]:
+            outcome = await self._request_with_retries(
+                group,
+                "POST",
+                f"{self.base_url}/multiple-messages",
+                retries,
+                content=dumps({"_id": group["_id"], "messages": group["messages"]}),
+                headers=headers,
+            )
+            if outcome == _REJECTED:
+                self._dead_letter(group)
+                return None
+            if outcome == _FAILED:
+                return group
+            self._stats["sent"] += len(group["messages"])
+
+        if group.get("title"):
+            # multiple-messages no recibe título: se fija tras el upsert. Los mensajes
+            # ya están guardados, así que solo el título queda pendiente si falla
+            outcome = await self._request_with_retries(
+                group,
+                "PATCH",
+                f"{self.base_url}/{group['_id']}",
+                retries,
+                content=dumps({"title": group["title"]}),
+                headers=headers,
+            )
+            if outcome == _REJECTED:
+                self._dead_letter({**group, "messages": []})
+            elif outcome == _FAILED:
+                return {**group, "messages": []}
+        return None
+
+    async def _request_with_retries(
+        self, group: Dict[str, Any], method: str, url: str, retries: int, **kwargs
+    ) -> str:
+        for attempt in range(retries + 1):
+            try:
+                self._stats["requests"] += 1
+                response = await self._client.request(method, url, **kwargs)
+                response.raise_for_status()
+                return _SENT
+            except httpx.HTTPStatusError as e:
+                # Los demás 4xx no se resuelven reintentando
+                status_code = e.response.status_code
+                if status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS:
+                    logger.error(f"Conversación {group['_id']} rechazada ({method}): {str(e)}")
+                    return _REJECTED
+                error = e
+            except httpx.HTTPError as e:
+                error = e
+
+            if attempt < retries:
+                self._stats["retries"] += 1
+                await asyncio.sleep(self.backoff_s * (2 ** attempt) * (0.5 + random.random()))
+
+        logger.warning(f"No se pudo guardar la conversación {group['_id']} ({method}): {str(error)}")
+        return _FAILED
+
+    # ------------------------------------------------------------------
+    # Spool local
+    # ------------------------------------------------------------------
+
+    def _spool(self, groups: List[Dict[str, Any]], path: str = None) -> None:
+        path = path or self.spool_path
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "ab") as spool:
+                for group in groups:
+                    spool.write(dumps(group) + b"\n")
+            if path == self.spool_path:
+                self._stats["spooled"] += len(groups)
+        except OSError as e:
+            logger.error(f"No se pudo escribir el spool de conversaciones: {str(e)}")
+
+    def _dead_letter(self, group: Dict[str, Any]) -> None:
+        """Aparta un grupo rechazado por el servicio: queda para revisión, no se reenvía"""
+        self._stats["rejected"] += 1
+        self._spool([group], path=f"{self.spool_path}.rejected")
+
+    async def _replay_spool(self) -> None:
+        """Reenvía el spool; lo que vuelve a fallar se reescribe en él"""
+        if not os.path.exists(self.spool_path):
+            return
+        replay_path = f"{self.spool_path}.replay"
+        try:
+            os.replace(self.spool_path, replay_path)
+            with open(replay_path, "rb") as spool:
+                items = [loads(line) for line in spool if line.strip()]
+        except (OSError, ValueError) as e:
+            logger.error(f"No se pudo leer el spool de conversaciones: {str(e)}")
+            return
+
+        if items:
+            logger.info(f"Reenviando {len(items)} conversaciones del spool")
+            if await self._flush(items, retries=0):
+                self._stats["replayed"] += len(items)
+        os.remove(replay_path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+# Instancia global del servicio
+conversation_writer = ConversationWriter()
 
 
 async def save_conversation(
     conversation_id: Optional[str], response_data: Dict[str, Any]
 ) -> Dict[str, Any]:
     """
-    Guarda una conversación en el servicio de conversaciones.
+    Guarda una conversación en el servicio de conversaciones (en segundo plano).
 
     Args:
         conversation_id: ID de la conversación existente (None para nueva)
         response_data: Diccionario con los datos de respuesta
 
     Returns:
-        Dict con los datos de respuesta actualizados
+        Dict con los datos de respuesta y el `_id` de la conversación
     """
-    CONVERSATIONS_URL = Config.CONVERSATIONS_URL
-
-    def serialize_data(obj):
-        """
-        Función recursiva para serializar objetos no serializables por defecto.
-        """
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        elif isinstance(obj, Decimal):
-            return float(obj)
-        elif isinstance(obj, (list, tuple)):
-            return [serialize_data(item) for item in obj]
-        elif isinstance(obj, dict):
-            return {key: serialize_data(value) for key, value in obj.items()}
-        elif hasattr(obj, "__dict__"):
-            return serialize_data(obj.__dict__)
-        else:
-            return obj
-
-    # Serializar los resultados antes de construir la conversación
-    resultados_serializados = serialize_data(response_data["resultados"])
-
-    conversation = {
-        "title": response_data.get("title", ""),
-        "messages": [
-            {
-                "isUser": True,
-                "content": response_data["pregunta"],
-            },
-            {
-                "isUser": False,
-                "content": {
-                    "query_sql": response_data["sql_generado"],
-                    "query_result": resultados_serializados,
-                    "chart_base64": response_data.get("chart", {}).get(
-                        "chart_image", None
-                    ),
-                },
-            },
-        ],
-    }
-
-    async with httpx.AsyncClient() as client:
-        try:
-            if conversation_id:
-                # Verificar si la conversación existe
-                response = await client.get(f"{CONVERSATIONS_URL}/{conversation_id}")
-
-                if response.status_code == 200:
-                    # Conversación existe, actualizamos
-                    conversation = {
-                        "_id": conversation_id,
-                        "messages": conversation["messages"],
-                    }
-
-                    update_response = await client.post(
-                        f"{CONVERSATIONS_URL}/multiple-messages", json=conversation
-                    )
-                    update_response.raise_for_status()
-                else:
-                    # Si no existe o hay error, creamos nueva
-                    response.raise_for_status()
-
-            # Si no hay conversation_id o la validación falló, creamos nueva
-            if not conversation_id or response.status_code != 200:
-                r = await client.post(CONVERSATIONS_URL, json=conversation)
-                r.raise_for_status()
-                conversation_id = r.json()["_id"]
-                response_data["_id"] = conversation_id
-
-        except httpx.HTTPStatusError as e:
-            # Manejar errores HTTP
-            print(f"Error HTTP: {e}")
-            raise
-        except Exception as e:
-            # Manejar otros errores
-            print(f"Error inesperado: {e}")
-            raise
-
-    # 4️⃣ Devolver resultado con el _id (para el frontend)
-    return response_data
+    return conversation_writer.enqueue(conversation_id, response_data)
@@ -1,56 +1,174 @@
+import asyncio
+import threading
 import psycopg2
+from psycopg2 import errors as pg_errors
 from app.config.config import Config
-from app.utils.exceptions import DatabaseError
+from app.services.db_router import DBRouter
+from app.utils.exceptions import DatabaseError, QueryCancelledError, QueryTimeoutError
 from app.utils.logging_config import get_logger
 
 logger = get_logger(__name__)
 
 
-class DatabaseService:
+class QueryHandle:
+    """Referencia a la consulta en curso para poder cancelarla desde otro hilo"""
+
     def __init__(self):
+        self._lock = threading.Lock()
+        self._connection = None
+        self.cancelled = False
+
+    def attach(self, connection):
+        """Asocia la conexión que ejecuta la consulta"""
+        with self._lock:
+            self._connection = connection
+
+    def detach(self):
+        with self._lock:
+            self._connection = None
+
+    def cancel(self):
+        """Cancela la consulta en el backend (equivalente a pg_cancel_backend)"""
+        with self._lock:
+            self.cancelled = True
+            if self._connection is not None:
+                try:
+                    self._connection.cancel()
+                except Exception as e:
+                    logger.warning(f"No se pudo cancelar la consulta: {str(e)}")
+
+
+class DatabaseService:
+    def __init__(self, router: DBRouter = None):
         self.config = Config()
+        self.router = router or DBRouter.from_config()
+
+    def get_connection(self, route="primary"):
+        """Presta una conexión del pool del nodo elegido para la ruta (context manager)"""
+        return self.router.connection(route)
+
+    def execute_query(self, query, timeout_ms=None, handle=None, route="read", prepared=False):
+        """
+        Ejecuta una consulta SQL y retorna los resultados
+
+        Args:
+            query: Consulta SQL
+            timeout_ms: statement_timeout en milisegundos (por defecto DB_STATEMENT_TIMEOUT_MS)
+            handle: QueryHandle opcional para cancelar la consulta desde otro hilo
+            route: "read" (SQL generado), "catalog" (esquema) o "primary"
+            prepared: Ejecutar como sentencia preparada por forma de SQL si es posible
+        """
+        if timeout_ms is None:
+            timeout_ms = self.config.DB_STATEMENT_TIMEOUT_MS
 
-    def get_connection(self):
-        """Establece conexión con la base de datos"""
         try:
-            conn = psycopg2.connect(
-                host=self.config.DB_HOST,
-                port=self.config.DB_PORT,
-                dbname=self.config.DB_NAME,
-                user=self.config.DB_USER,
-                password=self.config.DB_PASS,
+            logger.debug("Ejecutando consulta SQL", extra={"sql_query": query})
+            with self.get_connection(route) as conn:
+                try:
+                    return self._run(conn, query, timeout_ms, handle, prepared)
+                finally:
+                    if handle is not None:
+                        handle.detach()
+                        # Un cancel tardío podría alcanzar a la próxima consulta
+                        # de esta conexión: no devolverla al pool
+                        conn.discard = conn.discard or handle.cancelled
+        except pg_errors.QueryCanceled as e:
+            if handle is not None and handle.cancelled:
+                raise QueryCancelledError(
+                    "Consulta cancelada: el cliente se desconectó", sql_query=query
+                )
+            raise QueryTimeoutError(
+                f"La consulta excedió el tiempo máximo de {timeout_ms} ms: {str(e).strip()}",
+                sql_query=query,
+                timeout_ms=timeout_ms,
             )
-            return conn
+        except DatabaseError:
+            raise
         except Exception as e:
-            raise DatabaseError(f"Error al conectar con la base de datos: {str(e)}")
+            raise DatabaseError(f"Error ejecutando consulta: {str(e)}")
 
-    def execute_query(self, query):
-        """Ejecuta una consulta SQL y retorna los resultados"""
-        try:
-            logger.info(f"Ejecutando consulta SQL: {query}")
-            conn = self.get_connection()
-            cur = conn.cursor()
+    def _run(self, conn, query, timeout_ms, handle, prepared=False):
+        """Ejecuta la consulta en una conexión prestada"""
+        if handle is not None:
+            handle.attach(conn)
+            if handle.cancelled:
+                raise QueryCancelledError(
+                    "Consulta cancelada antes de ejecutarse", sql_query=query
+                )
+        cur = conn.cursor()
+
+        # SET LOCAL: el timeout se limita a esta transacción
+        if timeout_ms:
+            cur.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+        statements = getattr(conn, "statements", None)
+        if not (prepared and statements is not None and statements.execute(cur, query)):
             cur.execute(query)
 
-            # Intentar obtener resultados (para SELECT)
-            try:
-                resultados = cur.fetchall()
-                column_names = [desc[0] for desc in cur.description]
-                resultados_formateados = {"columns": column_names, "data": resultados}
-            except psycopg2.ProgrammingError:
-                # Para INSERT, UPDATE, DELETE que no retornan datos
-                resultados_formateados = {
-                    "rows_affected": cur.rowcount,
-                    "message": "Operación ejecutada correctamente",
-                }
-
-            conn.commit()
-            cur.close()
-            conn.close()
-            return resultados_formateados
+        # Intentar obtener resultados (para SELECT)
+        try:
+            resultados = cur.fetchall()
+            column_names = [desc[0] for desc in cur.description]
+            resultados_formateados = {"columns": column_names, "data": resultados}
+        except psycopg2.ProgrammingError:
+            # Para INSERT, UPDATE, DELETE que no retornan datos
+            resultados_formateados = {
+                "rows_affected": cur.rowcount,
+                "message": "Operación ejecutada correctamente",
+            }
 
-        except Exception as e:
-            raise DatabaseError(f"Error ejecutando consulta: {str(e)}")
+        conn.commit()
+        cur.close()
+        return resultados_formateados
+
+    async def execute_query_cancellable(
+        self, query, timeout_ms=None, is_disconnected=None, route="read", prepared=False
+    ):
+        """
+        Ejecuta la consulta en un hilo y la cancela en PostgreSQL si el cliente
+        HTTP se desconecta o si la tarea asyncio que la espera se cancela
+
+        Args:
+            query: Consulta SQL
+            timeout_ms: statement_timeout en milisegundos
+            is_disconnected: Corrutina sin argumentos que indica si el cliente se fue
+            route: Tipo de ruta para elegir el nodo
+            prepared: Ejecutar como sentencia preparada si es posible
+        """
+        handle = QueryHandle()
+        task = asyncio.ensure_future(
+            asyncio.to_thread(
+                self.execute_query, query, timeout_ms, handle, route, prepared
+            )
+        )
+
+        try:
+            while True:
+                done, _ = await asyncio.wait(
+                    {task}, timeout=self.config.DB_DISCONNECT_POLL_S
+                )
+                if done:
+                    return task.result()
+                if is_disconnected is not None and await is_disconnected():
+                    logger.warning("Cliente desconectado, cancelando consulta en PostgreSQL")
+                    handle.cancel()
+                    return await task
+        except asyncio.CancelledError:
+            handle.cancel()
+            raise
+
+    def explain_query(self, query, route="read"):
+        """Devuelve el plan estimado (EXPLAIN FORMAT JSON) sin ejecutar la consulta"""
+        result = self.execute_query(
+            f"EXPLAIN (FORMAT JSON) {query.strip().rstrip(';')}", route=route
+        )
+        try:
+            return result["data"][0][0]
+        except (KeyError, IndexError) as e:
+            raise DatabaseError(
+                f"Respuesta inesperada de EXPLAIN: {str(e)}",
+                sql_query=query,
+                db_operation="explain",
+            )
 
 
 # Instancia global del servicio
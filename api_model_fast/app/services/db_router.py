@@ -0,0 +1,383 @@
+"""
+Enrutamiento de consultas entre un primario y réplicas de lectura.
+
+Cada nodo (DSN con rol `primary` o `replica`) tiene su propio pool pequeño de
+conexiones. `pool_size` limita las conexiones ociosas que se conservan, no las
+prestadas: una consulta nunca espera por una conexión y las que sobran se cierran
+al devolverse. La concurrencia la acotan los hilos de `asyncio.to_thread` y
+BATCH_DB_CONCURRENCY. Las consultas se piden por tipo de ruta:
+
+- "primary": siempre el primario.
+- "read": SQL generado (solo lectura tras la validación), según DB_READ_ROUTE.
+- "catalog": consultas de esquema, según DB_CATALOG_ROUTE.
+
+Las réplicas se eligen por menor carga o round-robin entre las sanas y con un
+retraso de replicación menor a DB_MAX_REPLICA_LAG_S; si no hay ninguna se usa
+el primario. `connect_fn` es inyectable para probar con un driver falso.
+"""
+
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+from psycopg2 import errors as pg_errors
+
+from app.config.config import Config
+from app.services.statement_cache import PreparedStatementCache
+from app.utils.exceptions import ConfigurationError, DatabaseError
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+ROLE_PRIMARY = "primary"
+ROLE_REPLICA = "replica"
+ROUTES = ("primary", "read", "catalog")
+STRATEGIES = ("least_loaded", "round_robin")
+
+# Fallos de conexión consecutivos para marcar un nodo como caído
+MAX_FAILURES = 2
+
+# 0 si la réplica reprodujo todo lo recibido; si no, antigüedad de la última transacción
+HEALTH_QUERY = """
+    SELECT pg_is_in_recovery(),
+           CASE
+               WHEN NOT pg_is_in_recovery() THEN 0
+               WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+               ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+           END
+"""
+
+
+class DBNode:
+    """Servidor PostgreSQL con su pool de conexiones y estado de salud"""
+
+    def __init__(self, name: str, role: str, params: Dict[str, Any], pool_size: int):
+        self.name = name
+        self.role = role
+        self.params = params
+        self.pool_size = pool_size  # Máximo de conexiones ociosas, no de prestadas
+        self.idle: deque = deque()
+        self.in_use = 0
+        self.total_queries = 0
+        self.healthy = True
+        self.failures = 0
+        self.lag_s: Optional[float] = 0.0
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "role": self.role,
+            "healthy": self.healthy,
+            "lag_s": self.lag_s,
+            "in_use": self.in_use,
+            "idle": len(self.idle),
+            "total_queries": self.total_queries,
+            "failures": self.failures,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+        }
+
+
+class PooledConnection:
+    """Conexión prestada por un nodo; se devuelve al pool al salir del contexto"""
+
+    def __init__(self, raw, node: DBNode, statements: Optional[PreparedStatementCache] = None):
+        self.raw = raw
+        self.node = node
+        # Las sentencias preparadas viven en la sesión: viajan con la conexión cruda
+        self.statements = statements
+        self.discard = False
+
+    def cursor(self):
+        return self.raw.cursor()
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def cancel(self):
+        self.raw.cancel()
+
+    @property
+    def closed(self) -> bool:
+        return bool(getattr(self.raw, "closed", 0))
+
+
+class DBRouter:
+    """Selecciona el nodo para cada consulta y administra los pools"""
+
+    def __init__(
+        self,
+        nodes: List[DBNode],
+        connect_fn: Callable[..., Any] = None,
+        strategy: str = None,
+        max_replica_lag_s: float = None,
+        health_check_interval_s: float = None,
+        routes: Dict[str, str] = None,
+    ):
+        primaries = [node for node in nodes if node.role == ROLE_PRIMARY]
+        if len(primaries) != 1:
+            raise ConfigurationError(
+                f"Se requiere exactamente un nodo primary (hay {len(primaries)})",
+                config_key="DB_NODES",
+            )
+
+        self.nodes = nodes
+        self.primary = primaries[0]
+        self.replicas = [node for node in nodes if node.role == ROLE_REPLICA]
+        self.connect_fn = connect_fn or psycopg2.connect
+        self.strategy = (strategy or Config.DB_ROUTING_STRATEGY).lower()
+        if self.strategy not in STRATEGIES:
+            raise ConfigurationError(
+                f"Estrategia de enrutamiento inválida: {self.strategy}",
+                config_key="DB_ROUTING_STRATEGY",
+            )
+        self.max_replica_lag_s = (
+            Config.DB_MAX_REPLICA_LAG_S if max_replica_lag_s is None else max_replica_lag_s
+        )
+        self.health_check_interval_s = (
+            Config.DB_HEALTH_CHECK_INTERVAL_S
+            if health_check_interval_s is None
+            else health_check_interval_s
+        )
+        self.routes = routes or {
+            "primary": ROLE_PRIMARY,
+            "read": Config.DB_READ_ROUTE,
+            "catalog": Config.DB_CATALOG_ROUTE,
+        }
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, connect_fn: Callable[..., Any] = None) -> "DBRouter":
+        """Construye el router a partir de DB_NODES (o de DB_HOST/DB_PORT/...)"""
+        defaults = {
+            "host": Config.DB_HOST,
+            "port": Config.DB_PORT,
+            "dbname": Config.DB_NAME,
+            "user": Config.DB_USER,
+            "password": Config.DB_PASS,
+        }
+
+        if not Config.DB_NODES.strip():
+            return cls([DBNode("primary", ROLE_PRIMARY, defaults, Config.DB_POOL_SIZE)], connect_fn)
+
+        try:
+            specs = json.loads(Config.DB_NODES)
+        except json.JSONDecodeError as e:
+            raise ConfigurationError(f"DB_NODES no es un JSON válido: {str(e)}", config_key="DB_NODES")
+
+        nodes = []
+        for index, spec in enumerate(specs):
+            spec = dict(spec)
+            name = spec.pop("name", f"node{index}")
+            role = spec.pop("role", ROLE_REPLICA).lower()
+            pool_size = int(spec.pop("pool_size", Config.DB_POOL_SIZE))
+            if role not in (ROLE_PRIMARY, ROLE_REPLICA):
+                raise ConfigurationError(f"Rol inválido para {name}: {role}", config_key="DB_NODES")
+            params = {"dsn": spec.pop("dsn")} if "dsn" in spec else {**defaults, **spec}
+            nodes.append(DBNode(name, role, params, pool_size))
+
+        return cls(nodes, connect_fn)
+
+    # ------------------------------------------------------------------
+    # Selección de nodo
+    # ------------------------------------------------------------------
+
+    def _eligible_replicas(self) -> List[DBNode]:
+        return [
+            node
+            for node in self.replicas
+            if node.healthy and node.lag_s is not None and node.lag_s <= self.max_replica_lag_s
+        ]
+
+    def _candidates(self, route: str) -> List[DBNode]:
+        """Nodos a intentar, en orden de preferencia, para un tipo de ruta"""
+        if route not in ROUTES:
+            raise DatabaseError(f"Ruta de base de datos desconocida: {route}", db_operation="route")
+
+        if self.routes.get(route) != ROLE_REPLICA:
+            return [self.primary]
+
+        with self._lock:
+            replicas = self._eligible_replicas()
+            if self.strategy == "round_robin" and replicas:
+                start = next(self._round_robin) % len(replicas)
+                replicas = replicas[start:] + replicas[:start]
+            else:
+                replicas.sort(key=lambda node: (node.in_use, node.total_queries))
+
+        # El primario queda como respaldo si no hay réplicas utilizables
+        return replicas + [self.primary]
+
+    @contextmanager
+    def connection(self, route: str = "read"):
+        """
+        Presta una conexión del nodo elegido para la ruta
+
+        Yields:
+            PooledConnection
+        """
+        pooled = self._checkout(route)
+        try:
+            yield pooled
+        except Exception as e:
+            if pooled.closed or self._is_connection_error(e):
+                pooled.discard = True
+                self._record_failure(pooled.node, e)
+            else:
+                try:
+                    pooled.rollback()
+                except Exception:
+                    pooled.discard = True
+            raise
+        finally:
+            self._checkin(pooled)
+
+    def _checkout(self, route: str) -> PooledConnection:
+        last_error = None
+        for node in self._candidates(route):
+            with self._lock:
+                raw, statements = node.idle.pop() if node.idle else (None, None)
+                node.in_use += 1
+
+            try:
+                fresh = raw is None or getattr(raw, "closed", 0)
+                if fresh:
+                    raw = self.connect_fn(**node.params)
+                    statements = PreparedStatementCache(Config.DB_PREPARED_CACHE_SIZE)
+                # Bajo el lock: _candidates() ordena por total_queries
+                with self._lock:
+                    if fresh:
+                        node.failures = 0
+                    node.total_queries += 1
+                return PooledConnection(raw, node, statements)
+            except Exception as e:
+                last_error = e
+                with self._lock:
+                    node.in_use -= 1
+                self._record_failure(node, e)
+                logger.warning(f"No se pudo conectar a {node.name}: {str(e)}")
+
+        raise DatabaseError(
+            f"Error al conectar con la base de datos: {str(last_error)}",
+            db_operation="connect",
+        )
+
+    def _checkin(self, pooled: PooledConnection) -> None:
+        node = pooled.node
+        with self._lock:
+            node.in_use -= 1
+            keep = not pooled.discard and not pooled.closed and len(node.idle) < node.pool_size
+            if keep:
+                node.idle.append((pooled.raw, pooled.statements))
+        if not keep:
+            try:
+                pooled.raw.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_connection_error(error: Exception) -> bool:
+        if isinstance(error, pg_errors.QueryCanceled):
+            return False
+        return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+    def _record_failure(self, node: DBNode, error: Exception) -> None:
+        with self._lock:
+            node.failures += 1
+            node.last_error = str(error)
+            if node.failures >= MAX_FAILURES and node.healthy:
+                node.healthy = False
+                logger.error(f"🔴 Nodo {node.name} marcado como no disponible: {str(error)}")
+
+    # ------------------------------------------------------------------
+    # Salud y retraso de réplicas
+    # ------------------------------------------------------------------
+
+    def check_node(self, node: DBNode) -> None:
+        """Actualiza salud y retraso de un nodo con una conexión nueva"""
+        raw = None
+        try:
+            raw = self.connect_fn(**node.params)
+            cur = raw.cursor()
+            cur.execute(HEALTH_QUERY)
+            in_recovery, lag = cur.fetchone()
+            cur.close()
+            raw.rollback()
+
+            was_healthy = node.healthy
+            with self._lock:
+                node.lag_s = float(lag or 0)
+                node.healthy = True
+                node.failures = 0
+                node.last_error = None
+            if node.role == ROLE_PRIMARY and in_recovery:
+                logger.warning(f"El nodo primario {node.name} está en modo recovery")
+            if not was_healthy:
+                logger.info(f"🟢 Nodo {node.name} disponible nuevamente")
+        except Exception as e:
+            with self._lock:
+                node.healthy = False
+                node.lag_s = None
+                node.last_error = str(e)
+            logger.warning(f"Health check fallido en {node.name}: {str(e)}")
+        finally:
+            node.last_check = time.time()
+            if raw is not None:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+
+    def check_health(self) -> None:
+        for node in self.nodes:
+            self.check_node(node)
+
+    def start_health_checks(self) -> None:
+        """Inicia los health checks periódicos en un hilo (solo si hay réplicas)"""
+        if not self.replicas or self._health_thread is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                self.check_health()
+                self._stop.wait(self.health_check_interval_s)
+
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=run, name="db-health", daemon=True)
+        self._health_thread.start()
+
+    def stop(self) -> None:
+        """Detiene los health checks y cierra las conexiones ociosas"""
+        self._stop.set()
+        if self._health_thread is not None:
+            self._health_thread.join(timeout=5)
+            self._health_thread = None
+        for node in self.nodes:
+            with self._lock:
+                idle, node.idle = list(node.idle), deque()
+            for raw, _ in idle:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "routes": dict(self.routes),
+            "max_replica_lag_s": self.max_replica_lag_s,
+            "nodes": [node.get_stats() for node in self.nodes],
+        }
@@ -1,10 +1,25 @@
-from typing import Dict, Any
+from typing import Dict, Any, Callable, Optional, Tuple
 import json
+import time
+from app.services.bedrock_cassette import bedrock_cassette
 from app.services.rag.rag_pipeline import RAGPipeline
 from app.services.database_service import db_service
 from app.services.bedrock_service import BedrockService
+from app.services.query_analytics import query_analytics
 from app.utils.exceptions import BedrockError
+from app.utils.helpers import extract_json_from_response
+from app.utils.json_stream import IncrementalJSONParser
 from app.utils.logging_config import get_logger
+from app.utils.metrics import (
+    BEDROCK_COST,
+    BEDROCK_TOKENS,
+    PROMPT_BLOAT,
+    PROMPT_SIZE,
+    PROMPT_TOKENS,
+    track_stage,
+)
+from app.utils.tokens import attribute_input_tokens, estimate_cost, normalize_usage
+from app.utils.tracing import annotate
 
 # Uso especializado para RAG
 rag_logger = get_logger("enhanced_bedrock_service")
@@ -14,49 +29,79 @@ class EnhancedBedrockService(BedrockService):
     def __init__(self, db_service):
         super().__init__()
         self.rag_pipeline = RAGPipeline(db_service)
-        self.query_history = []
+        # Historial acotado y agregados incrementales (compartidos por el proceso)
+        self.analytics = query_analytics
+        self.query_history = query_analytics.history
         rag_logger.info("✅ EnhancedBedrockService inicializado con soporte RAG")
 
-    def nl_to_sql_with_rag(self, pregunta: str) -> Dict[str, Any]:
-        """Convierte NL a SQL usando RAG para mejor contexto"""
+    def nl_to_sql_with_rag(
+        self,
+        pregunta: str,
+        on_sql_ready: Optional[Callable[[str], None]] = None,
+        enhanced_prompt: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Convierte NL a SQL usando RAG para mejor contexto
+
+        Args:
+            pregunta: Consulta en lenguaje natural
+            on_sql_ready: Callback opcional que recibe `sql_query` en cuanto está
+                completo en el stream, antes de que termine la generación
+            enhanced_prompt: Prompt ya enriquecido (por ejemplo, generado por lotes)
+        """
         try:
             rag_logger.debug(f"Recibiendo consulta en lenguaje natural: '{pregunta}'")
 
             # Mejorar prompt con contexto RAG (ahora incluye detección de gráficos)
-            enhanced_prompt = self.rag_pipeline.enhance_prompt_with_rag(pregunta)
-            rag_logger.debug("Prompt enriquecido con RAG generado correctamente")
-
-            # Llamar a Bedrock
-            response = self.client.invoke_model(
-                modelId=self.config.PROFILE_ARN,
-                body=json.dumps(
-                    {
-                        "anthropic_version": "bedrock-2023-05-31",
-                        "max_tokens": 2500,  # Aumentado por el contexto adicional
-                        "temperature": 0.1,
-                        "messages": [{"role": "user", "content": enhanced_prompt}],
-                    }
-                ),
-            )
+            if enhanced_prompt is None:
+                enhanced_prompt = self.rag_pipeline.enhance_prompt_with_rag(pregunta)
+                rag_logger.debug("Prompt enriquecido con RAG generado correctamente")
+
+            # Llamar a Bedrock (o responder desde el cassette en modo replay)
+            with track_stage("bedrock"):
+                bedrock_start = time.perf_counter()
+                if bedrock_cassette.replaying:
+                    response_text, usage = bedrock_cassette.replay(pregunta, enhanced_prompt)
+                elif self.config.BEDROCK_STREAMING:
+                    response_text, usage = self._invoke_model_streaming(
+                        enhanced_prompt, on_sql_ready
+                    )
+                else:
+                    response_text, usage = self._invoke_model(enhanced_prompt)
+
+            if bedrock_cassette.recording:
+                schema_selector = self.rag_pipeline.schema_selector
+                bedrock_cassette.record(
+                    pregunta,
+                    enhanced_prompt,
+                    response_text,
+                    usage,
+                    time.perf_counter() - bedrock_start,
+                    schema_version=schema_selector.schema_version,
+                    schema=schema_selector.schema_info,
+                )
+
+            tokens = self._account_tokens(enhanced_prompt, usage)
 
-            result = json.loads(response["body"].read())
-            response_text = result["content"][0]["text"].strip()
-            sql_response = json.loads(response_text)
+            sql_response = self._parse_response_json(response_text)
 
             validated_response = self._validate_and_format_response(
                 sql_response, pregunta
             )
+            # Tablas que eligió el selector de esquema para el prompt
+            validated_response["schema_tables"] = list(
+                getattr(enhanced_prompt, "tables", [])
+            )
 
             # Guardar en historial
-            self.query_history.append(
-                {
-                    "pregunta": pregunta,
-                    "sql_query": validated_response.get("sql_query"),
-                    "confidence": validated_response.get("confidence_score"),
-                    "tables_used": validated_response.get("tables_used", []),
-                    "needs_chart": validated_response.get("needs_chart", False),
-                    "chart_type": validated_response.get("chart_type", "none"),
-                }
+            self.analytics.record(
+                pregunta=pregunta,
+                sql_query=validated_response.get("sql_query"),
+                confidence=validated_response.get("confidence_score"),
+                tables_used=validated_response.get("tables_used", []),
+                needs_chart=validated_response.get("needs_chart", False),
+                chart_type=validated_response.get("chart_type", "none"),
+                tokens=tokens,
             )
 
             rag_logger.info(
@@ -65,6 +110,8 @@ class EnhancedBedrockService(BedrockService):
 
             return validated_response
 
+        except BedrockError:
+            raise
         except json.JSONDecodeError as e:
             rag_logger.exception("❌ Error parseando respuesta JSON de Bedrock")
             raise BedrockError(f"Error parseando respuesta JSON de Bedrock: {str(e)}")
@@ -72,6 +119,140 @@ class EnhancedBedrockService(BedrockService):
             rag_logger.exception("❌ Error general en Bedrock con RAG")
             raise BedrockError(f"Error en Bedrock con RAG: {str(e)}")
 
+    def _build_request_body(self, prompt: str) -> str:
+        """Construye el cuerpo de la petición a Bedrock"""
+        return json.dumps(
+            {
+                "anthropic_version": "bedrock-2023-05-31",
+                "max_tokens": self.config.BEDROCK_MAX_TOKENS,
+                "temperature": 0.1,
+                "messages": [{"role": "user", "content": prompt}],
+            }
+        )
+
+    def _account_tokens(self, prompt: str, usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Contabiliza el uso de una llamada: tokens por tipo, atribución por sección
+        del prompt (estimación local calibrada con el total real), costo y alerta
+        de prompt inflado si se supera PROMPT_TOKEN_BUDGET
+        """
+        usage = normalize_usage(usage)
+        # input_tokens no incluye lo leído o escrito en la caché de prompts
+        prompt_tokens = (
+            usage["input_tokens"]
+            + usage["cache_read_input_tokens"]
+            + usage["cache_creation_input_tokens"]
+        )
+        attribution = attribute_input_tokens(prompt, prompt_tokens)
+        if not prompt_tokens:
+            prompt_tokens = attribution["estimated"]
+        sections = attribution["sections"]
+        cost = estimate_cost(usage)
+
+        BEDROCK_TOKENS.inc(usage["input_tokens"], kind="input")
+        BEDROCK_TOKENS.inc(usage["output_tokens"], kind="output")
+        BEDROCK_TOKENS.inc(usage["cache_read_input_tokens"], kind="cache_read")
+        BEDROCK_TOKENS.inc(usage["cache_creation_input_tokens"], kind="cache_write")
+        for section, value in sections.items():
+            PROMPT_TOKENS.inc(value, section=section)
+        PROMPT_SIZE.observe(prompt_tokens)
+        BEDROCK_COST.inc(cost)
+        annotate("input_tokens", usage["input_tokens"])
+        annotate("output_tokens", usage["output_tokens"])
+
+        budget = self.config.PROMPT_TOKEN_BUDGET
+        bloat = bool(budget) and prompt_tokens > budget
+        if bloat:
+            dominant = max(sections, key=sections.get)
+            PROMPT_BLOAT.inc(section=dominant)
+            rag_logger.warning(
+                "⚠️ Prompt inflado: %d tokens de entrada (presupuesto %d); por sección: %s",
+                prompt_tokens,
+                budget,
+                sections,
+            )
+
+        return {
+            "usage": usage,
+            "prompt_tokens": prompt_tokens,
+            "sections": sections,
+            "estimated": attribution["estimated"],
+            "ratio": attribution["ratio"],
+            "cost_usd": cost,
+            "bloat": bloat,
+        }
+
+    def _invoke_model(self, prompt: str) -> Tuple[str, Dict[str, Any]]:
+        """Invoca Bedrock esperando la respuesta completa; devuelve texto y uso de tokens"""
+        response = self.client.invoke_model(
+            modelId=self.config.PROFILE_ARN,
+            body=self._build_request_body(prompt),
+        )
+        annotate("bedrock_request_id", response.get("ResponseMetadata", {}).get("RequestId"))
+
+        result = json.loads(response["body"].read())
+        return result["content"][0]["text"].strip(), result.get("usage", {})
+
+    def _invoke_model_streaming(
+        self, prompt: str, on_sql_ready: Optional[Callable[[str], None]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Invoca Bedrock en modo streaming y parsea el JSON de forma incremental.
+        Notifica `sql_query` por el callback en cuanto su valor está completo.
+        El uso de tokens llega en `message_start` (entrada) y `message_delta` (salida).
+        """
+        response = self.client.invoke_model_with_response_stream(
+            modelId=self.config.PROFILE_ARN,
+            body=self._build_request_body(prompt),
+        )
+        annotate("bedrock_request_id", response.get("ResponseMetadata", {}).get("RequestId"))
+
+        parser = IncrementalJSONParser()
+        sql_notified = False
+        usage: Dict[str, Any] = {}
+
+        for event in response["body"]:
+            chunk = event.get("chunk")
+            if chunk is None:
+                # Los errores del stream llegan como eventos sin 'chunk'
+                raise BedrockError(f"Error en el stream de Bedrock: {event}")
+
+            payload = json.loads(chunk["bytes"])
+            event_type = payload.get("type")
+            if event_type == "message_start":
+                usage.update(payload.get("message", {}).get("usage") or {})
+                continue
+            if event_type == "message_delta":
+                usage.update(payload.get("usage") or {})
+                continue
+            if event_type != "content_block_delta":
+                continue
+
+            completed = parser.feed(payload.get("delta", {}).get("text", ""))
+
+            if (
+                on_sql_ready
+                and not sql_notified
+                and "sql_query" in completed
+                and isinstance(parser.fields.get("sql_query"), str)
+                and parser.fields["sql_query"].strip()
+            ):
+                sql_notified = True
+                rag_logger.debug("sql_query recibido por streaming antes de finalizar")
+                on_sql_ready(parser.fields["sql_query"])
+
+        return parser.get_object_text().strip(), usage
+
+    def _parse_response_json(self, response_text: str) -> Dict[str, Any]:
+        """Parsea el JSON del modelo, con extracción tolerante como fallback"""
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            rag_logger.warning(
+                "⚠️ Respuesta de Bedrock no es JSON puro, aplicando extracción tolerante"
+            )
+            return extract_json_from_response(response_text)
+
     def _validate_and_format_response(
         self, sql_response: Dict, pregunta: str
     ) -> Dict[str, Any]:
@@ -84,7 +265,7 @@ class EnhancedBedrockService(BedrockService):
             "sql_query": sql_response["sql_query"],
             "needs_chart": sql_response.get("needs_chart", False),
             "chart_type": sql_response.get("chart_type", "none"),
-            "chart_fields": sql_response.get("chart_fields", ""),
+            "chart_fields": sql_response.get("chart_fields") or {},
             "confidence_score": sql_response.get("confidence_score", 0.0),
             "tables_used": sql_response.get("tables_used", []),
             "title": sql_response.get("title", ""),
@@ -125,39 +306,8 @@ class EnhancedBedrockService(BedrockService):
 
     def get_query_analytics(self) -> Dict[str, Any]:
         """Obtiene analytics de las consultas realizadas"""
-        if not self.query_history:
-            return {}
-
-        total_queries = len(self.query_history)
-        avg_confidence = (
-            sum(q.get("confidence", 0) for q in self.query_history) / total_queries
-        )
-
-        table_usage = {}
-        chart_usage = {}
-
-        for query in self.query_history:
-            for table in query.get("tables_used", []):
-                table_usage[table] = table_usage.get(table, 0) + 1
-
-            if query.get("needs_chart"):
-                chart_type = query.get("chart_type", "unknown")
-                chart_usage[chart_type] = chart_usage.get(chart_type, 0) + 1
-
         rag_logger.debug("Generando métricas de uso de consultas RAG")
-
-        return {
-            "total_queries": total_queries,
-            "average_confidence": round(avg_confidence, 3),
-            "most_used_tables": sorted(
-                table_usage.items(), key=lambda x: x[1], reverse=True
-            )[:5],
-            "chart_usage": chart_usage,
-            "charts_requested": sum(chart_usage.values()),
-            "charts_percentage": round(
-                (sum(chart_usage.values()) / total_queries) * 100, 1
-            ),
-        }
+        return self.analytics.get_analytics()
 
     def update_rag_schema(self):
         """Actualiza el esquema en el pipeline RAG"""
@@ -0,0 +1,403 @@
+"""
+Métricas de uso de las consultas con memoria acotada.
+
+Las últimas consultas se guardan en un buffer circular (ANALYTICS_HISTORY_SIZE)
+y los agregados se actualizan en cada registro, sin recorrer el historial:
+conteos, media y percentiles de confianza (histograma por bins), tablas más
+usadas (Space-Saving con ANALYTICS_TOP_K contadores), tipos de gráfico y uso de
+tokens de Bedrock (totales, por sección del prompt, por conjunto de tablas y
+por tipo de gráfico).
+Opcionalmente se guarda una instantánea en disco cada
+ANALYTICS_SNAPSHOT_INTERVAL_S segundos, que se restaura al iniciar.
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.config.config import Config
+from app.utils.logging_config import get_logger
+from app.utils.serialization import dumps, loads
+from app.utils.tokens import PROMPT_SECTIONS
+
+logger = get_logger(__name__)
+
+
+class QuantileSketch:
+    """Histograma de ancho fijo sobre [low, high]: percentiles con error <= ancho del bin"""
+
+    def __init__(self, low: float = 0.0, high: float = 1.0, bins: int = 100):
+        self.low = low
+        self.high = high
+        self.bins = [0] * bins
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        span = self.high - self.low
+        index = int((min(max(value, self.low), self.high) - self.low) / span * len(self.bins))
+        self.bins[min(index, len(self.bins) - 1)] += 1
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        target = q * self.count
+        width = (self.high - self.low) / len(self.bins)
+        seen = 0
+        for index, count in enumerate(self.bins):
+            if count and seen + count >= target:
+                # Interpolación lineal dentro del bin
+                fraction = (target - seen) / count
+                return round(self.low + (index + fraction) * width, 4)
+            seen += count
+        return self.high
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"low": self.low, "high": self.high, "bins": self.bins, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["low"], data["high"], len(data["bins"]))
+        sketch.bins = list(data["bins"])
+        sketch.count = data["count"]
+        return sketch
+
+
+class SpaceSaving:
+    """
+    Elementos más frecuentes con k contadores (algoritmo Space-Saving).
+
+    Todo elemento con frecuencia mayor que total/k está garantizado; cada conteo
+    sobreestima el real como mucho en su `error`.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, item: str) -> None:
+        if item in self.counts:
+            self.counts[item] += 1
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = 1
+            self.errors[item] = 0
+        else:
+            # Reemplaza al de menor conteo heredando su conteo como error
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            self.errors.pop(victim, None)
+            self.counts[item] = floor + 1
+            self.errors[item] = floor
+
+    def top(self, n: int) -> List[tuple]:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "counts": self.counts, "errors": self.errors}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpaceSaving":
+        summary = cls(data["capacity"])
+        summary.counts = dict(data["counts"])
+        summary.errors = dict(data["errors"])
+        return summary
+
+
+class TokenStats:
+    """Tokens y costo acumulados: totales, por sección del prompt y por grupo"""
+
+    FIELDS = (
+        "input_tokens",
+        "output_tokens",
+        "cache_read_input_tokens",
+        "cache_creation_input_tokens",
+    )
+    OTHER_GROUP = "otros"
+
+    def __init__(self, max_groups: int):
+        self.max_groups = max_groups
+        self.totals = self._empty()
+        self.sections = {name: 0 for name in PROMPT_SECTIONS}
+        self.by_table_set: Dict[str, Dict[str, Any]] = {}
+        self.by_chart_type: Dict[str, Dict[str, Any]] = {}
+        self.prompt_tokens = QuantileSketch(0, 32000, 320)
+        self.bloat_alerts = 0
+        # Tokens reales y estimados de las llamadas con uso reportado
+        self.measured_tokens = 0
+        self.estimated_tokens = 0
+
+    def _empty(self) -> Dict[str, Any]:
+        return {"calls": 0, **{field: 0 for field in self.FIELDS}, "cost_usd": 0.0}
+
+    def _group(self, groups: Dict[str, Dict[str, Any]], key: str) -> Dict[str, Any]:
+        # Cardinalidad acotada: los grupos nuevos por encima del límite se suman en "otros"
+        if key not in groups and len(groups) >= self.max_groups:
+            key = self.OTHER_GROUP
+        return groups.setdefault(key, self._empty())
+
+    def add(self, tokens: Dict[str, Any], table_set: str, chart_type: str) -> None:
+        usage = tokens["usage"]
+        for entry in (
+            self.totals,
+            self._group(self.by_table_set, table_set),
+            self._group(self.by_chart_type, chart_type),
+        ):
+            entry["calls"] += 1
+            for field in self.FIELDS:
+                entry[field] += usage[field]
+            entry["cost_usd"] += tokens["cost_usd"]
+
+        for name, value in tokens["sections"].items():
+            self.sections[name] = self.sections.get(name, 0) + value
+        self.prompt_tokens.add(tokens["prompt_tokens"])
+        if tokens.get("ratio") is not None:
+            self.measured_tokens += tokens["prompt_tokens"]
+            self.estimated_tokens += tokens["estimated"]
+        if tokens.get("bloat"):
+            self.bloat_alerts += 1
+
+    @staticmethod
+    def _rounded(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {**entry, "cost_usd": round(entry["cost_usd"], 4)}
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        calls = self.totals["calls"]
+        if not calls:
+            return {}
+        section_total = sum(self.sections.values()) or 1
+        table_sets = sorted(
+            self.by_table_set.items(), key=lambda item: item[1]["input_tokens"], reverse=True
+        )[:top]
+        return {
+            **self._rounded(self.totals),
+            "avg_input_tokens": round(self.totals["input_tokens"] / calls, 1),
+            "avg_output_tokens": round(self.totals["output_tokens"] / calls, 1),
+            "prompt_tokens_percentiles": {
+                f"p{int(q * 100)}": self.prompt_tokens.quantile(q) for q in (0.5, 0.9, 0.99)
+            },
+            "sections": {
+                name: {"tokens": value, "share": round(value / section_total, 3)}
+                for name, value in self.sections.items()
+            },
+            # Tokens reales / estimación local (calibración del estimador)
+            "estimate_ratio": (
+                round(self.measured_tokens / self.estimated_tokens, 3)
+                if self.estimated_tokens
+                else None
+            ),
+            "by_table_set": {key: self._rounded(entry) for key, entry in table_sets},
+            "by_chart_type": {key: self._rounded(entry) for key, entry in self.by_chart_type.items()},
+            "bloat_alerts": self.bloat_alerts,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "totals": self.totals,
+            "sections": self.sections,
+            "by_table_set": self.by_table_set,
+            "by_chart_type": self.by_chart_type,
+            "prompt_tokens": self.prompt_tokens.to_dict(),
+            "bloat_alerts": self.bloat_alerts,
+            "measured_tokens": self.measured_tokens,
+            "estimated_tokens": self.estimated_tokens,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], max_groups: int) -> "TokenStats":
+        stats = cls(max_groups)
+        stats.totals = dict(data["totals"])
+        stats.sections = dict(data["sections"])
+        stats.by_table_set = dict(data["by_table_set"])
+        stats.by_chart_type = dict(data["by_chart_type"])
+        stats.prompt_tokens = QuantileSketch.from_dict(data["prompt_tokens"])
+        stats.bloat_alerts = data["bloat_alerts"]
+        stats.measured_tokens = data["measured_tokens"]
+        stats.estimated_tokens = data["estimated_tokens"]
+        return stats
+
+
+class QueryAnalytics:
+    """Historial reciente acotado y agregados incrementales de las consultas"""
+
+    def __init__(self, history_size: int = None, top_k: int = None, snapshot_path: str = None):
+        self.history: deque = deque(maxlen=history_size or Config.ANALYTICS_HISTORY_SIZE)
+        self.top_k = top_k or Config.ANALYTICS_TOP_K
+        self.snapshot_path = snapshot_path or Config.ANALYTICS_SNAPSHOT_PATH
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.total_queries = 0
+        self.confidence_sum = 0.0
+        self.confidence = QuantileSketch()
+        self.tables = SpaceSaving(self.top_k)
+        self.chart_usage: Counter = Counter()
+        self.tokens = TokenStats(self.top_k)
+        self.started_at = time.time()
+
+    # ------------------------------------------------------------------
+    # Registro y consulta
+    # ------------------------------------------------------------------
+
+    def record(
+        self,
+        pregunta: str,
+        sql_query: Optional[str],
+        confidence: Optional[float],
+        tables_used: Iterable[str],
+        needs_chart: bool,
+        chart_type: str,
+        tokens: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Agrega una consulta al historial y actualiza los agregados (O(k))
+
+        `tokens` es la contabilidad de la llamada a Bedrock (ver
+        `EnhancedBedrockService._account_tokens`)
+        """
+        confidence = float(confidence or 0.0)
+        tables_used = list(tables_used or [])
+        entry = {
+            "pregunta": pregunta,
+            "sql_query": sql_query,
+            "confidence": confidence,
+            "tables_used": tables_used,
+            "needs_chart": needs_chart,
+            "chart_type": chart_type,
+            "timestamp": time.time(),
+        }
+        if tokens is not None:
+            entry["tokens"] = {**tokens["usage"], "cost_usd": tokens["cost_usd"]}
+
+        with self._lock:
+            self.history.append(entry)
+            self.total_queries += 1
+            self.confidence_sum += confidence
+            self.confidence.add(confidence)
+            for table in tables_used:
+                self.tables.add(table)
+            if needs_chart:
+                self.chart_usage[chart_type or "unknown"] += 1
+            if tokens is not None:
+                self.tokens.add(
+                    tokens,
+                    table_set=",".join(sorted(set(tables_used))) or "ninguna",
+                    chart_type=(chart_type or "none") if needs_chart else "none",
+                )
+
+    def recent(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Últimas consultas, de la más reciente a la más antigua"""
+        with self._lock:
+            entries = list(self.history)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def get_analytics(self) -> Dict[str, Any]:
+        """Agregados desde el inicio (o desde la última instantánea restaurada)"""
+        with self._lock:
+            if not self.total_queries:
+                return {}
+            charts_requested = sum(self.chart_usage.values())
+            return {
+                "total_queries": self.total_queries,
+                "average_confidence": round(self.confidence_sum / self.total_queries, 3),
+                "confidence_percentiles": {
+                    f"p{int(q * 100)}": self.confidence.quantile(q) for q in (0.5, 0.9, 0.99)
+                },
+                "most_used_tables": self.tables.top(5),
+                "chart_usage": dict(self.chart_usage),
+                "charts_requested": charts_requested,
+                "charts_percentage": round(charts_requested / self.total_queries * 100, 1),
+                "tokens": self.tokens.summary(),
+                "history_size": len(self.history),
+                "since": self.started_at,
+            }
+
+    # ------------------------------------------------------------------
+    # Instantáneas en disco
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> None:
+        """Guarda los agregados y el historial (escritura atómica)"""
+        with self._lock:
+            data = {
+                "total_queries": self.total_queries,
+                "confidence_sum": self.confidence_sum,
+                "confidence": self.confidence.to_dict(),
+                "tables": self.tables.to_dict(),
+                "chart_usage": dict(self.chart_usage),
+                "tokens": self.tokens.to_dict(),
+                "started_at": self.started_at,
+                "history": list(self.history),
+            }
+        directory = os.path.dirname(self.snapshot_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(dumps(data))
+        os.replace(tmp_path, self.snapshot_path)
+
+    def restore(self) -> bool:
+        """Carga la última instantánea si existe"""
+        try:
+            with open(self.snapshot_path, "rb") as snapshot:
+                data = loads(snapshot.read())
+            with self._lock:
+                self.total_queries = data["total_queries"]
+                self.confidence_sum = data["confidence_sum"]
+                self.confidence = QuantileSketch.from_dict(data["confidence"])
+                self.tables = SpaceSaving.from_dict(data["tables"])
+                self.tables.capacity = self.top_k
+                self.chart_usage = Counter(data["chart_usage"])
+                if "tokens" in data:
+                    self.tokens = TokenStats.from_dict(data["tokens"], self.top_k)
+                self.started_at = data["started_at"]
+                self.history.extend(data["history"])
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"No se pudo restaurar la instantánea de analytics: {str(e)}")
+            return False
+        logger.info(f"📈 Analytics restaurados ({self.total_queries} consultas)")
+        return True
+
+    async def start_snapshots(self, interval_s: float = None) -> None:
+        """Restaura la instantánea y la actualiza periódicamente (0 = desactivado)"""
+        interval_s = Config.ANALYTICS_SNAPSHOT_INTERVAL_S if interval_s is None else interval_s
+        if interval_s <= 0 or self._task is not None:
+            return
+        await asyncio.to_thread(self.restore)
+
+        async def run():
+            while True:
+                await asyncio.sleep(interval_s)
+                try:
+                    await asyncio.to_thread(self.snapshot)
+                except OSError as e:
+                    logger.warning(f"No se pudo guardar la instantánea de analytics: {str(e)}")
+
+        self._task = asyncio.create_task(run(), name="analytics-snapshots")
+
+    async def stop_snapshots(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await asyncio.to_thread(self.snapshot)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la instantánea de analytics: {str(e)}")
+
+
+# Instancia global del servicio
+query_analytics = QueryAnalytics()
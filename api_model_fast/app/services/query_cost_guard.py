@@ -0,0 +1,183 @@
+"""
+Guardia de costo basada en el planificador de PostgreSQL.
+
+Ejecuta `EXPLAIN (FORMAT JSON)` sobre el SQL sanitizado y decide, con umbrales
+configurables, si la consulta puede ejecutarse.
+"""
+
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+
+from app.config.config import Config
+from app.utils.exceptions import SecurityValidationError
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class QueryCostEstimate:
+    """Estimación del planificador para una consulta"""
+
+    total_cost: float
+    plan_rows: int
+    max_node_rows: int
+    seq_scans: List[Dict[str, Any]] = field(default_factory=list)
+    large_seq_scans: List[str] = field(default_factory=list)
+    level: str = "low"
+    over_budget: bool = False
+    reasons: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class QueryCostGuard:
+    """Rechaza (o advierte sobre) consultas que superan el presupuesto del planificador"""
+
+    # Caché de tamaños de tabla (reltuples) para detectar seq scans en tablas grandes
+    TABLE_ROWS_TTL = 300
+
+    def __init__(
+        self,
+        db_service,
+        max_total_cost: float = None,
+        max_rows: int = None,
+        large_table_rows: int = None,
+        reject_large_seq_scans: bool = None,
+        action: str = None,
+    ):
+        self.db_service = db_service
+        self.max_total_cost = max_total_cost or Config.QUERY_MAX_TOTAL_COST
+        self.max_rows = max_rows or Config.QUERY_MAX_ROWS
+        self.large_table_rows = large_table_rows or Config.QUERY_LARGE_TABLE_ROWS
+        self.reject_large_seq_scans = (
+            Config.QUERY_REJECT_LARGE_SEQ_SCANS
+            if reject_large_seq_scans is None
+            else reject_large_seq_scans
+        )
+        self.action = (action or Config.QUERY_COST_ACTION).lower()
+        self._table_rows: Dict[str, float] = {}
+        self._table_rows_loaded_at = 0.0
+
+    def estimate(self, sql_query: str) -> QueryCostEstimate:
+        """Obtiene el plan de la consulta y resume su costo"""
+        plan = self.db_service.explain_query(sql_query)
+        root = plan[0]["Plan"]
+
+        nodes = list(self._walk(root))
+        seq_scans = [
+            {"table": node["Relation Name"], "rows": int(node.get("Plan Rows", 0))}
+            for node in nodes
+            if node.get("Node Type") == "Seq Scan" and node.get("Relation Name")
+        ]
+
+        table_rows = self._get_table_rows([scan["table"] for scan in seq_scans])
+        large_seq_scans = sorted(
+            {
+                scan["table"]
+                for scan in seq_scans
+                if table_rows.get(scan["table"], scan["rows"]) >= self.large_table_rows
+            }
+        )
+
+        estimate = QueryCostEstimate(
+            total_cost=float(root.get("Total Cost", 0.0)),
+            plan_rows=int(root.get("Plan Rows", 0)),
+            max_node_rows=max(int(node.get("Plan Rows", 0)) for node in nodes),
+            seq_scans=seq_scans,
+            large_seq_scans=large_seq_scans,
+        )
+
+        if estimate.total_cost > self.max_total_cost:
+            estimate.reasons.append(
+                f"costo total {estimate.total_cost:.0f} > {self.max_total_cost:.0f}"
+            )
+        if estimate.max_node_rows > self.max_rows:
+            estimate.reasons.append(
+                f"filas estimadas {estimate.max_node_rows} > {self.max_rows}"
+            )
+        if large_seq_scans and self.reject_large_seq_scans:
+            estimate.reasons.append(
+                f"seq scan sobre tablas grandes: {', '.join(large_seq_scans)}"
+            )
+
+        estimate.over_budget = bool(estimate.reasons)
+        if estimate.over_budget:
+            estimate.level = "high"
+        elif estimate.total_cost > self.max_total_cost / 10 or large_seq_scans:
+            estimate.level = "medium"
+
+        return estimate
+
+    def check(self, sql_query: str, user_query: str = None) -> QueryCostEstimate:
+        """
+        Estima el costo y aplica la política configurada (QUERY_COST_ACTION)
+
+        Raises:
+            SecurityValidationError: Si la consulta excede el presupuesto y la acción es 'reject'
+        """
+        estimate = self.estimate(sql_query)
+
+        if estimate.over_budget:
+            if self.action == "reject":
+                raise SecurityValidationError(
+                    message=f"La consulta excede el presupuesto de costo ({'; '.join(estimate.reasons)})",
+                    sql_query=sql_query,
+                    user_query=user_query,
+                    operation="query_cost_exceeded",
+                )
+            logger.warning(
+                f"Consulta sobre el presupuesto de costo: {'; '.join(estimate.reasons)}"
+            )
+
+        return estimate
+
+    def _walk(self, node: Dict[str, Any]):
+        """Recorre el árbol del plan en profundidad"""
+        yield node
+        for child in node.get("Plans", []):
+            yield from self._walk(child)
+
+    def _get_table_rows(self, tables: List[str]) -> Dict[str, float]:
+        """Filas estimadas por tabla (pg_class.reltuples), con caché"""
+        if not tables:
+            return {}
+
+        now = time.time()
+        if now - self._table_rows_loaded_at > self.TABLE_ROWS_TTL:
+            self._table_rows = {}
+            self._table_rows_loaded_at = now
+
+        missing = [table for table in set(tables) if table not in self._table_rows]
+        if missing:
+            names = ", ".join("'" + table.replace("'", "''") + "'" for table in missing)
+            try:
+                result = self.db_service.execute_query(
+                    f"SELECT relname, reltuples FROM pg_class "
+                    f"WHERE relkind = 'r' AND relname IN ({names})",
+                    route="catalog",
+                )
+                for relname, reltuples in result.get("data", []):
+                    # reltuples = -1 en tablas nunca analizadas: usar las filas del plan
+                    if reltuples is not None and reltuples >= 0:
+                        self._table_rows[relname] = float(reltuples)
+            except Exception as e:
+                logger.warning(f"No se pudo obtener el tamaño de tablas: {str(e)}")
+
+        return {table: self._table_rows[table] for table in tables if table in self._table_rows}
+
+
+# Instancia compartida (conserva la caché de tamaños de tabla entre peticiones)
+_cost_guard = None
+
+
+def get_cost_guard(db_service) -> Optional[QueryCostGuard]:
+    """Obtiene la guardia de costo compartida si está habilitada en la configuración"""
+    global _cost_guard
+    if not Config.QUERY_COST_GUARD:
+        return None
+    if _cost_guard is None:
+        _cost_guard = QueryCostGuard(db_service)
+    return _cost_guard
@@ -3,11 +3,64 @@ Pipeline RAG optimizado con selección basada en reglas.
 """
 
 import logging
+import time
+from typing import Dict, List, Optional
+from app.config.config import Config
 from app.services.rag.schema_selector import SchemaSelector
 from app.services.chart_detector import ChartDetector
+from app.utils.metrics import observe_stage, track_stage
+from app.utils.tokens import EnhancedPrompt
 
 logger = logging.getLogger(__name__)
 
+# Campos de gráfico cuando el código se genera localmente (prompt reducido)
+CHART_FIELDS_FORMAT = """{
+        "x_axis": "nombre_columna_x o null",
+        "y_axis": "nombre_columna_numerica_y o null",
+        "category_field": "nombre_columna_categoria o null",
+        "color_field": "nombre_columna_color o null"
+    }"""
+
+# Campos de gráfico cuando el LLM también escribe el código (opt-in)
+LLM_CHART_FIELDS_FORMAT = """{
+        "x_axis": "nombre_columna_x o null",
+        "category_field": "nombre_columna_categoria o null",
+        "color_field": "nombre_columna_color o null",
+        "chart_code": "código Python completo usando matplotlib o seaborn para generar el gráfico, o null si no necesita gráfico"
+    }"""
+
+CHART_AXES_SECTION = """# NOTAS DE IMPLEMENTACIÓN
+- La consulta será ejecutada en PostgreSQL.
+- El gráfico se genera automáticamente a partir de chart_type y chart_fields: NO escribas código.
+- x_axis e y_axis deben corresponder a columnas reales del resultado (usa los alias del SELECT).
+- y_axis debe ser una columna numérica (agregación o medida).
+
+"""
+
+LLM_CHART_CODE_SECTION = """# ESPECIFICACIONES PARA chart_code
+Cuando needs_chart es true, debes generar código Python completo que:
+1. Asume que existe un DataFrame llamado `df` con los datos de la consulta SQL
+2. Usa matplotlib.pyplot (importado como plt) o seaborn (importado como sns)
+3. Crea una figura con tamaño apropiado: plt.figure(figsize=(10, 6))
+4. Configura títulos, etiquetas de ejes y leyendas apropiadas
+5. Aplica estilo profesional (grid, colores, etc.)
+6. NO incluye plt.show() al final (será manejado externamente)
+7. Maneja valores nulos o vacíos apropiadamente
+
+Ejemplo de chart_code para un bar chart:
+"import matplotlib.pyplot as plt\\nimport seaborn as sns\\n\\nplt.figure(figsize=(10, 6))\\nsns.barplot(data=df, x='categoria', y='valor')\\nplt.title('Título del Gráfico')\\nplt.xlabel('Categoría')\\nplt.ylabel('Valor')\\nplt.xticks(rotation=45)\\nplt.tight_layout()"
+
+Ejemplo de chart_code para un line chart:
+"import matplotlib.pyplot as plt\\n\\nplt.figure(figsize=(12, 6))\\nplt.plot(df['fecha'], df['valor'], marker='o', linewidth=2)\\nplt.title('Título del Gráfico')\\nplt.xlabel('Fecha')\\nplt.ylabel('Valor')\\nplt.grid(True, alpha=0.3)\\nplt.xticks(rotation=45)\\nplt.tight_layout()"
+
+# NOTAS DE IMPLEMENTACIÓN
+- La consulta será ejecutada en PostgreSQL.
+- El campo chart_code contendrá código Python listo para ejecutar sobre el DataFrame resultante.
+- x_axis debe corresponder a una columna real del DataFrame (derivada directamente de columnas del esquema).
+- El código del gráfico debe ser robusto y manejar casos edge (datos vacíos, valores nulos, etc.).
+
+"""
+
 
 class RAGPipeline:
     """Pipeline RAG para text-to-SQL con detección de gráficos"""
@@ -18,23 +71,46 @@ class RAGPipeline:
         self.chart_detector = ChartDetector()
         logger.info("✅ RAG Pipeline inicializado correctamente")
 
-    def retrieve_relevant_schema(self, natural_language_query: str) -> str:
+    def retrieve_relevant_schema(
+        self, natural_language_query: str, relevant_tables: Optional[List] = None
+    ) -> str:
         """Recupera el esquema relevante para la consulta"""
         try:
-            return self.schema_selector.build_schema_context(natural_language_query)
+            return self.schema_selector.build_schema_context(
+                natural_language_query, relevant_tables
+            )
         except Exception as e:
             logger.error(f"❌ Error recuperando esquema: {e}")
             raise
 
-    def enhance_prompt_with_rag(self, natural_language_query: str) -> str:
+    def enhance_prompt_with_rag(
+        self, natural_language_query: str, chart_requirements: Optional[Dict] = None
+    ) -> str:
         """Mejora el prompt con contexto RAG y detección de gráficos"""
         # Obtener contexto del esquema
-        schema_context = self.retrieve_relevant_schema(natural_language_query)
-
-        # Detectar requisitos de gráfico
-        chart_requirements = self.chart_detector.predict(
-            natural_language_query, schema_context
-        )
+        with track_stage("schema_retrieval"):
+            relevant_tables = self.schema_selector.select_relevant_tables(
+                natural_language_query, max_tables=5
+            )
+            schema_context = self.retrieve_relevant_schema(
+                natural_language_query, relevant_tables
+            )
+
+        # Detectar requisitos de gráfico (salvo que ya vengan de una predicción por lotes)
+        if chart_requirements is None:
+            with track_stage("chart_detection"):
+                chart_requirements = self.chart_detector.predict(
+                    natural_language_query, schema_context
+                )
+
+        prompt_start = time.perf_counter()
+
+        if Config.LLM_CHART_CODE:
+            chart_fields_format = LLM_CHART_FIELDS_FORMAT
+            chart_code_section = LLM_CHART_CODE_SECTION
+        else:
+            chart_fields_format = CHART_FIELDS_FORMAT
+            chart_code_section = CHART_AXES_SECTION
 
         logger.info(
             "🔍 Generando prompt enriquecido con RAG para la consulta: '%s' (necesita gráfico: %s, tipo: %s)",
@@ -82,12 +158,7 @@ Si la consulta no puede generarse sin violar las reglas anteriores, responde con
     "sql_query": "Consulta SQL aquí",
     "needs_chart": {str(chart_requirements['needs_chart']).lower()},
     "chart_type": "bar|line|scatter|pie|histogram|area|box_plot|null",
-    "chart_fields": {{
-        "x_axis": "nombre_columna_x o null",
-        "category_field": "nombre_columna_categoria o null",
-        "color_field": "nombre_columna_color o null",
-        "chart_code": "código Python completo usando matplotlib o seaborn para generar el gráfico, o null si no necesita gráfico"
-    }},
+    "chart_fields": {chart_fields_format},
     "confidence_score": 0.95,
     "tables_used": ["tabla1", "tabla2"],
     "title": "Titulo sugerido de la consulta"
@@ -103,33 +174,40 @@ Si la consulta no puede generarse sin violar las reglas anteriores, responde con
 - box_plot: x_axis = categoría (opcional)
 - null: cuando no se necesita gráfico
 
-# ESPECIFICACIONES PARA chart_code
-Cuando needs_chart es true, debes generar código Python completo que:
-1. Asume que existe un DataFrame llamado `df` con los datos de la consulta SQL
-2. Usa matplotlib.pyplot (importado como plt) o seaborn (importado como sns)
-3. Crea una figura con tamaño apropiado: plt.figure(figsize=(10, 6))
-4. Configura títulos, etiquetas de ejes y leyendas apropiadas
-5. Aplica estilo profesional (grid, colores, etc.)
-6. NO incluye plt.show() al final (será manejado externamente)
-7. Maneja valores nulos o vacíos apropiadamente
-
-Ejemplo de chart_code para un bar chart:
-"import matplotlib.pyplot as plt\\nimport seaborn as sns\\n\\nplt.figure(figsize=(10, 6))\\nsns.barplot(data=df, x='categoria', y='valor')\\nplt.title('Título del Gráfico')\\nplt.xlabel('Categoría')\\nplt.ylabel('Valor')\\nplt.xticks(rotation=45)\\nplt.tight_layout()"
+{chart_code_section}# CONSULTA DEL USUARIO
+"{natural_language_query}"
+"""
+        observe_stage("prompt_build", time.perf_counter() - prompt_start)
+
+        # Conserva las secciones para atribuir los tokens de entrada
+        return EnhancedPrompt(
+            enhanced_prompt,
+            schema=schema_context,
+            question=natural_language_query,
+            tables=[table for table, _ in relevant_tables],
+        )
 
-Ejemplo de chart_code para un line chart:
-"import matplotlib.pyplot as plt\\n\\nplt.figure(figsize=(12, 6))\\nplt.plot(df['fecha'], df['valor'], marker='o', linewidth=2)\\nplt.title('Título del Gráfico')\\nplt.xlabel('Fecha')\\nplt.ylabel('Valor')\\nplt.grid(True, alpha=0.3)\\nplt.xticks(rotation=45)\\nplt.tight_layout()"
+    def enhance_prompts_batch(self, natural_language_queries: List[str]) -> List[str]:
+        """
+        Genera los prompts de varias consultas compartiendo el trabajo común:
+        una sola pasada por lotes del detector de gráficos y un prompt por pregunta distinta
+        """
+        unique_queries = list(dict.fromkeys(natural_language_queries))
+        with track_stage("chart_detection"):
+            chart_predictions = self.chart_detector.predict_batch(unique_queries)
 
-# NOTAS DE IMPLEMENTACIÓN
-- La consulta será ejecutada en PostgreSQL.
-- El campo chart_code contendrá código Python listo para ejecutar sobre el DataFrame resultante.
-- x_axis debe corresponder a una columna real del DataFrame (derivada directamente de columnas del esquema).
-- El código del gráfico debe ser robusto y manejar casos edge (datos vacíos, valores nulos, etc.).
+        prompts = {
+            query: self.enhance_prompt_with_rag(query, chart_requirements)
+            for query, chart_requirements in zip(unique_queries, chart_predictions)
+        }
 
-# CONSULTA DEL USUARIO
-"{natural_language_query}"
-"""
+        logger.info(
+            "🔍 Prompts por lotes generados: %d consultas (%d distintas)",
+            len(natural_language_queries),
+            len(unique_queries),
+        )
 
-        return enhanced_prompt
+        return [prompts[query] for query in natural_language_queries]
 
     def update_schema(self):
         """Actualiza el esquema (reconstruye índices)"""
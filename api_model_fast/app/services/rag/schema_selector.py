@@ -4,8 +4,10 @@ Reemplaza embeddings por búsqueda por keywords + relaciones.
 """
 
 import re
+import json
+import hashlib
 import logging
-from typing import Dict, List, Set, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
@@ -32,10 +34,12 @@ class SchemaSelector:
         self.db_service = db_service
         self.tables_metadata: Dict[str, TableMetadata] = {}
         self.keyword_index: Dict[str, Set[str]] = {}
+        self.schema_info: Dict = {}
+        self.schema_version: str = ""
         self._build_indexes()
 
     def _extract_schema_from_db(self) -> Dict:
-        """Extrae el esquema completo de la base de datos"""
+        """Extrae el esquema completo de la base de datos (ruta de catálogo)"""
         try:
             # Obtener todas las tablas
             tables_query = """
@@ -45,7 +49,7 @@ class SchemaSelector:
                 AND table_type = 'BASE TABLE'
                 ORDER BY table_name
             """
-            tables_result = self.db_service.execute_query(tables_query)
+            tables_result = self.db_service.execute_query(tables_query, route="catalog")
             tables = [row[0] for row in tables_result["data"]]
 
             schema_info = {}
@@ -58,7 +62,7 @@ class SchemaSelector:
                     WHERE table_name = '{table}'
                     ORDER BY ordinal_position
                 """
-                columns_result = self.db_service.execute_query(columns_query)
+                columns_result = self.db_service.execute_query(columns_query, route="catalog")
 
                 # Obtener relaciones (FKs)
                 relations_query = f"""
@@ -73,7 +77,7 @@ class SchemaSelector:
                         ON ccu.constraint_name = tc.constraint_name
                     WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_name = '{table}'
                 """
-                relations_result = self.db_service.execute_query(relations_query)
+                relations_result = self.db_service.execute_query(relations_query, route="catalog")
 
                 schema_info[table] = {
                     "columns": [
@@ -108,7 +112,7 @@ class SchemaSelector:
                 AND n.nspname = 'public'
                 ORDER BY tbl.table_name, col.ordinal_position
             """
-            comments_result = self.db_service.execute_query(comments_query)
+            comments_result = self.db_service.execute_query(comments_query, route="catalog")
 
             # Integrar comentarios
             comments = {}
@@ -141,6 +145,11 @@ class SchemaSelector:
         """Construye índices de búsqueda rápida"""
         schema = self._extract_schema_from_db()
 
+        # Construir desde cero y publicar al final, para no conservar tablas
+        # eliminadas ni exponer índices a medio construir
+        tables_metadata: Dict[str, TableMetadata] = {}
+        keyword_index: Dict[str, Set[str]] = {}
+
         for table_name, table_info in schema.items():
             keywords = self._extract_keywords(table_name, table_info)
 
@@ -152,13 +161,21 @@ class SchemaSelector:
                 description=table_info.get("table_comment", ""),
             )
 
-            self.tables_metadata[table_name] = metadata
+            tables_metadata[table_name] = metadata
 
             # Indexar keywords -> tablas
             for keyword in keywords:
-                if keyword not in self.keyword_index:
-                    self.keyword_index[keyword] = set()
-                self.keyword_index[keyword].add(table_name)
+                if keyword not in keyword_index:
+                    keyword_index[keyword] = set()
+                keyword_index[keyword].add(table_name)
+
+        self.tables_metadata = tables_metadata
+        self.keyword_index = keyword_index
+        self.schema_info = schema
+        # Huella del esquema: cambia solo si cambian tablas, columnas o relaciones
+        self.schema_version = hashlib.sha1(
+            json.dumps(schema, sort_keys=True, default=str).encode()
+        ).hexdigest()[:12]
 
         logger.info(
             f"✅ Índices construidos: {len(self.tables_metadata)} tablas, "
@@ -306,14 +323,18 @@ class SchemaSelector:
 
         return final_scores[:max_tables]
 
-    def build_schema_context(self, query: str) -> str:
-        """Construye contexto de esquema para el LLM"""
-        relevant_tables = self.select_relevant_tables(query, max_tables=5)
+    def build_schema_context(
+        self, query: str, relevant_tables: Optional[List[Tuple[str, float]]] = None
+    ) -> str:
+        """Construye contexto de esquema para el LLM (con las tablas ya elegidas, si vienen)"""
+        if relevant_tables is None:
+            relevant_tables = self.select_relevant_tables(query, max_tables=5)
 
         if not relevant_tables:
             return "No se encontraron tablas relevantes."
 
-        full_schema = self._extract_schema_from_db()
+        # Esquema cacheado al construir los índices (se refresca con update_schema)
+        full_schema = self.schema_info
 
         context = "ESQUEMA DE BASE DE DATOS RELEVANTE (TODOS LOS CAMPOS):\n\n"
 
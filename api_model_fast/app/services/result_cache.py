@@ -0,0 +1,227 @@
+"""
+Caché de resultados de corta duración para paginar respuestas grandes.
+
+La respuesta incluye solo la primera página; el resto de las filas queda en
+memoria durante RESULT_CACHE_TTL_S y se sirve por `GET /rag/results/{token}`.
+El token es opaco y está firmado (HMAC con SECRET_KEY), por lo que el cliente
+no puede alterar el offset ni el tamaño de página.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.config.config import Config
+from app.utils.exceptions import ValidationError
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+MAX_PAGE_SIZE = 1000
+
+
+@dataclass
+class CachedResult:
+    """Filas de una consulta guardadas para paginar"""
+
+    columns: List[str]
+    rows: List[Any]
+    created_at: float
+    truncated: bool
+
+
+class ResultCache:
+    """Caché LRU con TTL, acotada por cantidad total de filas"""
+
+    def __init__(
+        self,
+        ttl_seconds: int = None,
+        max_rows: int = None,
+        page_size: int = None,
+        secret: str = None,
+    ):
+        self.ttl_seconds = ttl_seconds or Config.RESULT_CACHE_TTL_S
+        self.max_rows = max_rows or Config.RESULT_CACHE_MAX_ROWS
+        self.page_size = page_size or Config.RESULT_PAGE_SIZE
+        self._secret = (secret or Config.SECRET_KEY).encode()
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._total_rows = 0
+
+    # ------------------------------------------------------------------
+    # Paginación
+    # ------------------------------------------------------------------
+
+    def paginate(self, resultados: Dict[str, Any], max_rows: int = None) -> Dict[str, Any]:
+        """
+        Devuelve la primera página de un resultado y guarda el resto
+
+        Args:
+            resultados: Resultado de la base ({"columns", "data"})
+            max_rows: Límite aplicado a la consulta, para indicar si pudo truncarse
+
+        Returns:
+            Dict con columns, data (primera página) y pagination
+        """
+        if "data" not in resultados:
+            # Operaciones sin filas (no SELECT): se devuelven tal cual
+            return resultados
+
+        columns = resultados.get("columns", [])
+        rows = resultados["data"]
+        max_rows = max_rows or Config.RESULT_MAX_ROWS
+        truncated = len(rows) >= max_rows
+
+        next_cursor = None
+        if len(rows) > self.page_size:
+            result_id = self._store(columns, rows, truncated)
+            next_cursor = self._encode_cursor(result_id, self.page_size, self.page_size)
+
+        return {
+            "columns": columns,
+            "data": rows[: self.page_size],
+            "pagination": self._pagination(
+                offset=0,
+                returned=min(len(rows), self.page_size),
+                total=len(rows),
+                truncated=truncated,
+                next_cursor=next_cursor,
+            ),
+        }
+
+    def get_page(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene la página indicada por un cursor
+
+        Returns:
+            Dict con columns, data y pagination, o None si el resultado expiró
+
+        Raises:
+            ValidationError: Si el cursor es inválido
+        """
+        result_id, offset, page_size = self._decode_cursor(token)
+
+        self._evict_expired()
+        entry = self._entries.get(result_id)
+        if entry is None:
+            return None
+        self._entries.move_to_end(result_id)
+
+        rows = entry.rows[offset : offset + page_size]
+        end = offset + len(rows)
+        next_cursor = (
+            self._encode_cursor(result_id, end, page_size) if end < len(entry.rows) else None
+        )
+
+        return {
+            "columns": entry.columns,
+            "data": rows,
+            "pagination": self._pagination(
+                offset=offset,
+                returned=len(rows),
+                total=len(entry.rows),
+                truncated=entry.truncated,
+                next_cursor=next_cursor,
+                expires_in=max(0, int(entry.created_at + self.ttl_seconds - time.time())),
+                page_size=page_size,
+            ),
+        }
+
+    def _pagination(
+        self,
+        offset: int,
+        returned: int,
+        total: int,
+        truncated: bool,
+        next_cursor: Optional[str],
+        expires_in: Optional[int] = None,
+        page_size: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        return {
+            "offset": offset,
+            "page_size": page_size or self.page_size,
+            "returned_rows": returned,
+            "total_rows": total,
+            "truncated": truncated,
+            "has_more": next_cursor is not None,
+            "next_cursor": next_cursor,
+            "expires_in": self.ttl_seconds if expires_in is None else expires_in,
+        }
+
+    # ------------------------------------------------------------------
+    # Almacenamiento
+    # ------------------------------------------------------------------
+
+    def _store(self, columns: List[str], rows: List[Any], truncated: bool) -> str:
+        self._evict_expired()
+
+        result_id = secrets.token_urlsafe(12)
+        self._entries[result_id] = CachedResult(
+            columns=list(columns), rows=rows, created_at=time.time(), truncated=truncated
+        )
+        self._total_rows += len(rows)
+
+        # Desalojar los menos usados si se supera el total de filas
+        while self._total_rows > self.max_rows and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_rows -= len(evicted.rows)
+            logger.debug("Resultado paginado desalojado por tamaño de caché")
+
+        return result_id
+
+    def _evict_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        # El orden es por uso, no por antigüedad: revisar todas las entradas
+        expired = [rid for rid, entry in self._entries.items() if entry.created_at <= cutoff]
+        for result_id in expired:
+            self._total_rows -= len(self._entries.pop(result_id).rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "cached_rows": self._total_rows,
+            "max_rows": self.max_rows,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    # ------------------------------------------------------------------
+    # Cursor opaco
+    # ------------------------------------------------------------------
+
+    def _sign(self, payload: bytes) -> str:
+        return hmac.new(self._secret, payload, hashlib.sha256).hexdigest()[:16]
+
+    def _encode_cursor(self, result_id: str, offset: int, page_size: int) -> str:
+        payload = json.dumps(
+            {"r": result_id, "o": offset, "s": page_size}, separators=(",", ":")
+        ).encode()
+        encoded = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+        return f"{encoded}.{self._sign(payload)}"
+
+    def _decode_cursor(self, token: str):
+        try:
+            encoded, signature = token.rsplit(".", 1)
+            payload = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            if not hmac.compare_digest(signature, self._sign(payload)):
+                raise ValueError("firma inválida")
+            data = json.loads(payload)
+            result_id, offset, page_size = str(data["r"]), int(data["o"]), int(data["s"])
+            if offset < 0 or not 0 < page_size <= MAX_PAGE_SIZE:
+                raise ValueError("rango inválido")
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValidationError(
+                f"Cursor de resultados inválido: {str(e)}",
+                field="token",
+                value=token[:50],
+                validation_rule="signed_cursor",
+            )
+        return result_id, offset, page_size
+
+
+# Instancia global del servicio
+result_cache = ResultCache()
@@ -0,0 +1,189 @@
+"""
+Validación local del SQL generado contra el esquema cacheado.
+
+Resuelve cada tabla y columna referenciada (con alias y CTEs) contra
+`SchemaSelector.tables_metadata` antes de ejecutar, de modo que las tablas o
+columnas inventadas por el modelo se detectan sin abrir una conexión.
+"""
+
+import difflib
+from typing import Dict, FrozenSet, List, Optional
+
+from app.config.config import Config
+from app.services.sql_analyzer import SQLAnalysis, TableRef, analyze_sql
+from app.utils.exceptions import SchemaReferenceError
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Esquemas que no están en el catálogo cacheado (se omiten)
+CATALOG_SCHEMA = "public"
+
+MAX_SUGGESTIONS = 3
+SUGGESTION_CUTOFF = 0.6
+
+
+class SchemaReferenceChecker:
+    """Verifica referencias a tablas y columnas usando solo memoria"""
+
+    def __init__(self, schema_selector):
+        self.schema_selector = schema_selector
+        self._version: Optional[str] = None
+        self._columns: Dict[str, FrozenSet[str]] = {}
+        self._table_names: List[str] = []
+
+    def _refresh(self) -> None:
+        """Reconstruye las búsquedas si cambió la versión del esquema"""
+        version = self.schema_selector.schema_version
+        if version == self._version:
+            return
+        self._columns = {
+            name: frozenset(metadata.columns)
+            for name, metadata in self.schema_selector.tables_metadata.items()
+        }
+        self._table_names = sorted(self._columns)
+        self._version = version
+
+    def check(self, sql_query: str, user_query: str = None) -> SQLAnalysis:
+        """
+        Verifica que todas las tablas y columnas existan
+
+        Returns:
+            SQLAnalysis: Análisis de la consulta (cacheado)
+
+        Raises:
+            SchemaReferenceError: Con las referencias desconocidas y sugerencias
+        """
+        self._refresh()
+        analysis = analyze_sql(sql_query)
+        ctes = set(analysis.ctes)
+
+        unknown_tables = []
+        # Calificador (alias o nombre de tabla) -> columnas conocidas
+        sources: Dict[str, Optional[FrozenSet[str]]] = {}
+
+        for ref in analysis.tables:
+            if not self._in_catalog(ref) or (ref.schema is None and ref.name in ctes):
+                columns = None
+            elif ref.name in self._columns:
+                columns = self._columns[ref.name]
+            else:
+                columns = None
+                unknown_tables.append(
+                    {
+                        "table": ref.qualified_name,
+                        "suggestions": self._suggest(ref.name, self._table_names),
+                    }
+                )
+            sources[ref.name] = columns
+            if ref.alias:
+                sources[ref.alias] = columns
+
+        # Subconsultas, funciones y CTEs: columnas desconocidas para el catálogo
+        for name in (*analysis.derived_aliases, *ctes):
+            sources.setdefault(name, None)
+
+        unknown_columns = self._check_columns(analysis, sources)
+
+        if unknown_tables or unknown_columns:
+            parts = [f"tabla '{t['table']}'" for t in unknown_tables] + [
+                f"columna '{c['column']}'" for c in unknown_columns
+            ]
+            logger.warning(f"SQL con referencias desconocidas: {', '.join(parts)}")
+            raise SchemaReferenceError(
+                f"El SQL referencia objetos inexistentes: {', '.join(parts)}",
+                sql_query=sql_query,
+                unknown_tables=unknown_tables,
+                unknown_columns=unknown_columns,
+                user_query=user_query,
+            )
+
+        return analysis
+
+    def _check_columns(
+        self, analysis: SQLAnalysis, sources: Dict[str, Optional[FrozenSet[str]]]
+    ) -> List[Dict]:
+        unknown = []
+        seen = set()
+
+        # Las columnas sin calificar solo se resuelven si todas las fuentes son tablas
+        # conocidas: con CTEs o subconsultas podrían venir de ellas
+        known_sources = [cols for cols in sources.values() if cols is not None]
+        check_unqualified = (
+            not analysis.ctes
+            and not analysis.has_derived_sources
+            and len(known_sources) == len(sources)
+        )
+        all_columns = frozenset().union(*known_sources) if known_sources else frozenset()
+        allowed_names = set(analysis.output_aliases) | set(sources)
+
+        for column in analysis.columns:
+            key = (column.qualifier, column.name)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            if column.qualifier is not None:
+                if column.schema is not None and column.schema != CATALOG_SCHEMA:
+                    continue
+                if column.qualifier not in sources:
+                    unknown.append(
+                        {
+                            "column": f"{column.qualifier}.{column.name}",
+                            "table": None,
+                            "suggestions": self._suggest(column.qualifier, list(sources)),
+                        }
+                    )
+                    continue
+                columns = sources[column.qualifier]
+                if columns is not None and column.name not in columns:
+                    unknown.append(
+                        {
+                            "column": f"{column.qualifier}.{column.name}",
+                            "table": self._table_of(analysis, column.qualifier),
+                            "suggestions": self._suggest(column.name, columns),
+                        }
+                    )
+            elif check_unqualified and all_columns:
+                if column.name not in all_columns and column.name not in allowed_names:
+                    unknown.append(
+                        {
+                            "column": column.name,
+                            "table": None,
+                            "suggestions": self._suggest(column.name, all_columns),
+                        }
+                    )
+
+        return unknown
+
+    @staticmethod
+    def _in_catalog(ref: TableRef) -> bool:
+        return ref.schema is None or ref.schema == CATALOG_SCHEMA
+
+    @staticmethod
+    def _table_of(analysis: SQLAnalysis, qualifier: str) -> Optional[str]:
+        for ref in analysis.tables:
+            if qualifier in (ref.alias, ref.name):
+                return ref.name
+        return None
+
+    @staticmethod
+    def _suggest(name: str, candidates) -> List[str]:
+        """Nombres más parecidos (difflib) para proponer una corrección"""
+        return difflib.get_close_matches(
+            name, sorted(candidates), n=MAX_SUGGESTIONS, cutoff=SUGGESTION_CUTOFF
+        )
+
+
+# Instancia compartida (conserva las búsquedas mientras no cambie el esquema)
+_schema_checker = None
+
+
+def get_schema_checker(schema_selector) -> Optional[SchemaReferenceChecker]:
+    """Obtiene el verificador compartido si está habilitado en la configuración"""
+    global _schema_checker
+    if not Config.SCHEMA_CHECK:
+        return None
+    if _schema_checker is None or _schema_checker.schema_selector is not schema_selector:
+        _schema_checker = SchemaReferenceChecker(schema_selector)
+    return _schema_checker
@@ -1,8 +1,10 @@
-import re
-import sqlparse
 from sqlparse.tokens import Token, Keyword
 from sqlparse.sql import Statement, Identifier, Where, Comparison
 from typing import List, Optional
+from app.config.config import Config
+from app.services.database_service import db_service
+from app.services.query_cost_guard import get_cost_guard
+from app.services.sql_analyzer import DANGEROUS_PATTERNS, SQLAnalysis, analyze_sql
 from app.utils.exceptions import SecurityValidationError
 
 class SQLSecurityValidator:
@@ -12,31 +14,7 @@ class SQLSecurityValidator:
     """
     
     # Patrones peligrosos que no deben aparecer en consultas generadas
-    DANGEROUS_PATTERNS = [
-        r"DROP\s+TABLE",
-        r"DELETE\s+FROM",
-        r"UPDATE\s+\w+\s+SET",
-        r"INSERT\s+INTO",
-        r"CREATE\s+TABLE",
-        r"ALTER\s+TABLE",
-        r"GRANT\s+",
-        r"REVOKE\s+",
-        r"TRUNCATE\s+TABLE",
-        r"EXECUTE\s+",
-        r"EXEC\s+",
-        r"CREATE\s+FUNCTION",
-        r"CREATE\s+PROCEDURE",
-        r"CREATE\s+VIEW",
-        r"VACUUM\s+",
-        r"ANALYZE\s+",
-        r"REINDEX\s+",
-        r"LOCK\s+TABLE",
-        r"UNLOCK\s+TABLE",
-        r"BEGIN\s+TRANSACTION",
-        r"COMMIT\s+TRANSACTION",
-        r"ROLLBACK",
-        r"SAVEPOINT",
-    ]
+    DANGEROUS_PATTERNS = DANGEROUS_PATTERNS
     
     # Palabras clave SQL permitidas (solo consultas SELECT)
     ALLOWED_KEYWORDS = {
@@ -58,9 +36,9 @@ class SQLSecurityValidator:
         'sqrt', 'random', 'row_number', 'rank', 'dense_rank', 'lag', 'lead'
     }
     
-    def __init__(self, max_query_length: int = 10000):
+    def __init__(self, max_query_length: int = 10000, cost_guard=None):
         self.max_query_length = max_query_length
-        self.compiled_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in self.DANGEROUS_PATTERNS]
+        self.cost_guard = cost_guard
     
     def validate_sql_query(self, sql_query: str, user_query: str = None) -> bool:
         """
@@ -73,6 +51,16 @@ class SQLSecurityValidator:
         Returns:
             bool: True si la consulta es segura
             
+        Raises:
+            SecurityValidationError: Si la consulta no es segura
+        """
+        self.analyze(sql_query, user_query)
+        return True
+    
+    def analyze(self, sql_query: str, user_query: str = None) -> SQLAnalysis:
+        """
+        Valida la consulta y devuelve su análisis (compartido por validar y sanitizar)
+        
         Raises:
             SecurityValidationError: Si la consulta no es segura
         """
@@ -92,43 +80,29 @@ class SQLSecurityValidator:
                 operation="query_too_long"
             )
         
+        # Una sola pasada: tokens, tablas, LIMIT y patrones peligrosos (cacheado)
+        analysis = analyze_sql(sql_query)
+        
         # Validar patrones peligrosos
-        for i, pattern in enumerate(self.compiled_patterns):
-            if pattern.search(sql_query):
-                raise SecurityValidationError(
-                    message="Operación SQL peligrosa detectada",
-                    sql_query=sql_query,
-                    dangerous_pattern=self.DANGEROUS_PATTERNS[i],
-                    user_query=user_query,
-                    operation="dangerous_operation"
-                )
+        if analysis.dangerous:
+            raise SecurityValidationError(
+                message="Operación SQL peligrosa detectada",
+                sql_query=sql_query,
+                dangerous_pattern=analysis.dangerous[0].pattern,
+                user_query=user_query,
+                operation="dangerous_operation"
+            )
         
         # Validar sintaxis SQL
-        try:
-            parsed = sqlparse.parse(sql_query)
-            if not parsed:
-                raise SecurityValidationError(
-                    message="La consulta SQL no es válida",
-                    sql_query=sql_query,
-                    user_query=user_query,
-                    operation="invalid_syntax"
-                )
-            
-            # Validar que sea una consulta SELECT
-            #self._validate_select_only(parsed[0], sql_query, user_query)
-            
-            # Validar palabras clave
-            # self._validate_keywords(parsed[0], sql_query, user_query)
-            
-        except sqlparse.exceptions.SQLParseError as e:
+        if analysis.is_empty:
             raise SecurityValidationError(
-                message=f"Error parseando SQL: {str(e)}",
+                message="La consulta SQL no es válida",
                 sql_query=sql_query,
                 user_query=user_query,
-                operation="parse_error"
+                operation="invalid_syntax"
             )
         
-        return True
+        return analysis
     
     def _validate_select_only(self, statement: Statement, sql_query: str, user_query: str = None):
         """Valida que la consulta sea solo SELECT"""
@@ -170,13 +144,13 @@ class SQLSecurityValidator:
         func_name = token.normalized.lower()
         return func_name in self.ALLOWED_FUNCTIONS
     
-    def sanitize_sql_query(self, sql_query: str, default_limit: int = 1000) -> str:
+    def sanitize_sql_query(self, sql_query: str, default_limit: int = None) -> str:
         """
         Sanitiza y asegura la consulta SQL
         
         Args:
             sql_query: Consulta SQL a sanitizar
-            default_limit: Límite por defecto si no existe
+            default_limit: Máximo de filas a traer (por defecto RESULT_MAX_ROWS)
             
         Returns:
             str: Consulta SQL sanitizada
@@ -184,35 +158,34 @@ class SQLSecurityValidator:
         if not sql_query or not sql_query.strip():
             return "SELECT 1"  # Consulta por defecto segura
         
-        # Primero validar la consulta
-        self.validate_sql_query(sql_query)
-        
-        # Parsear la consulta
-        parsed = sqlparse.parse(sql_query)
-        if not parsed:
-            return f"SELECT 1 LIMIT {default_limit}"
+        # Validar y reutilizar el análisis de la consulta
+        analysis = self.analyze(sql_query)
         
-        statement = parsed[0]
+        if default_limit is None:
+            default_limit = Config.RESULT_MAX_ROWS
         
-        # Agregar límite si no existe
-        if not self._has_limit(statement):
+        # Agregar límite si no existe (LIMIT real, no columnas como credit_limit)
+        if not analysis.has_limit:
             sql_query = self._add_limit_to_query(sql_query, default_limit)
+        elif analysis.limit is None or analysis.limit > default_limit:
+            # LIMIT ALL o mayor al máximo: acotar sin reescribir la consulta original
+            sql_query = self._cap_limit(sql_query, default_limit)
         
         return sql_query
     
-    def _has_limit(self, statement: Statement) -> bool:
-        """Verifica si la consulta ya tiene LIMIT"""
-        sql_lower = statement.value.lower()
-        return 'limit' in sql_lower
-    
     def _add_limit_to_query(self, sql_query: str, limit: int) -> str:
         """Agrega LIMIT a la consulta SQL"""
         # Remover punto y coma final si existe
-        sql_query = sql_query.rstrip(';')
+        sql_query = sql_query.strip().rstrip(';')
         
         # Agregar LIMIT
         return f"{sql_query} LIMIT {limit};"
     
+    def _cap_limit(self, sql_query: str, limit: int) -> str:
+        """Envuelve la consulta para no traer más de `limit` filas"""
+        sql_query = sql_query.strip().rstrip(';')
+        return f"SELECT * FROM ({sql_query}) AS limited_result LIMIT {limit};"
+    
     def get_validation_report(self, sql_query: str, user_query: str = None) -> dict:
         """
         Genera un reporte detallado de validación
@@ -230,7 +203,7 @@ class SQLSecurityValidator:
             "checks_failed": [],
             "warnings": [],
             "query_length": len(sql_query),
-            "estimated_cost": self._estimate_query_cost(sql_query)
+            "estimated_cost": None
         }
         
         try:
@@ -244,6 +217,23 @@ class SQLSecurityValidator:
                 "allowed_keywords",
                 "query_length"
             ]
+
+            # Estimación del planificador (EXPLAIN) si hay guardia de costo
+            if self.cost_guard is not None:
+                try:
+                    estimate = self.cost_guard.estimate(self.sanitize_sql_query(sql_query))
+                except SecurityValidationError:
+                    raise
+                except Exception as e:
+                    report["warnings"].append(f"No se pudo estimar el costo: {str(e)}")
+                else:
+                    report["estimated_cost"] = estimate.to_dict()
+                    if estimate.over_budget:
+                        report["warnings"].extend(estimate.reasons)
+                        report["checks_failed"].append("query_cost")
+                        report["is_valid"] = self.cost_guard.action != "reject"
+                    else:
+                        report["checks_passed"].append("query_cost")
             
         except SecurityValidationError as e:
             report["checks_failed"] = [e.operation]
@@ -255,35 +245,28 @@ class SQLSecurityValidator:
         
         return report
     
-    def _estimate_query_cost(self, sql_query: str) -> str:
-        """Estima el costo de la consulta (bajo, medio, alto)"""
-        # Análisis simple basado en complejidad
-        complexity_indicators = [
-            ('JOIN', 2),
-            ('WHERE', 1),
-            ('GROUP BY', 2),
-            ('ORDER BY', 1),
-            ('DISTINCT', 1),
-            ('UNION', 3),
-            ('HAVING', 2),
-            ('SUBQUERY', 3)
-        ]
-        
-        score = 0
-        sql_upper = sql_query.upper()
-        
-        for indicator, weight in complexity_indicators:
-            if indicator in sql_upper:
-                score += weight
-        
-        if score >= 5:
-            return "high"
-        elif score >= 3:
-            return "medium"
-        else:
-            return "low"
+    def check_query_cost(self, sql_query: str, user_query: str = None):
+        """
+        Aplica la guardia de costo (EXPLAIN) sobre la consulta sanitizada
+
+        Returns:
+            QueryCostEstimate o None si la guardia está deshabilitada
+
+        Raises:
+            SecurityValidationError: Si la consulta excede el presupuesto configurado
+        """
+        if self.cost_guard is None:
+            return None
+        return self.cost_guard.check(sql_query, user_query)
+
+# Instancia compartida: el validador no guarda estado por petición
+_security_validator = None
+
 
 # Función de dependencia para FastAPI
 def get_security_validator() -> SQLSecurityValidator:
-    """Provee una instancia del validador de seguridad para dependencias de FastAPI"""
-    return SQLSecurityValidator()
\ No newline at end of file
+    """Provee la instancia compartida del validador de seguridad para dependencias de FastAPI"""
+    global _security_validator
+    if _security_validator is None:
+        _security_validator = SQLSecurityValidator(cost_guard=get_cost_guard(db_service))
+    return _security_validator
@@ -0,0 +1,399 @@
+"""
+Análisis de SQL en una sola pasada.
+
+Tokeniza la consulta una única vez (lexer de sqlparse, sin agrupar) y produce un
+resumen reutilizable: tipo de sentencia, LIMIT existente, tablas y columnas
+referenciadas (con alias), CTEs y construcciones peligrosas. El resultado se cachea por texto
+de la consulta, de modo que validar, sanitizar y revisar el esquema comparten
+el mismo análisis.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from sqlparse import lexer
+from sqlparse import tokens as T
+
+# Patrones peligrosos que no deben aparecer en consultas generadas
+DANGEROUS_PATTERNS = [
+    r"DROP\s+TABLE",
+    r"DELETE\s+FROM",
+    r"UPDATE\s+\w+\s+SET",
+    r"INSERT\s+INTO",
+    r"CREATE\s+TABLE",
+    r"ALTER\s+TABLE",
+    r"GRANT\s+",
+    r"REVOKE\s+",
+    r"TRUNCATE\s+TABLE",
+    r"EXECUTE\s+",
+    r"EXEC\s+",
+    r"CREATE\s+FUNCTION",
+    r"CREATE\s+PROCEDURE",
+    r"CREATE\s+VIEW",
+    r"VACUUM\s+",
+    r"ANALYZE\s+",
+    r"REINDEX\s+",
+    r"LOCK\s+TABLE",
+    r"UNLOCK\s+TABLE",
+    r"BEGIN\s+TRANSACTION",
+    r"COMMIT\s+TRANSACTION",
+    r"ROLLBACK\b",
+    r"SAVEPOINT\b",
+]
+
+# Un único patrón precompilado: cada alternativa es un grupo con nombre p<i>.
+# El \b común evita coincidencias dentro de identificadores (p. ej. "last_update set")
+# y el lookahead con las iniciales descarta rápido las posiciones que no pueden
+# empezar un patrón; ningún patrón anida cuantificadores, así que es lineal.
+_PATTERN_INITIALS = "".join(sorted({pattern[0] for pattern in DANGEROUS_PATTERNS}))
+DANGEROUS_REGEX = re.compile(
+    rf"\b(?=[{_PATTERN_INITIALS}])(?:"
+    + "|".join(f"(?P<p{i}>{pattern})" for i, pattern in enumerate(DANGEROUS_PATTERNS))
+    + ")",
+    re.IGNORECASE,
+)
+
+# Palabras clave tras las cuales comienza una lista de tablas
+_JOIN_SUFFIX = "JOIN"
+_TABLE_PREFIXES = {"LATERAL", "ONLY"}
+_QUERY_STARTS = ("SELECT", "WITH", "VALUES")
+
+# Palabras que cierran una referencia de tabla (no pueden ser alias implícitos)
+_CLAUSE_KEYWORDS = {
+    "WHERE", "ON", "USING", "GROUP BY", "ORDER BY", "HAVING", "LIMIT", "OFFSET",
+    "UNION", "UNION ALL", "INTERSECT", "EXCEPT", "WINDOW", "FETCH", "FOR",
+    "NATURAL", "CROSS", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "JOIN",
+}
+
+_SKIP_TYPES = (T.Whitespace, T.Newline, T.Comment)
+
+
+@dataclass(frozen=True)
+class TableRef:
+    """Tabla referenciada en FROM / JOIN"""
+
+    name: str
+    schema: Optional[str] = None
+    alias: Optional[str] = None
+
+    @property
+    def qualified_name(self) -> str:
+        return f"{self.schema}.{self.name}" if self.schema else self.name
+
+
+@dataclass(frozen=True)
+class ColumnRef:
+    """Referencia a columna (`col`, `alias.col` o `esquema.tabla.col`)"""
+
+    name: str
+    qualifier: Optional[str] = None
+    schema: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class DangerousMatch:
+    """Construcción peligrosa detectada en la consulta"""
+
+    pattern: str
+    text: str
+    position: int
+
+
+@dataclass(frozen=True)
+class SQLAnalysis:
+    """Resumen de una consulta SQL obtenido en una sola pasada"""
+
+    sql: str
+    statement_type: Optional[str]
+    statement_count: int
+    limit: Optional[int]
+    has_limit: bool
+    tables: Tuple[TableRef, ...]
+    ctes: Tuple[str, ...]
+    dangerous: Tuple[DangerousMatch, ...]
+    token_count: int
+    columns: Tuple[ColumnRef, ...] = ()
+    # Alias de columnas del SELECT (`expr AS total`, `count(*) total`)
+    output_aliases: Tuple[str, ...] = ()
+    # Alias de subconsultas y funciones en el FROM (sus columnas no están en el catálogo)
+    derived_aliases: Tuple[str, ...] = ()
+    has_derived_sources: bool = False
+
+    @property
+    def is_empty(self) -> bool:
+        return self.token_count == 0
+
+    @property
+    def table_names(self) -> List[str]:
+        """Nombres de tablas reales (sin CTEs), sin duplicados y en orden de aparición"""
+        seen = []
+        for ref in self.tables:
+            if ref.name not in self.ctes and ref.qualified_name not in seen:
+                seen.append(ref.qualified_name)
+        return seen
+
+    @property
+    def aliases(self) -> Dict[str, str]:
+        """Mapa alias -> tabla"""
+        return {ref.alias: ref.qualified_name for ref in self.tables if ref.alias}
+
+
+def _is_identifier_token(ttype) -> bool:
+    """Nombre no reservado o identificador entrecomillado (excluye tipos builtin)"""
+    return (ttype in T.Name and ttype not in T.Name.Builtin) or ttype in T.Literal.String.Symbol
+
+
+def _identifier(ttype, value: str) -> Optional[str]:
+    """Normaliza un identificador (los entrecomillados conservan mayúsculas)"""
+    if ttype in T.Literal.String.Symbol:
+        return value[1:-1].replace('""', '"')
+    if ttype in T.Name or ttype in T.Keyword:
+        return value.lower()
+    return None
+
+
+class _Scanner:
+    """Recorre los tokens significativos y arma el análisis"""
+
+    def __init__(self, sql: str):
+        self.tokens = [
+            (ttype, value, value.upper())
+            for ttype, value in lexer.tokenize(sql)
+            if not any(ttype in skip for skip in _SKIP_TYPES)
+        ]
+        self.tables: List[TableRef] = []
+        self.ctes: List[str] = []
+        self.columns: List[ColumnRef] = []
+        self.output_aliases: List[str] = []
+        self.derived_aliases: List[str] = []
+        self.has_derived_sources = False
+        self.statement_type: Optional[str] = None
+        self.statement_count = 1 if self.tokens else 0
+        self.limit: Optional[int] = None
+        self.has_limit = False
+        # Pila de paréntesis: "query" (subconsulta), "expr" (función/expresión),
+        # "from" (subconsulta o join dentro de un FROM) o "from_expr" (función en un FROM)
+        self.parens: List[str] = []
+        # Profundidad en la que se abrió un WITH, para leer los CTEs siguientes
+        self.cte_depth: Optional[int] = None
+
+    def _peek(self, i: int):
+        return self.tokens[i] if i < len(self.tokens) else (None, "", "")
+
+    def scan(self) -> "_Scanner":
+        i = 0
+        n = len(self.tokens)
+        while i < n:
+            ttype, value, upper = self.tokens[i]
+
+            if value == "(":
+                self.parens.append("query" if self._peek(i + 1)[2] in _QUERY_STARTS else "expr")
+            elif value == ")":
+                kind = self.parens.pop() if self.parens else None
+                if kind in ("from", "from_expr"):
+                    i = self._read_from_list(self._read_alias(i + 1, None), after_item=True)
+                    continue
+                if self.cte_depth == len(self.parens) and self._peek(i + 1)[1] == ",":
+                    i = self._read_cte(i + 2)
+                    continue
+            elif value == ";" and not self.parens:
+                if i + 1 < n:
+                    self.statement_count += 1
+            elif ttype in T.Keyword.CTE:
+                self.cte_depth = len(self.parens)
+                j = i + 1
+                if self._peek(j)[2] == "RECURSIVE":
+                    j += 1
+                i = self._read_cte(j)
+                continue
+            elif self._in_query() and (upper == "FROM" or upper.endswith(_JOIN_SUFFIX)):
+                if not self._is_distinct_from(i):
+                    i = self._read_from_list(i + 1, allow_list=upper == "FROM")
+                    continue
+            elif upper in ("LIMIT", "FETCH") and not self.parens:
+                # LIMIT n | LIMIT ALL | FETCH FIRST n ROWS ONLY
+                self.has_limit = True
+                next_type, next_value, _ = self._peek(i + (1 if upper == "LIMIT" else 2))
+                if next_type in T.Literal.Number.Integer:
+                    self.limit = int(next_value)
+            elif _is_identifier_token(ttype):
+                i = self._read_column(i)
+                continue
+            elif ttype in T.Keyword.DML or ttype in T.Keyword.DDL:
+                if self.cte_depth == len(self.parens):
+                    # Empieza la consulta principal del WITH: no hay más CTEs
+                    self.cte_depth = None
+                if self.statement_type is None and not self.parens:
+                    self.statement_type = upper
+
+            i += 1
+        return self
+
+    def _in_query(self) -> bool:
+        return not self.parens or self.parens[-1] in ("query", "from")
+
+    def _is_distinct_from(self, i: int) -> bool:
+        """`x IS [NOT] DISTINCT FROM y` no es una cláusula FROM"""
+        return i > 0 and self.tokens[i - 1][2] == "DISTINCT"
+
+    def _read_column(self, i: int) -> int:
+        """Lee una referencia a columna o un alias de salida a partir de un nombre"""
+        ttype, value, _ = self.tokens[i]
+        parts = [_identifier(ttype, value)]
+        j = i + 1
+        while self._peek(j)[1] == ".":
+            next_type, next_value, _ = self._peek(j + 1)
+            if next_type in T.Wildcard:
+                # alias.* no referencia columnas concretas
+                return j + 2
+            name = _identifier(next_type, next_value)
+            if name is None:
+                break
+            parts.append(name)
+            j += 2
+
+        if self._peek(j)[1] == "(":
+            # Llamada a función
+            return j
+
+        prev_type, prev_value, prev_upper = self.tokens[i - 1] if i > 0 else (None, "", "")
+        if len(parts) == 1:
+            if prev_value == "(" and i > 1 and self.tokens[i - 2][2] == "EXTRACT" and self._peek(j)[2] == "FROM":
+                # EXTRACT(<campo> FROM ...): DOW, EPOCH, ISODOW... es una parte de fecha, no una columna
+                return j
+            if prev_upper == "AS" or (
+                prev_value == ")"
+                or _is_identifier_token(prev_type)
+                or (prev_type in T.Literal and prev_type not in T.Literal.String.Symbol)
+            ):
+                # `expr AS alias` o alias implícito tras otra expresión
+                self.output_aliases.append(parts[0])
+                return j
+            if prev_upper in ("OVER", "WINDOW"):
+                # Nombre de ventana
+                return j
+
+        self.columns.append(
+            ColumnRef(
+                name=parts[-1],
+                qualifier=parts[-2] if len(parts) > 1 else None,
+                schema=parts[-3] if len(parts) > 2 else None,
+            )
+        )
+        return j
+
+    def _read_cte(self, i: int) -> int:
+        """Lee `nombre [(columnas)] AS (` y registra el CTE"""
+        ttype, value, _ = self._peek(i)
+        name = _identifier(ttype, value)
+        if name is None:
+            return i
+        self.ctes.append(name)
+        return i + 1
+
+    def _read_name(self, i: int) -> Tuple[Optional[Tuple[Optional[str], str]], int]:
+        """Lee `[esquema.]nombre` y devuelve ((esquema, nombre), siguiente índice)"""
+        parts = []
+        while True:
+            ttype, value, upper = self._peek(i)
+            name = _identifier(ttype, value)
+            if name is None or (ttype in T.Keyword and upper in _CLAUSE_KEYWORDS):
+                break
+            parts.append(name)
+            i += 1
+            if self._peek(i)[1] != ".":
+                break
+            i += 1
+        if not parts:
+            return None, i
+        return ((parts[-2] if len(parts) > 1 else None), parts[-1]), i
+
+    def _read_alias(self, i: int, table: Optional[Tuple[Optional[str], str]]) -> int:
+        """Lee `[AS] alias` tras una tabla o subconsulta"""
+        alias = None
+        ttype, value, upper = self._peek(i)
+        if upper == "AS":
+            alias = _identifier(*self._peek(i + 1)[:2])
+            i += 2
+        elif ttype in T.Name or ttype in T.Literal.String.Symbol:
+            alias = _identifier(ttype, value)
+            i += 1
+
+        if table is not None:
+            schema, name = table
+            self.tables.append(TableRef(name=name, schema=schema, alias=alias))
+        elif alias:
+            self.derived_aliases.append(alias)
+        return i
+
+    def _read_from_list(self, i: int, allow_list: bool = True, after_item: bool = False) -> int:
+        """Lee las tablas de un FROM (separadas por coma) o de un JOIN"""
+        while True:
+            if not after_item:
+                while self._peek(i)[2] in _TABLE_PREFIXES:
+                    i += 1
+                if self._peek(i)[1] == "(":
+                    # Subconsulta o join entre paréntesis: el alias y la lista
+                    # continúan al cerrar el paréntesis
+                    self.parens.append("from")
+                    if self._peek(i + 1)[2] in _QUERY_STARTS:
+                        self.has_derived_sources = True
+                        return i + 1
+                    return self._read_from_list(i + 1)
+
+                table, i = self._read_name(i)
+                if table is None:
+                    return i
+                if self._peek(i)[1] == "(":
+                    # Función que devuelve filas (generate_series, unnest...), no es tabla
+                    self.parens.append("from_expr")
+                    self.has_derived_sources = True
+                    return i + 1
+                i = self._read_alias(i, table)
+
+            after_item = False
+            if allow_list and self._peek(i)[1] == ",":
+                i += 1
+                continue
+            return i
+
+
+@lru_cache(maxsize=512)
+def analyze_sql(sql_query: str) -> SQLAnalysis:
+    """
+    Analiza la consulta en una sola pasada
+
+    Args:
+        sql_query: Consulta SQL
+
+    Returns:
+        SQLAnalysis: Resumen inmutable (cacheado por texto de la consulta)
+    """
+    dangerous = tuple(
+        DangerousMatch(
+            pattern=DANGEROUS_PATTERNS[int(match.lastgroup[1:])],
+            text=match.group(0),
+            position=match.start(),
+        )
+        for match in DANGEROUS_REGEX.finditer(sql_query)
+    )
+
+    scanner = _Scanner(sql_query).scan()
+
+    return SQLAnalysis(
+        sql=sql_query,
+        statement_type=scanner.statement_type,
+        statement_count=scanner.statement_count,
+        limit=scanner.limit,
+        has_limit=scanner.has_limit,
+        tables=tuple(scanner.tables),
+        ctes=tuple(scanner.ctes),
+        dangerous=dangerous,
+        token_count=len(scanner.tokens),
+        columns=tuple(scanner.columns),
+        output_aliases=tuple(scanner.output_aliases),
+        derived_aliases=tuple(scanner.derived_aliases),
+        has_derived_sources=scanner.has_derived_sources,
+    )
@@ -0,0 +1,224 @@
+"""
+Caché de sentencias preparadas por forma de SQL.
+
+El SQL sanitizado se normaliza extrayendo los literales que funcionan como
+valores (comparaciones, listas IN, BETWEEN, LIMIT/OFFSET) y la forma resultante
+se prepara una vez por conexión (`PREPARE ... AS`). Las siguientes consultas con
+la misma forma se ejecutan con `EXECUTE nombre (parámetros)`, evitando el
+parseo y la planificación en PostgreSQL.
+
+No se parametrizan literales tipados (DATE '...', INTERVAL '...'), modificadores
+de tipo (numeric(10,2)), posiciones de ORDER BY / GROUP BY ni números decimales:
+en esos lugares un parámetro cambiaría el tipo inferido o la semántica.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+import psycopg2
+from psycopg2 import errors as pg_errors
+from sqlparse import lexer
+from sqlparse import tokens as T
+
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Palabras clave tras las cuales un literal es un valor parametrizable
+_VALUE_KEYWORDS = {"LIMIT", "OFFSET", "BETWEEN"}
+_MAX_FAILED_SHAPES = 1000
+
+
+class StatementStats:
+    """Contadores globales de la caché de sentencias preparadas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prepare_failures = 0
+        self.skipped = 0
+
+    def incr(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "prepare_failures": self.prepare_failures,
+            "skipped": self.skipped,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "failed_shapes": len(_failed_shapes),
+        }
+
+
+statement_stats = StatementStats()
+
+# Formas que PostgreSQL no pudo preparar (p. ej. tipo de parámetro indeterminado)
+_failed_shapes: "OrderedDict[str, None]" = OrderedDict()
+_failed_lock = threading.Lock()
+
+
+def _remember_failure(shape: str) -> None:
+    with _failed_lock:
+        _failed_shapes[shape] = None
+        while len(_failed_shapes) > _MAX_FAILED_SHAPES:
+            _failed_shapes.popitem(last=False)
+
+
+def _literal_value(ttype, value: str):
+    if ttype in T.Literal.Number.Integer:
+        return int(value)
+    # 'it''s' -> it's
+    return value[1:-1].replace("''", "'")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint_sql(sql_query: str) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+    """
+    Separa la forma de la consulta de sus literales
+
+    Returns:
+        (forma con $1..$n, parámetros) o None si la consulta no se prepara
+        (varias sentencias o no es una consulta de lectura)
+    """
+    tokens = list(lexer.tokenize(sql_query.strip().rstrip(";")))
+    significant = [
+        i for i, (ttype, _) in enumerate(tokens)
+        if ttype not in T.Whitespace and ttype not in T.Newline and ttype not in T.Comment
+    ]
+    if not significant:
+        return None
+    first = tokens[significant[0]][1].upper()
+    if first not in ("SELECT", "WITH") or any(tokens[i][1] == ";" for i in significant):
+        return None
+
+    parts = []
+    params = []
+    # Pila de paréntesis: True si es una lista IN (...)
+    in_lists = []
+    # BETWEEN visto y su AND aún no; AND que cierra un BETWEEN
+    in_between = False
+    between_and = False
+    prev_type, prev_value = None, ""
+
+    for position, index in enumerate(significant):
+        ttype, value = tokens[index]
+        upper = value.upper()
+        start = significant[position - 1] + 1 if position else 0
+        parts.append("".join(tok[1] for tok in tokens[start:index]))
+
+        is_value_slot = (
+            prev_type in T.Operator.Comparison
+            or prev_value.upper() in _VALUE_KEYWORDS
+            or between_and
+            or (bool(in_lists) and in_lists[-1] and prev_value in ("(", ","))
+        )
+        is_literal = ttype in T.Literal.String.Single or ttype in T.Literal.Number.Integer
+        # E'...', B'...': el prefijo va pegado al literal
+        prefixed = index > 0 and tokens[index - 1][0] in T.Name
+
+        if is_literal and is_value_slot and not prefixed:
+            params.append(_literal_value(ttype, value))
+            parts.append(f"${len(params)}")
+        else:
+            parts.append(value)
+
+        if value == "(":
+            in_lists.append(prev_value.upper() == "IN")
+        elif value == ")" and in_lists:
+            in_lists.pop()
+        between_and = upper == "AND" and in_between
+        if upper == "BETWEEN":
+            in_between = True
+        elif between_and:
+            in_between = False
+        prev_type, prev_value = ttype, value
+
+    return "".join(parts), tuple(params)
+
+
+def statement_name(shape: str) -> str:
+    """Nombre estable de la sentencia preparada para una forma"""
+    return "ps_" + hashlib.sha1(shape.encode()).hexdigest()[:16]
+
+
+class PreparedStatementCache:
+    """Sentencias preparadas de una conexión (LRU)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._statements: "OrderedDict[str, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def execute(self, cursor, sql_query: str) -> bool:
+        """
+        Ejecuta la consulta como sentencia preparada si es posible
+
+        Returns:
+            bool: False si la consulta debe ejecutarse como texto plano
+        """
+        fingerprint = fingerprint_sql(sql_query)
+        if fingerprint is None:
+            statement_stats.incr("skipped")
+            return False
+        shape, params = fingerprint
+        if shape in _failed_shapes:
+            statement_stats.incr("skipped")
+            return False
+
+        name = self._statements.get(shape)
+        if name is not None:
+            self._statements.move_to_end(shape)
+            statement_stats.incr("hits")
+        else:
+            name = statement_name(shape)
+            if not self._prepare(cursor, name, shape):
+                return False
+            statement_stats.incr("misses")
+            self._statements[shape] = name
+            self._evict(cursor)
+
+        placeholders = f" ({', '.join(['%s'] * len(params))})" if params else ""
+        try:
+            cursor.execute(f"EXECUTE {name}{placeholders}", params or None)
+        except pg_errors.InvalidSqlStatementName:
+            # La sesión perdió sus sentencias (p. ej. DISCARD ALL de un pooler)
+            self.clear()
+            raise
+        return True
+
+    def _prepare(self, cursor, name: str, shape: str) -> bool:
+        # El savepoint permite seguir con la transacción si PREPARE falla
+        cursor.execute("SAVEPOINT prepare_statement")
+        try:
+            cursor.execute(f"PREPARE {name} AS {shape}")
+        except (psycopg2.ProgrammingError, psycopg2.DataError) as e:
+            # Errores de tipos o sintaxis de la forma; cancelaciones y caídas se propagan
+            cursor.execute("ROLLBACK TO SAVEPOINT prepare_statement")
+            statement_stats.incr("prepare_failures")
+            _remember_failure(shape)
+            logger.debug(f"No se pudo preparar la consulta, se ejecuta como texto: {str(e).strip()}")
+            return False
+        cursor.execute("RELEASE SAVEPOINT prepare_statement")
+        return True
+
+    def _evict(self, cursor) -> None:
+        while len(self._statements) > self.max_size:
+            _, evicted = self._statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {evicted}")
+            statement_stats.incr("evictions")
+
+    def clear(self) -> None:
+        """Olvida las sentencias (p. ej. si el servidor ya no las tiene)"""
+        self._statements.clear()
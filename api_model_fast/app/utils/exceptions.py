@@ -34,6 +34,19 @@ class DatabaseError(BaseAppException):
         }
         super().__init__(message, details)
 
+class QueryTimeoutError(DatabaseError):
+    """La consulta superó el statement_timeout o el deadline de la petición"""
+    def __init__(self, message: str, sql_query: str = None, timeout_ms: int = None):
+        super().__init__(message, sql_query=sql_query, db_operation="query_timeout")
+        self.details["error_type"] = "query_timeout"
+        self.details["timeout_ms"] = timeout_ms
+
+class QueryCancelledError(DatabaseError):
+    """La consulta se canceló porque el cliente HTTP se desconectó"""
+    def __init__(self, message: str, sql_query: str = None):
+        super().__init__(message, sql_query=sql_query, db_operation="query_cancelled")
+        self.details["error_type"] = "query_cancelled"
+
 class BedrockError(BaseAppException):
     """Excepción para errores del servicio AWS Bedrock"""
     def __init__(self, message: str, model_id: str = None, prompt: str = None):
@@ -113,6 +126,19 @@ class ValidationError(BaseAppException):
         }
         super().__init__(message, details)
 
+class SchemaReferenceError(BaseAppException):
+    """El SQL generado referencia tablas o columnas que no existen en el esquema"""
+    def __init__(self, message: str, sql_query: str = None, unknown_tables: list = None,
+                 unknown_columns: list = None, user_query: str = None):
+        details = {
+            "error_type": "schema_reference",
+            "sql_query": sql_query,
+            "user_query": user_query,
+            "unknown_tables": unknown_tables or [],
+            "unknown_columns": unknown_columns or []
+        }
+        super().__init__(message, details)
+
 class SecurityError(BaseAppException):
     """Excepción para violaciones de seguridad"""
     def __init__(self, message: str, security_rule: str = None, attempted_action: str = None):
@@ -157,6 +183,15 @@ class ConfigurationError(BaseAppException):
         }
         super().__init__(message, details)
 
+class ProfilerBusyError(BaseAppException):
+    """Excepción cuando ya hay una sesión del profiler en curso"""
+    def __init__(self, message: str, started_at: float = None):
+        details = {
+            "error_type": "profiler_busy",
+            "started_at": started_at
+        }
+        super().__init__(message, details)
+
 # -------------------------------------------------------------------
 # UTILIDADES PARA MANEJO DE EXCEPCIONES
 # -------------------------------------------------------------------
@@ -190,7 +225,7 @@ def get_http_status_code(exception: Exception) -> int:
         return 429  # Too Many Requests
     elif isinstance(exception, (DatabaseError, RAGError, EmbeddingError)):
         return 500  # Internal Server Error
-    elif isinstance(exception, (ChartError, BedrockError, DataProcessingError)):
+    elif isinstance(exception, (ChartError, BedrockError, DataProcessingError, SchemaReferenceError)):
         return 422  # Unprocessable Entity
     elif isinstance(exception, ConfigurationError):
         return 503  # Service Unavailable
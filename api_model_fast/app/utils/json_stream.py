@@ -0,0 +1,107 @@
+"""
+Parser incremental de JSON para respuestas de Bedrock en streaming.
+
+Permite obtener los campos de primer nivel del objeto JSON (por ejemplo
+`sql_query`) en cuanto su valor está completo, sin esperar al resto de la
+respuesta (por ejemplo `chart_code`).
+"""
+
+import json
+from typing import Any, Dict, List
+
+
+class IncrementalJSONParser:
+    """Consume fragmentos de texto y extrae los miembros de primer nivel completos"""
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+        self._member_start = None
+        self.fields: Dict[str, Any] = {}
+        self.closed = False
+
+    @property
+    def text(self) -> str:
+        """Texto completo recibido hasta el momento"""
+        if self._chunks:
+            self._text += "".join(self._chunks)
+            self._chunks = []
+        return self._text
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Agrega un fragmento de texto y procesa lo nuevo
+
+        Returns:
+            Lista de claves de primer nivel que se completaron con este fragmento
+        """
+        if not chunk:
+            return []
+
+        self._chunks.append(chunk)
+        if self.closed:
+            return []
+
+        text = self.text
+        completed = []
+
+        for i in range(self._pos, len(text)):
+            char = text[i]
+
+            if self._object_start is None:
+                # Ignorar cualquier prefijo (```json, texto libre) hasta el primer '{'
+                if char == "{":
+                    self._object_start = i
+                    self._member_start = i + 1
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    completed.extend(self._parse_member(text[self._member_start:i]))
+                    self.closed = True
+                    self._pos = i + 1
+                    return completed
+            elif char == "," and self._depth == 1:
+                completed.extend(self._parse_member(text[self._member_start:i]))
+                self._member_start = i + 1
+
+        self._pos = len(text)
+        return completed
+
+    def _parse_member(self, member: str) -> List[str]:
+        """Parsea un miembro `"clave": valor` y lo registra en `fields`"""
+        if not member.strip():
+            return []
+        try:
+            parsed = json.loads("{" + member + "}")
+        except json.JSONDecodeError:
+            # El parseo final (tolerante) se encargará de este caso
+            return []
+        self.fields.update(parsed)
+        return list(parsed.keys())
+
+    def get_object_text(self) -> str:
+        """Devuelve el texto del objeto JSON de primer nivel si ya se cerró"""
+        if not self.closed:
+            return self.text
+        return self.text[self._object_start:self._pos]
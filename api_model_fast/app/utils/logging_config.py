@@ -1,11 +1,17 @@
+import atexit
 import logging
 import logging.config
-import json
+import logging.handlers
+import queue
 import sys
+import zlib
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import os
-from datetime import datetime
+from datetime import datetime, timezone
+
+from app.utils.serialization import dumps
+from app.utils.tracing import current_request_id, current_trace
 
 class JSONFormatter(logging.Formatter):
     """Formateador personalizado para logs en formato JSON"""
@@ -13,7 +19,8 @@ class JSONFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
         """Formatea el log record como JSON"""
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            # Hora de creación del record (el formateo puede ocurrir después, en el listener)
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat().replace("+00:00", "Z"),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
@@ -35,12 +42,16 @@ class JSONFormatter(logging.Formatter):
             log_entry['sql_query'] = record.sql_query
         if hasattr(record, 'confidence_score'):
             log_entry['confidence_score'] = record.confidence_score
+        # Campos de consulta RAG (los usa benchmarks/replay.py para reproducir tráfico)
+        for field in ('pregunta', 'schema_tables', 'tables_used', 'chart_type', 'stages'):
+            if getattr(record, field, None) is not None:
+                log_entry[field] = getattr(record, field)
         
         # Agregar excepción si existe
         if record.exc_info:
             log_entry['exception'] = self.formatException(record.exc_info)
         
-        return json.dumps(log_entry, ensure_ascii=False)
+        return dumps(log_entry).decode()
 
 class ColorFormatter(logging.Formatter):
     """Formateador con colores para consola"""
@@ -71,8 +82,10 @@ class ColorFormatter(logging.Formatter):
             extra_info.append(f"SQL: {record.sql_query[:100]}...")
         if hasattr(record, 'confidence_score'):
             extra_info.append(f"Conf: {record.confidence_score}")
-        if hasattr(record, 'response_time'):
+        if getattr(record, 'response_time', None) is not None:
             extra_info.append(f"Time: {record.response_time:.2f}s")
+        if getattr(record, 'request_id', None):
+            extra_info.append(f"Req: {record.request_id}")
         
         if extra_info:
             formatted_record += f" | {' | '.join(extra_info)}"
@@ -91,15 +104,184 @@ class RAGFilter(logging.Filter):
         # Agregar contexto específico de RAG
         if not hasattr(record, 'component'):
             record.component = 'unknown'
+
+        # Id de la petición en curso (contextvar del middleware de trazas)
+        if getattr(record, 'request_id', None) is None:
+            request_id = current_request_id()
+            if request_id is not None:
+                record.request_id = request_id
         
         # Mantener todos los logs por defecto
         return True
 
+class SamplingFilter(logging.Filter):
+    """
+    Muestrea los logs de éxito (por debajo de WARNING) con la tasa dada.
+
+    La decisión se toma por request_id, así que una petición conserva todos sus
+    logs o ninguno; los logs fuera de una petición y los WARNING/ERROR se
+    mantienen siempre. Debe ir después de RAGFilter.
+    """
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1 or record.levelno >= logging.WARNING:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if not request_id:
+            return True
+        if zlib.crc32(str(request_id).encode()) / 2**32 < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+class TruncateFilter(logging.Filter):
+    """Recorta el mensaje y los campos grandes (como el SQL) a `max_chars`"""
+
+    FIELDS = ('sql_query', 'pregunta')
+
+    def __init__(self, max_chars: int = 2000):
+        super().__init__()
+        self.max_chars = max_chars
+
+    def _truncate(self, value):
+        if isinstance(value, str) and len(value) > self.max_chars:
+            return f"{value[:self.max_chars]}… [+{len(value) - self.max_chars} caracteres]"
+        return value
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.max_chars <= 0:
+            return True
+        if record.args:
+            # El mensaje se resuelve aquí para poder recortarlo
+            record.msg = record.getMessage()
+            record.args = None
+        record.msg = self._truncate(record.msg)
+        for field in self.FIELDS:
+            if hasattr(record, field):
+                setattr(record, field, self._truncate(getattr(record, field)))
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler con cola acotada: formateo y escritura ocurren en el listener.
+
+    Con la cola llena se descartan los logs por debajo de WARNING; un WARNING o
+    ERROR desplaza al record más antiguo de la cola para no perderse.
+    """
+
+    def __init__(self, log_queue: queue.Queue, targets):
+        super().__init__(log_queue)
+        self.targets = tuple(targets)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord):
+        # Sin formatear: solo se resuelven los args para que no cambien en la cola
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return self.targets, record
+
+    def enqueue(self, item) -> None:
+        try:
+            self.queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if item[1].levelno < logging.WARNING:
+            self.dropped += 1
+            return
+        try:
+            self.queue.get_nowait()
+            self.dropped += 1
+        except queue.Empty:
+            pass
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+class _LogListener(logging.handlers.QueueListener):
+    """Listener único que entrega cada record a los handlers de su logger"""
+
+    def handle(self, item) -> None:
+        targets, record = item
+        for handler in targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def enqueue_sentinel(self) -> None:
+        # Bloqueante: con la cola llena el sentinel no debe perderse
+        self.queue.put(self._sentinel)
+
+# Pipeline asíncrono activo (ver `_install_queue_logging`)
+_listener: Optional[_LogListener] = None
+_queue_handlers: list = []
+_sampling_filter: Optional[SamplingFilter] = None
+
+def _install_queue_logging(logger_names, queue_size: int) -> None:
+    """
+    Reemplaza los handlers de cada logger por un DroppingQueueHandler sobre una
+    cola compartida; un único hilo (el listener) formatea y escribe
+    """
+    global _listener
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    loggers = [logging.getLogger(name) for name in logger_names]
+    wrapped = []
+    for target_logger in loggers:
+        targets = list(target_logger.handlers)
+        if not targets:
+            continue
+        handler = DroppingQueueHandler(log_queue, targets)
+        # Los filtros corren en el hilo que loguea (request_id, muestreo, recorte)
+        for log_filter in targets[0].filters:
+            handler.addFilter(log_filter)
+        wrapped.append((target_logger, handler))
+
+    # Los handlers destino pueden ser compartidos: se limpian al final
+    for target_logger, handler in wrapped:
+        for target in handler.targets:
+            target.filters = []
+        target_logger.handlers = [handler]
+        _queue_handlers.append(handler)
+
+    _listener = _LogListener(log_queue, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging() -> None:
+    """Detiene el listener vaciando la cola (idempotente)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    _queue_handlers.clear()
+
+atexit.register(stop_logging)
+
+def get_logging_stats() -> Dict[str, Any]:
+    """Estado del pipeline de logging: cola, descartes y muestreo"""
+    log_queue = _queue_handlers[0].queue if _queue_handlers else None
+    return {
+        "async": _listener is not None,
+        "queue_size": log_queue.qsize() if log_queue is not None else 0,
+        "queue_capacity": log_queue.maxsize if log_queue is not None else 0,
+        "dropped": sum(handler.dropped for handler in _queue_handlers),
+        "sampled_out": _sampling_filter.sampled_out if _sampling_filter is not None else 0,
+    }
+
 def setup_logging(
     log_level: str = "INFO",
     enable_file_logging: bool = True,
     enable_json_logging: bool = False,
-    log_dir: str = "data/logs"
+    log_dir: str = "data/logs",
+    async_logging: bool = True,
+    queue_size: int = 10000,
+    sample_rate: float = 1.0,
+    max_field_chars: int = 2000
 ) -> None:
     """
     Configura el sistema de logging para la aplicación RAG
@@ -109,8 +291,17 @@ def setup_logging(
         enable_file_logging: Habilitar logging a archivos
         enable_json_logging: Habilitar formato JSON para archivos
         log_dir: Directorio donde guardar los logs
+        async_logging: Formatear y escribir en un hilo aparte (QueueHandler/QueueListener)
+        queue_size: Capacidad de la cola de logs (al llenarse se descartan los de éxito)
+        sample_rate: Fracción de peticiones cuyos logs de éxito se conservan
+        max_field_chars: Longitud máxima del mensaje y de campos como el SQL (0 = sin límite)
     """
-    
+    global _sampling_filter
+
+    # Un pipeline anterior se detiene antes de reconfigurar
+    stop_logging()
+    _sampling_filter = SamplingFilter(sample_rate)
+
     # Crear directorio de logs si no existe
     log_path = Path(log_dir)
     log_path.mkdir(parents=True, exist_ok=True)
@@ -122,6 +313,13 @@ def setup_logging(
         'filters': {
             'rag_filter': {
                 '()': RAGFilter
+            },
+            'sampling': {
+                '()': lambda: _sampling_filter
+            },
+            'truncate': {
+                '()': TruncateFilter,
+                'max_chars': max_field_chars
             }
         },
         'formatters': {
@@ -143,7 +341,7 @@ def setup_logging(
                 'stream': sys.stdout,
                 'level': log_level,
                 'formatter': 'color',
-                'filters': ['rag_filter']
+                'filters': ['rag_filter', 'sampling', 'truncate']
             }
         },
         'loggers': {
@@ -157,6 +355,12 @@ def setup_logging(
                 'handlers': ['console'],
                 'propagate': False
             },
+            # RAGLogger ("rag.api", ...): sin esta entrada sus INFO morían en root (WARNING)
+            'rag': {
+                'level': 'INFO',
+                'handlers': ['console'],
+                'propagate': False
+            },
             'uvicorn': {
                 'level': 'INFO',
                 'handlers': ['console'],
@@ -186,7 +390,7 @@ def setup_logging(
             'backupCount': 5,
             'level': 'INFO',
             'formatter': 'json' if enable_json_logging else 'detailed',
-            'filters': ['rag_filter']
+            'filters': ['rag_filter', 'sampling', 'truncate']
         }
         
         # Handler específico para errores
@@ -197,7 +401,7 @@ def setup_logging(
             'backupCount': 5,
             'level': 'WARNING',
             'formatter': 'json' if enable_json_logging else 'detailed',
-            'filters': ['rag_filter']
+            'filters': ['rag_filter', 'sampling', 'truncate']
         }
         
         # Handler específico para RAG
@@ -208,17 +412,21 @@ def setup_logging(
             'backupCount': 5,
             'level': 'INFO',
             'formatter': 'json' if enable_json_logging else 'detailed',
-            'filters': ['rag_filter']
+            'filters': ['rag_filter', 'sampling', 'truncate']
         }
         
         # Agregar handlers a los loggers
-        for logger_name in ['app', 'rag_monitor']:
+        for logger_name in ['app', 'rag_monitor', 'rag']:
             config['loggers'][logger_name]['handlers'].extend([
                 'file_all', 'file_errors', 'file_rag'
             ])
     
     # Aplicar configuración
     logging.config.dictConfig(config)
+
+    # Formateo y escritura fuera del hilo de la petición
+    if async_logging:
+        _install_queue_logging(list(config['loggers']) + [''], queue_size)
     
     # Configurar logging asíncrono seguro
     logging.getLogger("asyncio").setLevel(logging.WARNING)
@@ -233,7 +441,9 @@ def setup_logging(
             "log_level": log_level,
             "file_logging": enable_file_logging,
             "json_format": enable_json_logging,
-            "log_directory": str(log_path.absolute())
+            "log_directory": str(log_path.absolute()),
+            "async_logging": async_logging,
+            "sample_rate": sample_rate
         }
     )
 
@@ -264,17 +474,26 @@ class RAGLogger:
         response_time: float,
         success: bool = True,
         user_id: str = None,
-        request_id: str = None
+        request_id: str = None,
+        schema_tables: Optional[List[str]] = None,
+        tables_used: Optional[List[str]] = None,
+        chart_type: str = None,
+        stages: Optional[Dict[str, float]] = None
     ) -> None:
         """Log especializado para consultas RAG"""
         extra = {
             'component': self.component,
+            'pregunta': pregunta,
             'sql_query': sql_query,
             'confidence_score': confidence_score,
             'response_time': response_time,
             'user_id': user_id,
             'request_id': request_id,
-            'endpoint': '/rag/nl-to-sql'
+            'endpoint': '/rag/nl-to-sql',
+            'schema_tables': schema_tables,
+            'tables_used': tables_used,
+            'chart_type': chart_type,
+            'stages': stages if stages is not None else _current_stages()
         }
         
         if success:
@@ -332,10 +551,28 @@ class RAGLogger:
         )
 
 # Funciones de utilidad para logging rápido
-def log_rag_success(pregunta: str, sql_query: str, confidence: float, time_taken: float):
+def _current_stages() -> Optional[Dict[str, float]]:
+    """Duración (ms) por etapa de la traza de la petición en curso"""
+    trace = current_trace()
+    if trace is None:
+        return None
+    return {name: round(duration, 2) for name, duration in trace.stage_totals().items()}
+
+def log_rag_success(
+    pregunta: str,
+    sql_query: str,
+    confidence: float,
+    time_taken: float,
+    schema_tables: Optional[List[str]] = None,
+    tables_used: Optional[List[str]] = None,
+    chart_type: str = None
+):
     """Función rápida para loguear éxito RAG"""
     rag_logger = RAGLogger("api")
-    rag_logger.log_query(pregunta, sql_query, confidence, time_taken, True)
+    rag_logger.log_query(
+        pregunta, sql_query, confidence, time_taken, True,
+        schema_tables=schema_tables, tables_used=tables_used, chart_type=chart_type
+    )
 
 def log_rag_error(pregunta: str, error: str, time_taken: float = 0.0):
     """Función rápida para loguear error RAG"""
@@ -344,8 +581,10 @@ def log_rag_error(pregunta: str, error: str, time_taken: float = 0.0):
         f"Error en consulta RAG: {pregunta[:100]}... - {error}",
         extra={
             'component': 'api',
+            'pregunta': pregunta,
             'response_time': time_taken,
-            'endpoint': '/rag/nl-to-sql'
+            'endpoint': '/rag/nl-to-sql',
+            'stages': _current_stages()
         }
     )
 
@@ -361,10 +600,18 @@ def setup_logging_from_env():
     enable_file_logging = os.getenv('ENABLE_FILE_LOGGING', 'true').lower() == 'true'
     enable_json_logging = os.getenv('ENABLE_JSON_LOGGING', 'false').lower() == 'true'
     log_dir = os.getenv('LOG_DIR', 'data/logs')
+    async_logging = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+    queue_size = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    sample_rate = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+    max_field_chars = int(os.getenv('LOG_MAX_FIELD_CHARS', 2000))
     
     setup_logging(
         log_level=log_level,
         enable_file_logging=enable_file_logging,
         enable_json_logging=enable_json_logging,
-        log_dir=log_dir
+        log_dir=log_dir,
+        async_logging=async_logging,
+        queue_size=queue_size,
+        sample_rate=sample_rate,
+        max_field_chars=max_field_chars
     )
\ No newline at end of file
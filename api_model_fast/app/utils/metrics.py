@@ -0,0 +1,289 @@
+"""
+Métricas en memoria con salida en formato de texto de Prometheus.
+
+Implementación mínima (contadores, gauges e histogramas con etiquetas) sin
+dependencias externas. Las etapas del pipeline se miden con `track_stage`:
+
+    with track_stage("bedrock"):
+        ...
+
+y alimentan el histograma `rag_stage_duration_seconds{stage="bedrock"}`.
+Las métricas con callback se calculan al exportar (uso de pools, cachés).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.utils.tracing import span
+
+# Buckets de latencia (segundos): de 1 ms a 2 minutos
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+
+# Buckets de tokens por llamada a Bedrock
+TOKEN_BUCKETS = (250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 24000, 32000, 64000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: se esperaban las etiquetas {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(f"{line}\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    """Valor acumulado que solo crece"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class CallbackMetric(_Metric):
+    """
+    Métrica calculada al exportar a partir de estadísticas existentes. `fn`
+    devuelve {(valores de etiquetas): valor} o un número si no hay etiquetas
+    """
+
+    def __init__(self, name, documentation, labelnames=(), fn: Callable = None, kind: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self._fn = fn
+
+    def samples(self):
+        values = self._fn()
+        items = sorted(values.items()) if isinstance(values, dict) else [((), values)]
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Distribución por buckets acumulativos, con suma y conteo"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # etiquetas -> [conteos por bucket (no acumulados), suma]
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Colección de métricas exportables"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def callback(self, name, documentation, fn, labelnames=(), kind="gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, labelnames, fn, kind))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Todas las métricas en formato de exposición de texto (versión 0.0.4)"""
+        parts = []
+        for metric in self._metrics.values():
+            try:
+                parts.append(metric.render())
+            except Exception:
+                # Un gauge calculado que falla no debe romper el scrape completo
+                continue
+        return "".join(parts)
+
+
+# Registro global
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.histogram(
+    "rag_stage_duration_seconds",
+    "Duración de cada etapa del pipeline",
+    ("stage",),
+)
+STAGE_ERRORS = registry.counter(
+    "rag_stage_errors_total",
+    "Excepciones por etapa del pipeline",
+    ("stage",),
+)
+REQUEST_ERRORS = registry.counter(
+    "rag_errors_total",
+    "Errores devueltos al cliente por tipo",
+    ("error_type",),
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight",
+    "Peticiones HTTP en curso",
+)
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Duración de las peticiones HTTP por ruta",
+    ("method", "route", "status"),
+)
+
+BEDROCK_TOKENS = registry.counter(
+    "bedrock_tokens_total",
+    "Tokens de Bedrock por tipo (input, output, cache_read, cache_write)",
+    ("kind",),
+)
+PROMPT_TOKENS = registry.counter(
+    "rag_prompt_tokens_total",
+    "Tokens de entrada atribuidos a cada sección del prompt",
+    ("section",),
+)
+PROMPT_SIZE = registry.histogram(
+    "rag_prompt_input_tokens",
+    "Tokens de entrada por llamada a Bedrock",
+    buckets=TOKEN_BUCKETS,
+)
+BEDROCK_COST = registry.counter(
+    "bedrock_cost_usd_total",
+    "Costo estimado de las llamadas a Bedrock (USD)",
+)
+PROMPT_BLOAT = registry.counter(
+    "rag_prompt_bloat_total",
+    "Llamadas que superaron PROMPT_TOKEN_BUDGET, por sección dominante",
+    ("section",),
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Mide la duración de una etapa (y cuenta sus excepciones); abre un span en la traza"""
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Registra una duración medida por fuera de `track_stage`"""
+    STAGE_DURATION.observe(seconds, stage=stage)
+
+
+def count_error(error_type: Optional[str]) -> None:
+    REQUEST_ERRORS.inc(error_type=error_type or "unknown")
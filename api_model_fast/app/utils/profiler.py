@@ -0,0 +1,309 @@
+"""
+Profiler por muestreo bajo demanda para el worker en ejecución.
+
+Un hilo toma cada `interval_ms` las pilas de todos los hilos con
+`sys._current_frames()` (sin instrumentar el código, el costo es proporcional a
+la frecuencia de muestreo y no al tráfico) y las acumula en formato "collapsed"
+(`marco;marco;... cuenta`), el que leen flamegraph.pl, speedscope o inferno.
+
+Sin filtros se perfila el proceso completo, hilos en segundo plano incluidos.
+Con filtro de ruta o de latencia cada pila se atribuye a la petición que la está
+ejecutando y solo se conservan las de peticiones que coinciden con la ruta y
+superan el umbral de latencia. La petición viaja en una variable de contexto que
+heredan sus tareas (fábrica de tareas del loop) y los hilos de `asyncio.to_thread`
+(executor por defecto), ambos instalados con `profiler.install()`. Las pilas de
+otros hilos (salud de la DB, listener de logs, escritor de conversaciones, hilos
+de anyio) no entran en un perfil filtrado.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.config.config import Config
+from app.utils.exceptions import ProfilerBusyError
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Hilos ociosos (esperando trabajo o I/O): no aportan al perfil
+IDLE_FRAMES = {
+    ("threading", "wait"),
+    ("selectors", "select"),
+    ("queue", "get"),
+    ("concurrent.futures.thread", "_worker"),
+}
+
+Stack = Tuple[str, ...]
+
+# Sesión y token de la petición perfilada del contexto actual
+_profiled_request: ContextVar[Optional[Tuple["ProfileSession", int]]] = ContextVar(
+    "profiled_request", default=None
+)
+
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class ProfileSession:
+    """Una corrida del profiler: límites, filtros y muestras acumuladas"""
+
+    def __init__(
+        self,
+        seconds: float,
+        max_requests: Optional[int] = None,
+        path_prefix: Optional[str] = None,
+        min_latency_ms: float = 0.0,
+        interval_ms: float = 5.0,
+        include_idle: bool = False,
+    ):
+        self.seconds = seconds
+        self.max_requests = max_requests
+        self.path_prefix = path_prefix
+        self.min_latency_ms = min_latency_ms
+        self.interval_s = interval_ms / 1000
+        self.include_idle = include_idle
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + seconds
+        self.done = threading.Event()
+
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.requests_seen = 0
+        self.requests_kept = 0
+        self._pending: Dict[int, Counter] = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+
+        # Atribución de pilas a peticiones (solo con filtro)
+        self._threads: Dict[int, int] = {}
+        self._tasks: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    @property
+    def per_request(self) -> bool:
+        """True si las muestras se atribuyen por petición (hay filtro)"""
+        return self.path_prefix is not None or self.min_latency_ms > 0
+
+    def matches(self, path: str) -> bool:
+        return self.path_prefix is None or path.startswith(self.path_prefix)
+
+    # ------------------------------------------------------------------
+    # Peticiones (desde el middleware)
+    # ------------------------------------------------------------------
+
+    def request_started(self, path: str) -> Optional[int]:
+        """
+        Token de la petición si participa del perfil; None si no coincide.
+        Se llama desde la tarea de la petición, que queda asociada al token
+        """
+        if self.done.is_set() or not self.matches(path):
+            return None
+        with self._lock:
+            self._next_token += 1
+            token = self._next_token
+            if self.per_request:
+                self._pending[token] = Counter()
+                self._loop = asyncio.get_running_loop()
+                self._loop_thread = threading.get_ident()
+                self._tasks[asyncio.current_task()] = token
+        return token
+
+    def bind_task(self, task: asyncio.Task, token: int) -> None:
+        """Asocia a la petición una tarea creada dentro de ella"""
+        if self.per_request:
+            with self._lock:
+                self._tasks[task] = token
+
+    def run_for(self, token: int, fn, *args, **kwargs):
+        """Ejecuta `fn` en el hilo actual atribuyendo sus muestras a la petición"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = token
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._threads.pop(ident, None)
+
+    def request_finished(self, token: int, latency_ms: float) -> None:
+        with self._lock:
+            pending = self._pending.pop(token, None)
+            self.requests_seen += 1
+            if latency_ms >= self.min_latency_ms:
+                self.requests_kept += 1
+                if pending:
+                    self.stacks.update(pending)
+            if self.max_requests and self.requests_seen >= self.max_requests:
+                self.done.set()
+
+    # ------------------------------------------------------------------
+    # Muestreo (hilo del profiler)
+    # ------------------------------------------------------------------
+
+    def _owners(self) -> Optional[Dict[int, int]]:
+        """Hilo -> token de la petición que ejecuta; None si se perfila todo"""
+        if not self.per_request:
+            return None
+        with self._lock:
+            owners = {
+                ident: token for ident, token in self._threads.items() if token in self._pending
+            }
+            if self._loop is not None:
+                # La tarea que corre ahora en el loop indica a quién pertenece ese hilo
+                task = asyncio.current_task(self._loop)
+                token = self._tasks.get(task) if task is not None else None
+                if token in self._pending:
+                    owners[self._loop_thread] = token
+        return owners
+
+    def _sample(self, own_ident: int) -> None:
+        owners = self._owners()
+        stacks: List[Tuple[Optional[int], Stack]] = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            token = None
+            if owners is not None:
+                token = owners.get(ident)
+                if token is None:
+                    continue
+            leaf = (frame.f_globals.get("__name__", ""), frame.f_code.co_name)
+            if not self.include_idle and leaf in IDLE_FRAMES:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            stacks.append((token, tuple(reversed(labels))))
+
+        with self._lock:
+            self.samples += 1
+            for token, stack in stacks:
+                if owners is None:
+                    self.stacks[stack] += 1
+                elif token in self._pending:
+                    self._pending[token][stack] += 1
+
+    def run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self.done.wait(self.interval_s):
+            if time.monotonic() >= self.deadline:
+                break
+            self._sample(own_ident)
+        self.done.set()
+
+    # ------------------------------------------------------------------
+    # Resultado
+    # ------------------------------------------------------------------
+
+    def collapsed(self) -> str:
+        """Pilas en formato collapsed, de la más frecuente a la menos"""
+        with self._lock:
+            items = self.stacks.most_common()
+        lines = []
+        for stack, count in items:
+            lines.append(f"{';'.join(stack)} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "requests_seen": self.requests_seen,
+            "requests_kept": self.requests_kept,
+            "duration_s": round(time.time() - self.started_at, 2),
+        }
+
+
+class _AttributingExecutor(ThreadPoolExecutor):
+    """Executor por defecto del loop: el trabajo de `to_thread` conserva su petición"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        # submit() corre en el loop, dentro del contexto de quien llama
+        current = _profiled_request.get()
+        if current is None or current[0].done.is_set():
+            return super().submit(fn, *args, **kwargs)
+        session, token = current
+        return super().submit(session.run_for, token, fn, *args, **kwargs)
+
+
+class SamplingProfiler:
+    """Punto de entrada del profiler: una sesión activa por proceso"""
+
+    def __init__(self):
+        self.session: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+
+    def install(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Prepara el loop para atribuir muestras por petición: executor por defecto
+        y fábrica de tareas que heredan la petición del contexto. Se llama al
+        arrancar; sin sesión activa solo cuesta leer la variable de contexto
+        """
+        loop.set_default_executor(_AttributingExecutor(thread_name_prefix="asyncio"))
+        previous = loop.get_task_factory()
+
+        def task_factory(loop, coro, context=None):
+            kwargs = {} if context is None else {"context": context}
+            if previous is not None:
+                task = previous(loop, coro, **kwargs)
+            else:
+                task = asyncio.Task(coro, loop=loop, **kwargs)
+            current = _profiled_request.get() if context is None else context.get(_profiled_request)
+            if current is not None:
+                session, token = current
+                session.bind_task(task, token)
+            return task
+
+        loop.set_task_factory(task_factory)
+
+    def bind_request(self, session: ProfileSession, token: int):
+        """Marca el contexto actual como parte de la petición; devuelve el token para reset"""
+        return _profiled_request.set((session, token))
+
+    def unbind_request(self, reset_token) -> None:
+        _profiled_request.reset(reset_token)
+
+    @property
+    def active(self) -> bool:
+        session = self.session
+        return session is not None and not session.done.is_set()
+
+    def start(self, **options) -> ProfileSession:
+        """Inicia una sesión; ProfilerBusyError si ya hay una en curso"""
+        options.setdefault("interval_ms", Config.PROFILER_INTERVAL_MS)
+        with self._lock:
+            if self.active:
+                raise ProfilerBusyError(
+                    "Ya hay una sesión de profiling en curso",
+                    started_at=self.session.started_at,
+                )
+            session = ProfileSession(**options)
+            self.session = session
+        threading.Thread(target=session.run, name="sampling-profiler", daemon=True).start()
+        logger.warning(
+            f"🔬 Profiler activo: {session.seconds:.0f} s, "
+            f"peticiones={session.max_requests}, ruta={session.path_prefix}, "
+            f"latencia>={session.min_latency_ms} ms"
+        )
+        return session
+
+    def stop(self, session: ProfileSession) -> None:
+        session.done.set()
+        with self._lock:
+            if self.session is session:
+                self.session = None
+        logger.warning(f"🔬 Profiler detenido: {session.summary()}")
+
+
+# Instancia global del servicio
+profiler = SamplingProfiler()
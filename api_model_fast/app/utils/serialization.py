@@ -0,0 +1,87 @@
+"""
+Serialización JSON rápida (orjson) compartida por respuestas, persistencia y logs.
+
+orjson convierte de forma nativa fechas, tuplas, dataclasses y arreglos/escalares
+de NumPy; el hook `_default` cubre Decimal, bytes, conjuntos y objetos con
+`__dict__`. orjson rechaza las horas con zona horaria (`timetz` de PostgreSQL)
+sin pasar por el hook: en ese caso se reintenta delegando fechas y horas a
+`isoformat()`, que produce el mismo texto. Un `PreEncodedDict` se serializa una sola vez y sus bytes se
+reutilizan cada vez que aparece dentro de otro documento.
+"""
+
+import base64
+from datetime import date, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_SUBCLASS
+# Reintento: fechas y horas por `_default` (isoformat) en lugar del codificador nativo
+DATETIME_OPTIONS = OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+class PreEncodedDict(dict):
+    """Dict ya serializado: se incrusta en otros documentos sin volver a recorrerlo"""
+
+    __slots__ = ("json",)
+
+    def __init__(self, value: Dict[str, Any]):
+        super().__init__(value)
+        self.json = dumps(value)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, PreEncodedDict):
+        return orjson.Fragment(obj.json)
+    # Subclases de tipos básicos (OPT_PASSTHROUGH_SUBCLASS) como su tipo base
+    if isinstance(obj, dict):
+        return dict(obj)
+    if isinstance(obj, list):
+        return list(obj)
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (date, time)):
+        # Solo con DATETIME_OPTIONS; datetime es subclase de date
+        return obj.isoformat()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        # bytea de PostgreSQL
+        return base64.b64encode(bytes(obj)).decode()
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(by_alias=True)
+    if hasattr(obj, "__dict__"):
+        return obj.__dict__
+    raise TypeError(f"Tipo no serializable a JSON: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializa a JSON (UTF-8)"""
+    try:
+        return orjson.dumps(obj, default=_default, option=OPTIONS)
+    except orjson.JSONEncodeError:
+        # Hora con tzinfo u otra zona que orjson no acepta: el error no pasa por
+        # `_default`, así que se repite con las fechas delegadas a isoformat()
+        return orjson.dumps(obj, default=_default, option=DATETIME_OPTIONS)
+
+
+def loads(data):
+    return orjson.loads(data)
+
+
+class JSONBytesResponse(JSONResponse):
+    """Respuesta JSON serializada con orjson; acepta bytes ya codificados"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return dumps(content)
@@ -0,0 +1,70 @@
+"""
+Deduplicación "single-flight" de ejecuciones concurrentes idénticas.
+
+Si llegan varias peticiones con la misma clave mientras una ejecución está en
+curso, todas esperan el resultado de esa única ejecución en lugar de repetirla.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class SingleFlight:
+    """Coalescencia en proceso de ejecuciones asíncronas por clave"""
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.executions = 0
+        self.suppressed = 0
+
+    async def do(
+        self, key: str, func: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Ejecuta `func` una sola vez por clave entre llamadas concurrentes
+
+        Args:
+            key: Clave de deduplicación
+            func: Función que devuelve el awaitable a ejecutar
+
+        Returns:
+            Tuple (resultado, compartido): `compartido` es True si el resultado
+            proviene de una ejecución iniciada por otra petición
+        """
+        shared = self._in_flight.get(key)
+        if shared is not None:
+            self.suppressed += 1
+            logger.debug(f"[{self.name}] Petición duplicada en curso, esperando resultado compartido")
+            # shield: si este llamador se cancela, la ejecución sigue para los demás
+            return await asyncio.shield(shared), True
+
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = task
+        self.executions += 1
+        task.add_done_callback(lambda done: self._release(key, done))
+
+        return await asyncio.shield(task), False
+
+    def _release(self, key: str, task: asyncio.Future) -> None:
+        """Libera la clave al terminar la ejecución"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Marcar la excepción como recuperada aunque todos los llamadores se hayan ido
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Contadores de ejecuciones y duplicados suprimidos"""
+        total = self.executions + self.suppressed
+        return {
+            "name": self.name,
+            "executions": self.executions,
+            "suppressed": self.suppressed,
+            "in_flight": len(self._in_flight),
+            "suppression_ratio": round(self.suppressed / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,95 @@
+"""
+Estimación local de tokens y atribución del uso de Bedrock por sección del prompt.
+
+No hay tokenizador oficial disponible sin red, así que se aproxima: cada palabra
+cuenta ~1 token por cada 4 caracteres y cada signo de puntuación cuenta 1. La
+estimación se calibra con los `input_tokens` reales de cada llamada al repartirlos
+proporcionalmente entre las secciones.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from app.config.config import Config
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Secciones del prompt enriquecido
+PROMPT_SECTIONS = ("schema", "instructions", "question")
+
+
+def estimate_tokens(text: str) -> int:
+    """Número aproximado de tokens de `text`"""
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PATTERN.findall(text or ""))
+
+
+# El contexto de esquema se repite entre preguntas parecidas
+_estimate_schema_tokens = lru_cache(maxsize=256)(estimate_tokens)
+
+
+class EnhancedPrompt(str):
+    """Prompt enriquecido que recuerda qué partes son esquema y pregunta"""
+
+    def __new__(cls, text: str, schema: str = "", question: str = "", tables: Optional[List[str]] = None):
+        prompt = super().__new__(cls, text)
+        prompt.schema = schema
+        prompt.question = question
+        # Tablas elegidas por el selector de esquema (para logs y replay)
+        prompt.tables = list(tables or [])
+        return prompt
+
+    def section_estimates(self) -> Dict[str, int]:
+        """Tokens estimados por sección; las instrucciones son el resto del prompt"""
+        schema = _estimate_schema_tokens(self.schema)
+        question = estimate_tokens(self.question)
+        total = estimate_tokens(str(self))
+        return {
+            "schema": schema,
+            "instructions": max(total - schema - question, 0),
+            "question": question,
+        }
+
+
+def normalize_usage(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """Uso de tokens con claves fijas (faltantes en 0)"""
+    usage = usage or {}
+    return {
+        "input_tokens": int(usage.get("input_tokens") or 0),
+        "output_tokens": int(usage.get("output_tokens") or 0),
+        "cache_read_input_tokens": int(usage.get("cache_read_input_tokens") or 0),
+        "cache_creation_input_tokens": int(usage.get("cache_creation_input_tokens") or 0),
+    }
+
+
+def estimate_cost(usage: Dict[str, int]) -> float:
+    """Costo en USD de una llamada según los precios por 1K tokens configurados"""
+    return round(
+        usage["input_tokens"] / 1000 * Config.BEDROCK_INPUT_COST_PER_1K
+        + usage["output_tokens"] / 1000 * Config.BEDROCK_OUTPUT_COST_PER_1K
+        + usage["cache_read_input_tokens"] / 1000 * Config.BEDROCK_CACHE_READ_COST_PER_1K
+        + usage["cache_creation_input_tokens"] / 1000 * Config.BEDROCK_CACHE_WRITE_COST_PER_1K,
+        6,
+    )
+
+
+def attribute_input_tokens(prompt: str, input_tokens: int) -> Dict[str, Any]:
+    """
+    Reparte los tokens de entrada reales entre las secciones del prompt según la
+    estimación local. Un prompt sin secciones se atribuye completo a "instructions".
+    """
+    if isinstance(prompt, EnhancedPrompt):
+        estimates = prompt.section_estimates()
+    else:
+        estimates = {"schema": 0, "instructions": estimate_tokens(prompt), "question": 0}
+
+    estimated_total = sum(estimates.values())
+    if not input_tokens or not estimated_total:
+        # Sin uso reportado se usa la estimación tal cual
+        return {"sections": estimates, "estimated": estimated_total, "ratio": None}
+
+    ratio = input_tokens / estimated_total
+    sections = {name: round(value * ratio) for name, value in estimates.items()}
+    # El redondeo no debe cambiar el total
+    sections["instructions"] += input_tokens - sum(sections.values())
+    return {"sections": sections, "estimated": estimated_total, "ratio": round(ratio, 3)}
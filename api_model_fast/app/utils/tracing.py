@@ -0,0 +1,138 @@
+"""
+Traza por petición con contextvars.
+
+Cada petición HTTP tiene un `request_id` y un árbol de spans (etapas del
+pipeline). Los spans se abren con `span(nombre)`; `track_stage` de métricas ya
+abre uno por etapa. El contexto viaja a los hilos de `asyncio.to_thread`, así que
+las etapas que corren fuera del event loop quedan en el árbol de su petición.
+"""
+
+import contextvars
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class Span:
+    """Etapa con inicio, fin e hijos"""
+
+    __slots__ = ("name", "start", "end", "children", "error", "attrs")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+        self.attrs: Dict[str, Any] = {}
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        data = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "dur_ms": round(self.duration_ms, 2),
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.attrs:
+            data.update(self.attrs)
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+class Trace:
+    """Árbol de spans de una petición"""
+
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.root = Span(name)
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Duración total (ms) por nombre de etapa terminada, en orden de aparición"""
+        totals: Dict[str, float] = {}
+        stack = list(reversed(self.root.children))
+        while stack:
+            current = stack.pop()
+            if current.end is not None:
+                totals[current.name] = totals.get(current.name, 0.0) + current.duration_ms
+            stack.extend(reversed(current.children))
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"request_id": self.request_id, **self.root.to_dict(self.root.start)}
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("span", default=None)
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Reutiliza el id recibido si es válido; si no, genera uno nuevo"""
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+def start_trace(request_id: str, name: str) -> Trace:
+    """Inicia la traza de la petición en el contexto actual"""
+    trace = Trace(request_id, name)
+    _trace.set(trace)
+    _span.set(trace.root)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def span(name: str):
+    """Abre un span hijo del actual (sin traza activa no hace nada)"""
+    parent = _span.get()
+    if parent is None:
+        yield None
+        return
+
+    current = Span(name)
+    parent.children.append(current)
+    token = _span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _span.reset(token)
+
+
+def annotate(key: str, value: Any) -> None:
+    """Agrega un atributo al span actual (p. ej. el id de la petición a Bedrock)"""
+    current = _span.get()
+    if current is not None:
+        current.attrs[key] = value
+
+
+def server_timing(trace: Trace, total_ms: float) -> str:
+    """Valor del header Server-Timing (etapas terminadas y total)"""
+    parts = [
+        f"{name};dur={duration:.1f}" for name, duration in trace.stage_totals().items()
+    ]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,352 @@
+"""
+Benchmark de ChartDetector: velocidad y exactitud en un mismo reporte.
+
+Recorre las preguntas etiquetadas del CSV de fine-tuning y mide:
+  - carga del modelo: tiempo de `ChartDetector()` y memoria residente antes/después;
+  - latencia de `predict` (una pregunta por llamada, padding a max_length) por
+    cantidad de hilos de torch;
+  - throughput por lotes para cada combinación de hilos, tamaño de lote y
+    estrategia de padding: `max_length` (128 tokens), `longest` (lo que usa
+    `predict_batch`) y `sorted` (`longest` con las preguntas ordenadas por
+    largo, para que cada lote tenga poco relleno);
+  - exactitud de tipo de gráfico y de necesita_grafico, precisión/recall por
+    clase y matriz de confusión sobre todas las preguntas;
+  - cuántas veces las heurísticas de palabras clave cambian la predicción del
+    modelo (`_apply_keyword_heuristics`, llamada desde `_predict_with_model`) y
+    cuántas de esos cambios aciertan, y qué haría `_fallback_detection` si el
+    modelo fallara (coincidencias con el modelo y exactitud propia);
+  - pico de memoria residente del proceso.
+
+Uso (desde api_model_fast/):
+    python -m benchmarks.bench_chart_detector [--threads 1,4] [--batch-sizes 1,8,32,64]
+        [--paddings max_length,longest,sorted] [--sample 512] [--json]
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+API_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_QUESTIONS = API_DIR.parent / "fine-tuning" / "consultas_entrenamiento_modelo_mejorado.csv"
+
+LABELS = ["ninguno", "barras", "histograma", "lineal", "circular", "dispersion"]
+PADDINGS = ("max_length", "longest", "sorted")
+
+
+def load_labelled(path: Path) -> List[Tuple[str, bool, str]]:
+    """(consulta, necesita_grafico, tipo_grafico) por fila del CSV"""
+    with open(path, encoding="utf-8") as questions_file:
+        return [
+            (row["consulta"], row["necesita_grafico"].strip().lower() in ("true", "1"), row["tipo_grafico"].strip())
+            for row in csv.DictReader(questions_file)
+            if row.get("consulta")
+        ]
+
+
+def read_rss_mb() -> Optional[float]:
+    """Memoria residente actual del proceso (Linux /proc)"""
+    return _read_status("VmRSS:")
+
+
+def read_peak_rss_mb() -> Optional[float]:
+    """Pico de memoria residente (VmHWM; getrusage si no hay /proc)"""
+    peak = _read_status("VmHWM:")
+    if peak is not None:
+        return peak
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB, macOS bytes
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _read_status(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)], 2)
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "mean": round(statistics.mean(ordered), 2)}
+
+
+class HeuristicCounter:
+    """
+    Envuelve `_apply_keyword_heuristics` de una instancia para contar cuándo
+    revisa una predicción y cuándo la cambia.
+    """
+
+    def __init__(self, detector):
+        self.original = detector._apply_keyword_heuristics
+        self.reviewed = 0
+        self.overrides: List[Tuple[str, str]] = []  # (texto, tipo que predijo el modelo)
+        detector._apply_keyword_heuristics = self
+
+    def __call__(self, text: str, tipo_grafico: str, confidence: float) -> dict:
+        result = self.original(text, tipo_grafico, confidence)
+        if confidence < 0.7 and tipo_grafico == "ninguno":
+            self.reviewed += 1
+        if result["tipo_grafico"] != tipo_grafico:
+            self.overrides.append((text, tipo_grafico))
+        return result
+
+    def reset(self) -> None:
+        self.reviewed = 0
+        self.overrides = []
+
+
+def _ordered_batches(detector, texts: List[str], batch_size: int, padding: str) -> List[List[int]]:
+    """Índices de cada lote; con `sorted` se agrupan preguntas de largo parecido"""
+    order = list(range(len(texts)))
+    if padding == "sorted":
+        lengths = [len(detector.tokenizer.tokenize(detector.preprocess_text(text))) for text in texts]
+        order.sort(key=lambda index: lengths[index])
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def predict_all(detector, texts: List[str], batch_size: int, padding: str) -> Tuple[List[dict], List[float]]:
+    """Predicciones en el orden original y milisegundos por lote"""
+    results: List[Optional[dict]] = [None] * len(texts)
+    batch_ms = []
+    for indices in _ordered_batches(detector, texts, batch_size, padding):
+        batch = [texts[index] for index in indices]
+        start = time.perf_counter()
+        predictions = detector._predict_batch_with_model(
+            batch, padding="longest" if padding == "sorted" else padding
+        )
+        batch_ms.append((time.perf_counter() - start) * 1000)
+        for index, prediction in zip(indices, predictions):
+            results[index] = prediction
+    return results, batch_ms
+
+
+def accuracy_report(rows: List[Tuple[str, bool, str]], predictions: List[dict]) -> Dict[str, Any]:
+    confusion = {gold: {predicted: 0 for predicted in LABELS} for gold in LABELS}
+    for (_, _, gold), prediction in zip(rows, predictions):
+        if gold in confusion:
+            confusion[gold][prediction["tipo_grafico"]] += 1
+
+    per_class = {}
+    for label in LABELS:
+        true_positive = confusion[label][label]
+        predicted = sum(confusion[gold][label] for gold in LABELS)
+        actual = sum(confusion[label].values())
+        per_class[label] = {
+            "precision": round(true_positive / predicted, 3) if predicted else None,
+            "recall": round(true_positive / actual, 3) if actual else None,
+            "support": actual,
+        }
+
+    return {
+        "chart_type": round(
+            sum(p["tipo_grafico"] == gold for (_, _, gold), p in zip(rows, predictions)) / len(rows), 4
+        ),
+        "needs_chart": round(
+            sum(p["necesita_grafico"] == needs for (_, needs, _), p in zip(rows, predictions)) / len(rows), 4
+        ),
+        "per_class": per_class,
+        "confusion": confusion,
+    }
+
+
+def heuristics_report(rows: List[Tuple[str, bool, str]], counter: HeuristicCounter) -> Dict[str, Any]:
+    gold = {text: label for text, _, label in rows}
+    overrides = counter.overrides
+    # El override siempre cambia 'ninguno' por 'barras'
+    return {
+        "reviewed": counter.reviewed,
+        "overrides": len(overrides),
+        "override_rate": round(len(overrides) / len(rows), 4),
+        "overrides_correct": sum(1 for text, _ in overrides if gold.get(text) == "barras"),
+        "overrides_wrong": sum(1 for text, model in overrides if gold.get(text) == model),
+    }
+
+
+def fallback_report(detector, rows: List[Tuple[str, bool, str]], predictions: List[dict]) -> Dict[str, Any]:
+    """Qué respondería `_fallback_detection` para cada pregunta si fallara el modelo"""
+    fallback = [detector._fallback_detection(text) for text, _, _ in rows]
+    return {
+        "disagrees_with_model": sum(
+            f["chart_type"] != p["tipo_grafico"] for f, p in zip(fallback, predictions)
+        ),
+        "chart_type_accuracy": round(
+            sum(f["chart_type"] == gold for f, (_, _, gold) in zip(fallback, rows)) / len(rows), 4
+        ),
+        "needs_chart_accuracy": round(
+            sum(f["needs_chart"] == needs for f, (_, needs, _) in zip(fallback, rows)) / len(rows), 4
+        ),
+    }
+
+
+def run(args) -> Dict[str, Any]:
+    import torch
+
+    from app.services.chart_detector import ChartDetector
+
+    rows = load_labelled(Path(args.questions))
+    texts = [text for text, _, _ in rows]
+    sample = texts[: args.sample] if args.sample else texts
+
+    rss_before = read_rss_mb()
+    start = time.perf_counter()
+    detector = ChartDetector(model_path=args.model_path)
+    load_s = time.perf_counter() - start
+    rss_loaded = read_rss_mb()
+
+    counter = HeuristicCounter(detector)
+    fallback_calls = {"count": 0}
+    original_fallback = detector._fallback_detection
+
+    def counting_fallback(text: str) -> dict:
+        fallback_calls["count"] += 1
+        return original_fallback(text)
+
+    detector._fallback_detection = counting_fallback
+
+    # Exactitud sobre todas las preguntas con la configuración de predict_batch
+    predictions, _ = predict_all(detector, texts, 32, "longest")
+    reference = {
+        "accuracy": accuracy_report(rows, predictions),
+        "heuristics": heuristics_report(rows, counter),
+    }
+    counter.reset()
+
+    single, batched = [], []
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+
+        detector.predict(sample[0])  # calentamiento
+        latencies = []
+        for text in sample[: args.single]:
+            start = time.perf_counter()
+            detector.predict(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+        single.append({"threads": threads, **_percentiles(latencies)})
+
+        for batch_size in args.batch_sizes:
+            for padding in args.paddings:
+                predict_all(detector, sample[:batch_size], batch_size, padding)  # calentamiento
+                start = time.perf_counter()
+                results, batch_ms = predict_all(detector, sample, batch_size, padding)
+                elapsed = time.perf_counter() - start
+                batched.append(
+                    {
+                        "threads": threads,
+                        "batch_size": batch_size,
+                        "padding": padding,
+                        "questions_per_s": round(len(sample) / elapsed, 1),
+                        "batch_ms": _percentiles(batch_ms),
+                        "chart_type_accuracy": accuracy_report(rows[: len(sample)], results)["chart_type"],
+                    }
+                )
+
+    # Las advertencias de respaldo por pregunta no aportan al reporte
+    logging.getLogger("chart_detector").setLevel(logging.ERROR)
+    detector._fallback_detection = original_fallback
+    fallback = {"invoked_during_run": fallback_calls["count"], **fallback_report(detector, rows, predictions)}
+
+    return {
+        "meta": {
+            "questions": len(rows),
+            "sample": len(sample),
+            "device": str(detector.device),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "load": {"seconds": round(load_s, 2), "rss_before_mb": rss_before, "rss_loaded_mb": rss_loaded},
+        "single": single,
+        "batched": batched,
+        **reference,
+        "fallback": fallback,
+        "peak_rss_mb": read_peak_rss_mb(),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    meta, load = report["meta"], report["load"]
+    print(
+        f"ChartDetector en {meta['device']} (torch {meta['torch']}, {meta['cpu_count']} CPUs), "
+        f"{meta['questions']} preguntas, muestra de {meta['sample']}"
+    )
+    print(
+        f"Carga: {load['seconds']} s, RSS {load['rss_before_mb']} -> {load['rss_loaded_mb']} MB, "
+        f"pico {report['peak_rss_mb']} MB\n"
+    )
+
+    print("predict (ms por pregunta):")
+    for row in report["single"]:
+        print(f"  hilos={row['threads']:<3} p50={row['p50']:<8} p95={row['p95']:<8} p99={row['p99']}")
+
+    print("\nPor lotes:")
+    print(f"  {'hilos':>5} {'lote':>5} {'padding':<11} {'preg/s':>9} {'ms/lote p50':>12} {'p95':>9} {'exactitud':>10}")
+    for row in report["batched"]:
+        print(
+            f"  {row['threads']:>5} {row['batch_size']:>5} {row['padding']:<11} {row['questions_per_s']:>9} "
+            f"{row['batch_ms']['p50']:>12} {row['batch_ms']['p95']:>9} {row['chart_type_accuracy']:>10}"
+        )
+
+    accuracy = report["accuracy"]
+    print(f"\nExactitud: tipo {accuracy['chart_type']}, necesita_grafico {accuracy['needs_chart']}")
+    print("Matriz de confusión (filas: etiqueta, columnas: predicción):")
+    print("  " + " " * 11 + "".join(f"{label[:10]:>11}" for label in LABELS))
+    for gold in LABELS:
+        print(f"  {gold:<11}" + "".join(f"{accuracy['confusion'][gold][p]:>11}" for p in LABELS))
+
+    heuristics, fallback = report["heuristics"], report["fallback"]
+    print(
+        f"\nHeurísticas: {heuristics['reviewed']} revisadas, {heuristics['overrides']} cambios "
+        f"({heuristics['overrides_correct']} aciertan, {heuristics['overrides_wrong']} "
+        f"pisan un 'ninguno' correcto)"
+    )
+    print(
+        f"Respaldo: invocado {fallback['invoked_during_run']} veces; si reemplazara al modelo, "
+        f"difiere en {fallback['disagrees_with_model']} preguntas, exactitud de tipo "
+        f"{fallback['chart_type_accuracy']}"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", default=str(DEFAULT_QUESTIONS), help="CSV con consulta, necesita_grafico, tipo_grafico")
+    parser.add_argument("--model-path", default=None, help="Directorio del modelo (por defecto el de la app)")
+    parser.add_argument("--threads", type=_int_list, default=[1, os.cpu_count() or 1])
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 8, 32, 64])
+    parser.add_argument("--paddings", type=lambda v: [p for p in v.split(",") if p in PADDINGS], default=list(PADDINGS))
+    parser.add_argument("--sample", type=int, default=512, help="Preguntas por configuración (0: todas)")
+    parser.add_argument("--single", type=int, default=200, help="Preguntas para medir la latencia de predict")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    args = parser.parse_args()
+    args.threads = sorted(set(args.threads))
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
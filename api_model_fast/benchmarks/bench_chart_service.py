@@ -0,0 +1,312 @@
+"""
+Benchmark del renderizado de gráficos (`ChartService.generate_chart`).
+
+Para cada tipo soportado por las plantillas (bar, line, scatter, pie, histogram,
+area, box_plot) genera un DataFrame representativo de 10 a 1.000.000 filas, con
+los tipos que devuelve psycopg2 (Decimal y date como object; `--native` usa
+float64 y datetime64), arma el `chart_code` con `build_chart_code` y lo pasa por
+`chart_service.generate_chart`, el mismo camino que una petición.
+
+Por caso reporta:
+  - tiempo total y su desglose: ejecución del código (armado de la figura),
+    `savefig` (rasterizado a PNG) y codificación base64. Se miden envolviendo
+    `plt.savefig` y el `base64` del servicio durante la corrida;
+  - bytes del PNG y del base64;
+  - memoria pico: asignaciones de Python/numpy (tracemalloc) y crecimiento del
+    RSS pico del proceso (se reinicia VmHWM con /proc/self/clear_refs en Linux),
+    en una corrida aparte para no distorsionar los tiempos;
+  - figuras abiertas después de cada corrida y crecimiento de los objetos
+    Figure vivos entre la primera y la última corrida (fuga entre corridas).
+    Aparte se prueba el camino de error: código que crea una figura y luego
+    falla. Termina con código 1 si alguna corrida deja figuras abiertas o vivas
+    de más.
+
+Uso (desde api_model_fast/):
+    python -m benchmarks.bench_chart_service [--sizes 10,1000,100000,1000000]
+        [--types bar,line] [--repeat 3] [--native] [--json]
+"""
+
+import argparse
+import base64
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from app.services import chart_service as chart_module
+from app.services.chart_service import chart_service
+from app.services.chart_templates import SUPPORTED_CHART_TYPES, build_chart_code
+from app.utils.exceptions import ChartError
+
+CHART_TYPES = ["bar", "line", "scatter", "pie", "histogram", "area", "box_plot"]
+DEFAULT_SIZES = [10, 1_000, 10_000, 100_000, 1_000_000]
+
+CATEGORIAS = [f"Categoría {i}" for i in range(40)]
+METODOS_PAGO = ["efectivo", "débito", "crédito", "transferencia", "billetera virtual"]
+
+
+def _money(rng: np.random.Generator, rows: int, low: float, high: float, native: bool):
+    values = np.round(rng.uniform(low, high, rows), 2)
+    return values if native else [Decimal(f"{value:.2f}") for value in values]
+
+
+def _dates(rows: int, native: bool):
+    days = pd.date_range("2015-01-01", periods=min(rows, 3650), freq="D")
+    values = np.resize(days.values, rows)
+    return values if native else [value.date() for value in pd.DatetimeIndex(values)]
+
+
+def build_frame(chart_type: str, rows: int, native: bool = False, seed: int = 0) -> Tuple[pd.DataFrame, Dict]:
+    """DataFrame con la forma de un resultado real para `chart_type` y sus chart_fields"""
+    rng = np.random.default_rng(seed)
+    if chart_type in ("bar", "box_plot"):
+        data = {
+            "categoria": np.resize(np.array(CATEGORIAS, dtype=object), rows),
+            "total_ventas": _money(rng, rows, 1_000, 250_000, native),
+        }
+        fields = {"x_axis": "categoria", "y_axis": "total_ventas"}
+    elif chart_type in ("line", "area"):
+        data = {"fecha": _dates(rows, native), "total_ventas": _money(rng, rows, 1_000, 250_000, native)}
+        fields = {"x_axis": "fecha", "y_axis": "total_ventas"}
+    elif chart_type == "scatter":
+        data = {
+            "precio": _money(rng, rows, 100, 90_000, native),
+            "costo": _money(rng, rows, 50, 60_000, native),
+        }
+        fields = {"x_axis": "precio", "y_axis": "costo"}
+    elif chart_type == "pie":
+        data = {
+            "metodo_pago": np.resize(np.array(METODOS_PAGO, dtype=object), rows),
+            "cantidad_ventas": rng.integers(10, 5_000, rows),
+        }
+        fields = {"x_axis": "metodo_pago", "y_axis": "cantidad_ventas"}
+    elif chart_type == "histogram":
+        data = {"precio_producto": _money(rng, rows, 100, 90_000, native)}
+        fields = {"x_axis": "precio_producto"}
+    else:
+        raise ValueError(f"Tipo de gráfico sin generador: {chart_type}")
+    return pd.DataFrame(data), fields
+
+
+class _StageTimer:
+    """Acumula segundos por etapa durante una corrida"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {"savefig": 0.0, "base64": 0.0}
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+
+        return timed
+
+
+@contextmanager
+def _instrumented(timer: _StageTimer):
+    """Envuelve plt.savefig y el base64 del servicio mientras dura el bloque"""
+    original_savefig = plt.savefig
+    original_base64 = chart_module.base64
+    plt.savefig = timer.wrap("savefig", original_savefig)
+    chart_module.base64 = SimpleNamespace(b64encode=timer.wrap("base64", base64.b64encode))
+    try:
+        yield timer
+    finally:
+        plt.savefig = original_savefig
+        chart_module.base64 = original_base64
+
+
+def render_once(df: pd.DataFrame, chart_fields: Dict) -> Dict[str, Any]:
+    """Una corrida de generate_chart con el desglose por etapa en ms"""
+    # Las plantillas modifican df (conversión de Decimal y fechas)
+    frame = df.copy()
+    timer = _StageTimer()
+    with _instrumented(timer):
+        start = time.perf_counter()
+        image = chart_service.generate_chart(frame, chart_fields)
+        total = time.perf_counter() - start
+    return {
+        "total_ms": total * 1000,
+        "exec_ms": (total - timer.seconds["savefig"] - timer.seconds["base64"]) * 1000,
+        "savefig_ms": timer.seconds["savefig"] * 1000,
+        "base64_ms": timer.seconds["base64"] * 1000,
+        "base64_bytes": len(image),
+        "png_bytes": len(image) * 3 // 4 - image[-2:].count("="),
+        "open_figures": len(plt.get_fignums()),
+    }
+
+
+def _read_status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reinicia VmHWM al RSS actual (Linux); False si no se puede"""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_memory(df: pd.DataFrame, chart_fields: Dict) -> Dict[str, Optional[float]]:
+    frame = df.copy()
+    gc.collect()
+    rss_reset = _reset_peak_rss()
+    rss_before = _read_status_kb("VmRSS:")
+
+    tracemalloc.start()
+    try:
+        chart_service.generate_chart(frame, chart_fields)
+        _, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    peak_rss = _read_status_kb("VmHWM:")
+    return {
+        "traced_peak_mb": round(traced_peak / 2**20, 2),
+        "rss_peak_delta_mb": (
+            round((peak_rss - rss_before) / 1024, 1) if rss_reset and peak_rss and rss_before else None
+        ),
+    }
+
+
+def _live_figures() -> int:
+    gc.collect()
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, Figure))
+
+
+def bench_case(chart_type: str, rows: int, repeat: int, native: bool) -> Dict[str, Any]:
+    df, fields = build_frame(chart_type, rows, native)
+    fields = {**fields, "chart_code": build_chart_code(df, chart_type, fields, f"{chart_type} ({rows} filas)")}
+
+    runs, live_figures = [], []
+    for _ in range(max(repeat, 2)):
+        runs.append(render_once(df, fields))
+        live_figures.append(_live_figures())
+
+    result: Dict[str, Any] = {"chart_type": chart_type, "rows": rows}
+    for key in ("total_ms", "exec_ms", "savefig_ms", "base64_ms"):
+        result[key] = round(statistics.median(run[key] for run in runs), 2)
+    result["png_bytes"] = runs[-1]["png_bytes"]
+    result["base64_bytes"] = runs[-1]["base64_bytes"]
+    result["open_figures_after"] = max(run["open_figures"] for run in runs)
+    # Una figura retenida por referencias internas no es fuga; que crezca sí
+    result["figure_growth"] = live_figures[-1] - live_figures[0]
+    result.update(measure_memory(df, fields))
+    return result
+
+
+def probe_error_path() -> Dict[str, int]:
+    """Figuras que quedan abiertas cuando el chart_code falla después de crearlas"""
+    df, fields = build_frame("bar", 10)
+    fields = {**fields, "chart_code": "plt.figure(figsize=(10, 6))\nplt.plot(df['no_existe'])"}
+    try:
+        chart_service.generate_chart(df.copy(), fields)
+    except ChartError:
+        pass
+    open_after_error = len(plt.get_fignums())
+    plt.close("all")
+    return {"open_figures_after_error": open_after_error}
+
+
+def run(args) -> Dict[str, Any]:
+    # La primera figura de cada tipo carga fuentes, estilos y cachés (el box plot
+    # deja retenida su última figura, sin crecer): no medirla y tomar la base después
+    for chart_type in args.types:
+        df, fields = build_frame(chart_type, 10, args.native)
+        render_once(df, {**fields, "chart_code": build_chart_code(df, chart_type, fields)})
+    figures_before = _live_figures()
+    results = []
+    for rows in args.sizes:
+        for chart_type in args.types:
+            result = bench_case(chart_type, rows, args.repeat, args.native)
+            results.append(result)
+            if not args.json:
+                print(
+                    f"  {chart_type:<10} {rows:>9} filas: {result['total_ms']:>9} ms",
+                    file=sys.stderr,
+                )
+    return {
+        "dtypes": "native" if args.native else "psycopg2",
+        "repeat": args.repeat,
+        "results": results,
+        "leaks": {
+            "live_figures_before": figures_before,
+            "live_figures_after": _live_figures(),
+            **probe_error_path(),
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nChartService.generate_chart (tipos {report['dtypes']}, mediana de {report['repeat']} corridas)\n")
+    print(
+        f"{'tipo':<10} {'filas':>9} {'total ms':>10} {'exec ms':>10} {'savefig ms':>11} {'b64 ms':>7} "
+        f"{'PNG KB':>8} {'pico py MB':>11} {'pico RSS MB':>12} {'figs':>5} {'+vivas':>7}"
+    )
+    for row in report["results"]:
+        print(
+            f"{row['chart_type']:<10} {row['rows']:>9} {row['total_ms']:>10} {row['exec_ms']:>10} "
+            f"{row['savefig_ms']:>11} {row['base64_ms']:>7} {round(row['png_bytes'] / 1024, 1):>8} "
+            f"{row['traced_peak_mb']:>11} {str(row['rss_peak_delta_mb']):>12} {row['open_figures_after']:>5} {row['figure_growth']:>7}"
+        )
+    leaks = report["leaks"]
+    print(
+        f"\nFiguras vivas: {leaks['live_figures_before']} antes, {leaks['live_figures_after']} después; "
+        f"abiertas tras un chart_code con error: {leaks['open_figures_after_error']}"
+    )
+
+
+def _leaked(report: Dict[str, Any]) -> bool:
+    leaks = report["leaks"]
+    return (
+        any(row["open_figures_after"] or row["figure_growth"] > 0 for row in report["results"])
+        or leaks["open_figures_after_error"] > 0
+        or leaks["live_figures_after"] > leaks["live_figures_before"]
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument("--types", default=",".join(CHART_TYPES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--native", action="store_true", help="float64/datetime64 en lugar de Decimal/date")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.types = [kind for kind in args.types.split(",") if kind in SUPPORTED_CHART_TYPES]
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if _leaked(report) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Benchmark de escalabilidad de SchemaSelector.
+
+Genera catálogos sintéticos de N tablas (por defecto 10, 1.000 y 10.000): las
+cinco tablas del esquema de ventas de la prueba de carga más tablas de relleno
+con nombres de dominio, cantidad de columnas de distribución log-normal,
+comentarios en parte de las tablas y columnas, y un grafo de claves foráneas con
+enganche preferencial (pocas tablas muy referenciadas, como en un warehouse).
+Un `db_service` falso responde las consultas de catálogo desde memoria, así que
+se mide el selector y no PostgreSQL.
+
+Por tamaño reporta:
+  - construcción: `_build_indexes` completo, extracción del esquema y cantidad
+    de consultas de catálogo (2 por tabla + 2);
+  - memoria: pico y retenido por el selector (tracemalloc);
+  - latencia por pregunta de `select_relevant_tables` y `build_schema_context`
+    (p50/p95/p99) y tamaño del contexto en tokens estimados;
+  - recall@k contra pares pregunta→tablas etiquetados sobre el esquema de ventas.
+
+Uso (desde api_model_fast/):
+    python -m benchmarks.bench_schema_selector [--sizes 10,1000,10000] [--iterations 20] [--json]
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Set, Tuple
+
+from app.services.rag.schema_selector import SchemaSelector
+from app.utils.tokens import estimate_tokens
+from benchmarks.loadtest.scenarios import SCHEMA
+
+# Preguntas etiquetadas con las tablas que necesita el SQL correcto
+LABELLED_QUESTIONS: List[Tuple[str, Set[str]]] = [
+    ("¿Cuál es el total de ventas por mes?", {"ventas"}),
+    ("Cantidad de ventas por método de pago", {"ventas"}),
+    ("Total vendido por cada vendedor", {"ventas", "vendedores"}),
+    ("Vendedores agrupados por región", {"vendedores"}),
+    ("Listado de clientes de Córdoba con su email", {"clientes"}),
+    ("Edad promedio de los clientes por ciudad", {"clientes"}),
+    ("Clientes con más ventas en el último año", {"clientes", "ventas"}),
+    ("Stock de productos por marca", {"productos"}),
+    ("Relación entre precio y costo de los productos", {"productos"}),
+    ("Unidades vendidas por categoría de producto", {"productos", "detalle_ventas"}),
+    ("Descuento promedio del detalle de ventas por producto", {"detalle_ventas", "productos"}),
+    ("Cantidad vendida por producto y proveedor", {"detalle_ventas", "productos"}),
+]
+
+RECALL_K = (1, 3, 5)
+
+# Vocabulario para las tablas de relleno
+_DOMAINS = [
+    "ventas", "compras", "logistica", "rrhh", "finanzas", "marketing", "soporte",
+    "inventario", "produccion", "calidad", "contabilidad", "tesoreria", "legales",
+    "clientes", "proveedores", "sucursales", "auditoria", "facturacion",
+]
+_ENTITIES = [
+    "pedidos", "facturas", "envios", "empleados", "campanias", "tickets", "movimientos",
+    "lotes", "presupuestos", "cobranzas", "pagos", "depositos", "contratos", "reclamos",
+    "tarifas", "rutas", "turnos", "liquidaciones", "asientos", "cuentas", "remitos",
+    "devoluciones", "promociones", "encuestas", "incidencias", "metas", "comisiones",
+]
+_SUFFIXES = ["", "_hist", "_stg", "_resumen", "_diario", "_mensual", "_detalle", "_log"]
+_COLUMNS = [
+    ("fecha", "date"), ("fecha_alta", "date"), ("fecha_baja", "date"), ("total", "numeric"),
+    ("monto", "numeric"), ("importe", "numeric"), ("cantidad", "integer"), ("estado", "character varying"),
+    ("nombre", "character varying"), ("descripcion", "text"), ("codigo", "character varying"),
+    ("tipo", "character varying"), ("observaciones", "text"), ("moneda", "character varying"),
+    ("region", "character varying"), ("canal", "character varying"), ("prioridad", "integer"),
+    ("porcentaje", "numeric"), ("usuario", "character varying"), ("origen", "character varying"),
+    ("destino", "character varying"), ("numero", "integer"), ("periodo", "character varying"),
+    ("categoria", "character varying"), ("precio", "numeric"), ("created_at", "timestamp"),
+    ("updated_at", "timestamp"), ("activo", "boolean"),
+]
+_COMMENT_WORDS = [
+    "registro", "operaciones", "histórico", "consolidado", "diario", "mensual", "pendientes",
+    "aprobados", "importe", "moneda", "sucursal", "cliente", "proveedor", "vendedor", "producto",
+    "stock", "cobranza", "factura", "envío", "contable", "interno", "externo", "vigente",
+]
+
+
+def build_catalog(size: int, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """
+    Catálogo de `size` tablas con el formato de SCHEMA: el esquema de ventas
+    (recortado si `size` es menor) y tablas de relleno hasta completar.
+    """
+    rng = random.Random(seed)
+    catalog: Dict[str, Dict[str, Any]] = {}
+    for table in list(SCHEMA)[:size]:
+        spec = SCHEMA[table]
+        catalog[table] = {
+            "columns": [(name, kind, None) for name, kind in spec["columns"]],
+            "foreign_keys": [fk for fk in spec["foreign_keys"] if fk[1] in catalog],
+            "comment": spec["comment"],
+        }
+
+    # Cada tabla aparece una vez más por cada referencia entrante
+    targets = list(catalog)
+    names = [f"{d}_{e}{s}" for s in _SUFFIXES for d in _DOMAINS for e in _ENTITIES]
+    index = 0
+    while len(catalog) < size:
+        name = names[index] if index < len(names) else f"{names[index % len(names)]}_{index // len(names)}"
+        index += 1
+        if name in catalog:
+            continue
+
+        count = max(3, min(int(rng.lognormvariate(2.2, 0.6)), 120))
+        columns = [("id", "integer", None)]
+        for column, kind in rng.sample(_COLUMNS, min(count - 1, len(_COLUMNS))):
+            comment = " ".join(rng.sample(_COMMENT_WORDS, 3)) if rng.random() < 0.3 else None
+            columns.append((column, kind, comment))
+        for extra in range(len(columns), count):
+            columns.append((f"atributo_{extra}", rng.choice(["integer", "numeric", "character varying"]), None))
+
+        foreign_keys = []
+        if targets:
+            for target in {rng.choice(targets) for _ in range(rng.choice([0, 1, 1, 2, 2, 3]))}:
+                column = f"{target.rstrip('s')}_id"
+                columns.append((column, "integer", None))
+                foreign_keys.append((column, target, "id"))
+                targets.append(target)
+
+        catalog[name] = {
+            "columns": columns,
+            "foreign_keys": foreign_keys,
+            "comment": " ".join(rng.sample(_COMMENT_WORDS, 5)).capitalize() if rng.random() < 0.6 else None,
+        }
+        targets.append(name)
+
+    return catalog
+
+
+_TABLE_NAME = re.compile(r"table_name\s*=\s*'(\w+)'", re.IGNORECASE)
+
+
+class FakeCatalogService:
+    """`db_service` falso: responde las consultas de catálogo de SchemaSelector desde memoria"""
+
+    def __init__(self, catalog: Dict[str, Dict[str, Any]]):
+        self.catalog = catalog
+        self.queries = 0
+
+    def execute_query(self, query: str, route: str = "read", **kwargs) -> Dict[str, Any]:
+        self.queries += 1
+        lowered = query.lower()
+        if "col_description" in lowered:
+            columns = ["table_name", "column_name", "column_comment", "table_comment"]
+            rows = [
+                (table, name, comment, spec["comment"])
+                for table, spec in sorted(self.catalog.items())
+                for name, _, comment in spec["columns"]
+            ]
+        elif "information_schema.columns" in lowered:
+            table = _TABLE_NAME.search(query).group(1)
+            columns = ["column_name", "data_type", "is_nullable"]
+            rows = [
+                (name, kind, "NO" if name == "id" else "YES")
+                for name, kind, _ in self.catalog[table]["columns"]
+            ]
+        elif "table_constraints" in lowered:
+            table = _TABLE_NAME.search(query).group(1)
+            columns = ["column_name", "foreign_table_name", "foreign_column_name"]
+            rows = list(self.catalog[table]["foreign_keys"])
+        elif "information_schema.tables" in lowered:
+            columns = ["table_name"]
+            rows = [(table,) for table in sorted(self.catalog)]
+        else:
+            raise ValueError(f"Consulta de catálogo no soportada: {query[:80]}")
+        return {"columns": columns, "data": rows}
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+
+    def at(fraction: float) -> float:
+        return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)], 3)
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": round(ordered[-1], 3)}
+
+
+def _recall(selector: SchemaSelector) -> Dict[str, float]:
+    recall = {}
+    for k in RECALL_K:
+        scores = []
+        for question, expected in LABELLED_QUESTIONS:
+            selected = {table for table, _ in selector.select_relevant_tables(question, max_tables=k)}
+            # Con k menor que las tablas esperadas, el máximo alcanzable es k/|esperadas|
+            scores.append(len(selected & expected) / min(len(expected), k))
+        recall[f"recall@{k}"] = round(statistics.mean(scores), 3)
+    return recall
+
+
+def bench_size(size: int, iterations: int, builds: int, seed: int) -> Dict[str, Any]:
+    catalog = build_catalog(size, seed)
+    db = FakeCatalogService(catalog)
+
+    # Memoria: lo que asigna y retiene el selector, sin contar el catálogo falso
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    selector = SchemaSelector(db)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    catalog_queries = db.queries
+
+    # Tiempos sin tracemalloc (lo ralentiza)
+    build_ms, extract_ms = [], []
+    for _ in range(builds):
+        start = time.perf_counter()
+        selector._extract_schema_from_db()
+        extract_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        selector._build_indexes()
+        build_ms.append((time.perf_counter() - start) * 1000)
+
+    select_ms, context_ms, context_tokens = [], [], []
+    for _ in range(iterations):
+        for question, _ in LABELLED_QUESTIONS:
+            start = time.perf_counter()
+            selector.select_relevant_tables(question, max_tables=5)
+            select_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            context = selector.build_schema_context(question)
+            context_ms.append((time.perf_counter() - start) * 1000)
+            context_tokens.append(estimate_tokens(context))
+
+    return {
+        "tables": len(selector.tables_metadata),
+        "columns": sum(len(spec["columns"]) for spec in catalog.values()),
+        "foreign_keys": sum(len(spec["foreign_keys"]) for spec in catalog.values()),
+        "keywords": len(selector.keyword_index),
+        "catalog_queries": catalog_queries,
+        "build_ms": round(statistics.median(build_ms), 2),
+        "extract_ms": round(statistics.median(extract_ms), 2),
+        "memory_peak_mb": round((peak - baseline) / 2**20, 2),
+        "memory_retained_mb": round((retained - baseline) / 2**20, 2),
+        "select_ms": _percentiles(select_ms),
+        "context_ms": _percentiles(context_ms),
+        "context_tokens_mean": round(statistics.mean(context_tokens)),
+        **_recall(selector),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,10000", help="Tamaños de catálogo separados por coma")
+    parser.add_argument("--iterations", type=int, default=20, help="Pasadas por las preguntas etiquetadas")
+    parser.add_argument("--builds", type=int, default=3, help="Reconstrucciones para medir build_ms")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    args = parser.parse_args()
+
+    # El selector loguea cada construcción y selección
+    logging.getLogger("app.services.rag.schema_selector").setLevel(logging.WARNING)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    report = {
+        "questions": len(LABELLED_QUESTIONS),
+        "results": [bench_size(size, args.iterations, args.builds, args.seed) for size in sizes],
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"SchemaSelector ({report['questions']} preguntas etiquetadas, {args.iterations} pasadas)\n")
+    header = (
+        f"{'tablas':>7} {'columnas':>9} {'keywords':>9} {'build ms':>9} {'extract ms':>10} "
+        f"{'pico MB':>8} {'ret. MB':>8} {'select p50/p95':>16} {'contexto p50/p95':>18} "
+        f"{'tokens':>7} " + " ".join(f"{f'R@{k}':>5}" for k in RECALL_K)
+    )
+    print(header)
+    for row in report["results"]:
+        print(
+            f"{row['tables']:>7} {row['columns']:>9} {row['keywords']:>9} {row['build_ms']:>9} "
+            f"{row['extract_ms']:>10} {row['memory_peak_mb']:>8} {row['memory_retained_mb']:>8} "
+            f"{row['select_ms']['p50']:>7}/{row['select_ms']['p95']:<8} "
+            f"{row['context_ms']['p50']:>8}/{row['context_ms']['p95']:<9} "
+            f"{row['context_tokens_mean']:>7} " + " ".join(f"{row[f'recall@{k}']:>5}" for k in RECALL_K)
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
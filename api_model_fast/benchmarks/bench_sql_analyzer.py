@@ -0,0 +1,172 @@
+"""
+Benchmark del analizador de SQL (validación + sanitización).
+
+Compara el camino anterior (23 regex por separado y hasta tres `sqlparse.parse`
+por petición) con `analyze_sql` de una sola pasada, y revisa que ninguna entrada
+adversaria provoque backtracking catastrófico: el tiempo debe crecer de forma
+aproximadamente lineal con el tamaño de la entrada.
+
+Uso (desde api_model_fast/):
+    python -m benchmarks.bench_sql_analyzer [--iterations 2000] [--json]
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from typing import Callable, Dict, List
+
+import sqlparse
+
+from app.services.sql_analyzer import DANGEROUS_PATTERNS, DANGEROUS_REGEX, analyze_sql
+
+# Consultas típicas generadas por el modelo
+TYPICAL_QUERIES = [
+    "SELECT nombre, email FROM clientes WHERE ciudad = 'Córdoba' LIMIT 50;",
+    "SELECT c.nombre, SUM(v.total) AS total FROM clientes c INNER JOIN ventas v "
+    "ON v.cliente_id = c.id GROUP BY c.nombre ORDER BY 2 DESC LIMIT 10;",
+    "WITH mensual AS (SELECT date_trunc('month', fecha) AS mes, SUM(total) AS total "
+    "FROM ventas GROUP BY 1) SELECT mes, total FROM mensual ORDER BY mes;",
+    "SELECT p.categoria, COUNT(*) FROM productos p WHERE p.id IN "
+    "(SELECT producto_id FROM detalle_ventas WHERE cantidad > 5) GROUP BY p.categoria;",
+    "SELECT credit_limit, last_update FROM cuentas WHERE EXTRACT(YEAR FROM fecha) = 2024;",
+]
+
+# Generadores de entradas adversarias de tamaño n
+ADVERSARIAL_INPUTS: Dict[str, Callable[[int], str]] = {
+    # \s+ seguido de una palabra que nunca aparece
+    "whitespace_runs": lambda n: "SELECT 1 FROM t WHERE DROP" + " " * n + "x",
+    # UPDATE \w+ \s+ SET con un identificador enorme y sin SET
+    "update_long_word": lambda n: "UPDATE " + "a" * n + " x",
+    # Muchos inicios parciales de patrones peligrosos
+    "partial_keywords": lambda n: "SELECT " + "UPDATE a " * (n // 9) + "FROM t",
+    "repeated_create": lambda n: "CREATE " * (n // 7),
+    # Anidamiento profundo de subconsultas
+    "nested_parens": lambda n: "SELECT * FROM t WHERE x IN "
+    + "(SELECT y FROM u WHERE y IN " * (n // 32)
+    + "(1)"
+    + ")" * (n // 32),
+    # Listas IN enormes y comentarios
+    "huge_in_list": lambda n: "SELECT * FROM t WHERE id IN ("
+    + ",".join(str(i) for i in range(n // 6))
+    + ")",
+    "many_comments": lambda n: "SELECT 1 " + "/* DROP TABLE x */ " * (n // 19),
+    "long_string_literal": lambda n: "SELECT '" + "drop table " * (n // 11) + "' FROM t",
+}
+
+
+class LegacyValidator:
+    """Reproducción del validador anterior para comparar"""
+
+    def __init__(self):
+        self.compiled_patterns = [re.compile(p, re.IGNORECASE) for p in DANGEROUS_PATTERNS]
+
+    def validate(self, sql: str) -> bool:
+        for pattern in self.compiled_patterns:
+            if pattern.search(sql):
+                return False
+        return bool(sqlparse.parse(sql))
+
+    def sanitize(self, sql: str) -> str:
+        self.validate(sql)
+        statement = sqlparse.parse(sql)[0]
+        if "limit" not in statement.value.lower():
+            sql = f"{sql.rstrip(';')} LIMIT 1000;"
+        return sql
+
+    def run(self, sql: str) -> str:
+        # La ruta llamaba a validate y luego a sanitize (que vuelve a validar)
+        self.validate(sql)
+        return self.sanitize(sql)
+
+
+def _time_per_call(func: Callable[[str], object], inputs: List[str], iterations: int) -> float:
+    """Tiempo medio por llamada en microsegundos"""
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(inputs[i % len(inputs)])
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench_throughput(iterations: int) -> Dict[str, float]:
+    legacy = LegacyValidator()
+    uncached = analyze_sql.__wrapped__
+    return {
+        "legacy_us": round(_time_per_call(legacy.run, TYPICAL_QUERIES, iterations), 2),
+        "analyzer_uncached_us": round(_time_per_call(uncached, TYPICAL_QUERIES, iterations), 2),
+        "analyzer_cached_us": round(_time_per_call(analyze_sql, TYPICAL_QUERIES, iterations), 2),
+        "combined_regex_us": round(
+            _time_per_call(lambda q: list(DANGEROUS_REGEX.finditer(q)), TYPICAL_QUERIES, iterations), 2
+        ),
+    }
+
+
+def _measure(func: Callable[[str], object], text: str, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_backtracking(sizes=(1_000, 4_000, 16_000), max_growth: float = 8.0) -> List[Dict]:
+    """
+    Mide cada entrada adversaria a varios tamaños. Cuadruplicar la entrada no
+    debería multiplicar el tiempo por más de `max_growth` (lineal ~4x, cuadrático ~16x).
+    """
+    uncached = analyze_sql.__wrapped__
+    results = []
+    for name, build in ADVERSARIAL_INPUTS.items():
+        for label, func in (
+            ("regex", lambda q: list(DANGEROUS_REGEX.finditer(q))),
+            ("analyzer", uncached),
+        ):
+            timings = [_measure(func, build(size)) for size in sizes]
+            growth = max(
+                later / max(earlier, 1e-6) for earlier, later in zip(timings, timings[1:])
+            )
+            results.append(
+                {
+                    "input": name,
+                    "stage": label,
+                    "timings_ms": [round(t * 1000, 3) for t in timings],
+                    "max_growth": round(growth, 2),
+                    "ok": growth <= max_growth,
+                }
+            )
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--json", action="store_true", help="Imprimir el resultado como JSON")
+    args = parser.parse_args()
+
+    report = {
+        "throughput": bench_throughput(args.iterations),
+        "backtracking": bench_backtracking(),
+    }
+    report["all_linear"] = all(row["ok"] for row in report["backtracking"])
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print("Throughput (µs por consulta):")
+        for key, value in report["throughput"].items():
+            print(f"  {key:<22} {value:>10}")
+        print("\nEntradas adversarias (tiempos en ms para 1k / 4k / 16k caracteres):")
+        for row in report["backtracking"]:
+            status = "OK" if row["ok"] else "SUPERLINEAL"
+            print(
+                f"  {row['input']:<20} {row['stage']:<9} {row['timings_ms']} "
+                f"x{row['max_growth']:<6} {status}"
+            )
+
+    return 0 if report["all_linear"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,4 @@
+"""
+Prueba de carga de punta a punta con dobles locales de Bedrock, PostgreSQL y el
+servicio de conversaciones. Ver `python -m benchmarks.loadtest --help`.
+"""
@@ -0,0 +1,349 @@
+"""
+Prueba de carga de punta a punta de POST /rag/nl-to-sql.
+
+Levanta los dobles de Bedrock y del servicio de conversaciones, arranca la API
+en un proceso aparte (con el driver falso de PostgreSQL o con una base real) y
+la recorre con preguntas muestreadas del CSV de entrenamiento a uno o más
+niveles de concurrencia. Reporta throughput, latencia p50/p95/p99, desglose por
+etapa (header Server-Timing), errores y memoria residente del proceso de la API.
+
+Uso (desde api_model_fast/):
+    python -m benchmarks.loadtest [--concurrency 1,8,32] [--requests 200]
+        [--bedrock-latency-ms 800] [--db-latency-ms 5] [--rows 50]
+        [--output resultado.json] [--compare base.json] [--json]
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.loadtest.process import (
+    API_DIR,
+    free_port,
+    git_commit,
+    read_rss_mb,
+    spawn_api,
+    stop_api,
+    wait_ready,
+)
+from benchmarks.loadtest.stubs import StubBedrock, StubConversations
+
+DEFAULT_QUESTIONS = API_DIR.parent / "fine-tuning" / "consultas_entrenamiento_modelo_mejorado.csv"
+ENDPOINT = "/rag/nl-to-sql"
+
+
+def load_questions(path: Path) -> List[str]:
+    with open(path, encoding="utf-8") as questions_file:
+        return [row["consulta"] for row in csv.DictReader(questions_file) if row.get("consulta")]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Percentil por rango más cercano"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(max(int(round(q * len(ordered) + 0.5)) - 1, 0), len(ordered) - 1)
+    return round(ordered[index], 2)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(values, 0.50),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "mean": round(sum(values) / len(values), 2) if values else None,
+        "max": round(max(values), 2) if values else None,
+    }
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    stages = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.startswith("dur="):
+            stages[name] = float(params[4:])
+    return stages
+
+
+# ----------------------------------------------------------------------
+# Proceso de la API
+# ----------------------------------------------------------------------
+
+
+def start_api(args, bedrock: StubBedrock, conversations: StubConversations, workdir: str) -> subprocess.Popen:
+    env = {
+        "BEDROCK_ENDPOINT_URL": bedrock.url,
+        "BEDROCK_STREAMING": "true" if args.streaming else "false",
+        "CONVERSATIONS_URL": conversations.url,
+        "AWS_ACCESS_KEY_ID": os.environ.get("AWS_ACCESS_KEY_ID", "loadtest"),
+        "AWS_SECRET_ACCESS_KEY": os.environ.get("AWS_SECRET_ACCESS_KEY", "loadtest"),
+        "LOG_LEVEL": "WARNING",
+        "ENABLE_FILE_LOGGING": "false",
+        "TRACE_LOG": "false",
+        "ARTIFACT_DIR": os.path.join(workdir, "artifacts"),
+        "CONVERSATION_SPOOL_PATH": os.path.join(workdir, "conversation_spool.jsonl"),
+        "ANALYTICS_SNAPSHOT_INTERVAL_S": "0",
+    }
+    server_args = [
+        "--db-latency-ms", str(args.db_latency_ms),
+        "--rows", str(args.rows),
+        "--seed", str(args.seed),
+    ]
+    if not args.real_db:
+        server_args.append("--fake-db")
+    return spawn_api(args.port, env, server_args)
+
+
+# ----------------------------------------------------------------------
+# Carga
+# ----------------------------------------------------------------------
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    questions: List[str],
+    concurrency: int,
+    total: int,
+    rng: random.Random,
+    pid: int,
+) -> Dict[str, Any]:
+    """Ejecuta `total` peticiones con `concurrency` clientes simultáneos"""
+    sample = [rng.choice(questions) for _ in range(total)]
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    statuses: Dict[str, int] = {}
+    rss_samples: List[float] = []
+    next_index = iter(range(total))
+
+    async def worker():
+        for index in next_index:
+            start = time.perf_counter()
+            try:
+                response = await client.post(ENDPOINT, json={"pregunta": sample[index]})
+                status = str(response.status_code)
+                timing = response.headers.get("server-timing", "")
+            except httpx.HTTPError as e:
+                status, timing = type(e).__name__, ""
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "200":
+                latencies.append(elapsed_ms)
+                for name, duration in parse_server_timing(timing).items():
+                    stages.setdefault(name, []).append(duration)
+
+    async def sample_rss(stop: asyncio.Event):
+        while not stop.is_set():
+            rss = read_rss_mb(pid)
+            if rss is not None:
+                rss_samples.append(rss)
+            try:
+                await asyncio.wait_for(stop.wait(), 0.5)
+            except asyncio.TimeoutError:
+                pass
+
+    rss_start = read_rss_mb(pid)
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+    stop.set()
+    await sampler
+
+    ok = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": ok,
+        "errors": total - ok,
+        "status_codes": statuses,
+        "duration_s": round(duration, 2),
+        "throughput_rps": round(ok / duration, 2) if duration else None,
+        "latency_ms": summarize(latencies),
+        "stages_ms": {name: summarize(values) for name, values in sorted(stages.items())},
+        "rss_mb": {
+            "start": rss_start,
+            "peak": max(rss_samples) if rss_samples else None,
+            "end": read_rss_mb(pid),
+        },
+    }
+
+
+def scrape_errors(metrics_text: str) -> Dict[str, float]:
+    """rag_errors_total por tipo, de la salida de /metrics"""
+    errors = {}
+    for line in metrics_text.splitlines():
+        if line.startswith("rag_errors_total{"):
+            labels, value = line.rsplit(" ", 1)
+            errors[labels[labels.index('"') + 1:labels.rindex('"')]] = float(value)
+    return errors
+
+
+async def run(args) -> Dict[str, Any]:
+    questions = load_questions(args.questions)
+    rng = random.Random(args.seed)
+    bedrock = StubBedrock(
+        latency_ms=args.bedrock_latency_ms,
+        jitter_ms=args.bedrock_jitter_ms,
+        chunk_ms=args.bedrock_chunk_ms,
+        seed=args.seed,
+    ).start()
+    conversations = StubConversations(latency_ms=args.conversation_latency_ms).start()
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        process = start_api(args, bedrock, conversations, workdir)
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        try:
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout, limits=limits
+            ) as client:
+                await wait_ready(client, process, args.startup_timeout)
+                rss_idle = read_rss_mb(process.pid)
+
+                if args.warmup:
+                    await run_level(client, questions, min(args.warmup, 4), args.warmup, rng, process.pid)
+
+                levels = []
+                for concurrency in args.concurrency:
+                    levels.append(
+                        await run_level(client, questions, concurrency, args.requests, rng, process.pid)
+                    )
+
+                errors = scrape_errors((await client.get("/metrics")).text)
+        finally:
+            stop_api(process)
+            bedrock.stop()
+            conversations.stop()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {
+                "requests": args.requests,
+                "warmup": args.warmup,
+                "streaming": args.streaming,
+                "database": "real" if args.real_db else "fake",
+                "bedrock_latency_ms": args.bedrock_latency_ms,
+                "bedrock_jitter_ms": args.bedrock_jitter_ms,
+                "bedrock_chunk_ms": args.bedrock_chunk_ms,
+                "db_latency_ms": args.db_latency_ms,
+                "rows": args.rows,
+                "conversation_latency_ms": args.conversation_latency_ms,
+                "seed": args.seed,
+            },
+        },
+        "rss_idle_mb": rss_idle,
+        "levels": levels,
+        "errors_by_type": errors,
+        "stubs": {"bedrock": bedrock.stats, "conversations": conversations.stats},
+    }
+
+
+# ----------------------------------------------------------------------
+# Salida
+# ----------------------------------------------------------------------
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Diferencias relativas (%) contra un reporte anterior, por concurrencia"""
+    previous = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    rows = []
+    for level in report["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        row = {"concurrency": level["concurrency"]}
+        pairs = [("throughput_rps", level["throughput_rps"], before["throughput_rps"])]
+        pairs += [
+            (f"latency_{q}", level["latency_ms"][q], before["latency_ms"][q]) for q in ("p50", "p95", "p99")
+        ]
+        pairs.append(("rss_peak_mb", level["rss_mb"]["peak"], before["rss_mb"]["peak"]))
+        for key, now, then in pairs:
+            row[key] = round((now - then) / then * 100, 1) if now is not None and then else None
+        rows.append(row)
+    return rows
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    config = report["meta"]["config"]
+    print(
+        f"Commit {report['meta']['git_commit']} · Bedrock {config['bedrock_latency_ms']} ms · "
+        f"DB {config['database']} {config['db_latency_ms']} ms · {config['rows']} filas · "
+        f"RSS en reposo {report['rss_idle_mb']} MB"
+    )
+    print(f"\n{'conc':>5} {'ok':>6} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'RSS pico':>9}")
+    for level in report["levels"]:
+        latency = level["latency_ms"]
+        print(
+            f"{level['concurrency']:>5} {level['ok']:>6} {level['errors']:>5} {level['throughput_rps']:>8} "
+            f"{latency['p50']:>9} {latency['p95']:>9} {latency['p99']:>9} {level['rss_mb']['peak']:>9}"
+        )
+    for level in report["levels"]:
+        print(f"\nEtapas (ms) con concurrencia {level['concurrency']}:")
+        for name, values in level["stages_ms"].items():
+            print(f"  {name:<18} p50 {values['p50']:>9}  p95 {values['p95']:>9}  p99 {values['p99']:>9}")
+    if report["errors_by_type"]:
+        print(f"\nErrores por tipo: {report['errors_by_type']}")
+    if report.get("comparison"):
+        print("\nVariación contra la base (%):")
+        for row in report["comparison"]:
+            print(f"  {row}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="Niveles separados por coma")
+    parser.add_argument("--requests", type=int, default=200, help="Peticiones por nivel")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--questions", type=Path, default=DEFAULT_QUESTIONS)
+    parser.add_argument("--bedrock-latency-ms", type=float, default=800)
+    parser.add_argument("--bedrock-jitter-ms", type=float, default=200)
+    parser.add_argument("--bedrock-chunk-ms", type=float, default=10)
+    parser.add_argument("--no-streaming", dest="streaming", action="store_false")
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--real-db", action="store_true", help="Usar la base de DB_HOST/DB_NODES")
+    parser.add_argument("--conversation-latency-ms", type=float, default=5)
+    parser.add_argument("--port", type=int, default=0, help="Puerto de la API (0 = libre)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Guardar el reporte JSON")
+    parser.add_argument("--compare", type=Path, help="Reporte JSON anterior para comparar")
+    parser.add_argument("--json", action="store_true", help="Imprimir el reporte como JSON")
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(",") if value.strip()]
+    args.port = args.port or free_port()
+
+    report = asyncio.run(run(args))
+    if args.compare:
+        report["comparison"] = compare(report, json.loads(args.compare.read_text()))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+    return 0 if all(level["errors"] == 0 for level in report["levels"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Driver falso de PostgreSQL para la prueba de carga.
+
+Se inyecta con `DBRouter.from_config(connect_fn=FakePostgres(...).connect)` y
+responde lo que la API le pide a la base: catálogo (information_schema y
+comentarios), health check de réplicas, EXPLAIN para la guardia de costo,
+pg_class para el tamaño de tablas, sentencias preparadas (PREPARE/EXECUTE) y el
+SQL de los escenarios, con filas generadas y una latencia configurable. Mide el
+costo de la API alrededor de la base, no el de PostgreSQL.
+
+El catálogo sale de `scenarios.SCHEMA` o, si se pasa `schema`, de un esquema con
+el formato de `SchemaSelector.schema_info` (el que graba el cassette de Bedrock),
+para que `benchmarks/replay.py` vea las mismas tablas que producción.
+"""
+
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2
+
+from benchmarks.loadtest.scenarios import ALL_SCENARIOS, SCHEMA, scenario_for_sql
+
+_PREPARE = re.compile(r"^\s*PREPARE\s+(\w+)\s+AS\s+(.*)$", re.IGNORECASE | re.DOTALL)
+_EXECUTE = re.compile(r"^\s*EXECUTE\s+(\w+)", re.IGNORECASE)
+_TABLE_NAME = re.compile(r"table_name\s*=\s*'(\w+)'", re.IGNORECASE)
+_NO_RESULT = re.compile(r"^\s*(SET|SAVEPOINT|RELEASE|ROLLBACK|DEALLOCATE|BEGIN|COMMIT)\b", re.IGNORECASE)
+
+
+def catalog_from_scenarios() -> Dict[str, Dict[str, Any]]:
+    """`scenarios.SCHEMA` con el formato de `SchemaSelector.schema_info`"""
+    return {
+        table: {
+            "columns": [
+                {"name": name, "type": kind, "nullable": name != "id"} for name, kind in info["columns"]
+            ],
+            "relationships": [
+                {"column": column, "references_table": ref_table, "references_column": ref_column}
+                for column, ref_table, ref_column in info.get("foreign_keys", [])
+            ],
+            "table_comment": info.get("comment"),
+        }
+        for table, info in SCHEMA.items()
+    }
+
+
+class FakePostgres:
+    """Fábrica de conexiones con datos precalculados por escenario"""
+
+    def __init__(
+        self,
+        rows: int = 50,
+        latency_ms: float = 5.0,
+        seed: int = 0,
+        schema: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        self.latency_s = latency_ms / 1000
+        self.catalog = schema if schema is not None else catalog_from_scenarios()
+        self.rows = {scenario.name: scenario.rows(rows, seed) for scenario in ALL_SCENARIOS}
+        self.table_rows = max(rows, 1) * 1000
+        self._lock = threading.Lock()
+        self.stats = {"connections": 0, "queries": 0, "prepared": 0}
+
+    def connect(self, **params) -> "FakeConnection":
+        with self._lock:
+            self.stats["connections"] += 1
+        return FakeConnection(self)
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    # ------------------------------------------------------------------
+    # Respuestas
+    # ------------------------------------------------------------------
+
+    def answer(self, sql: str) -> Tuple[Optional[List[str]], List[Tuple]]:
+        """(columnas, filas) para `sql`; columnas None si no devuelve filas"""
+        lowered = sql.lower()
+
+        if _NO_RESULT.match(sql):
+            return None, []
+        if "pg_is_in_recovery" in lowered:
+            return ["pg_is_in_recovery", "lag"], [(False, 0)]
+        if "col_description" in lowered:
+            return self._comments()
+        if "information_schema.columns" in lowered:
+            table = _TABLE_NAME.search(sql).group(1)
+            columns = self.catalog.get(table, {}).get("columns", [])
+            return ["column_name", "data_type", "is_nullable"], [
+                (col["name"], col["type"], "YES" if col.get("nullable", True) else "NO") for col in columns
+            ]
+        if "table_constraints" in lowered:
+            table = _TABLE_NAME.search(sql).group(1)
+            return ["column_name", "foreign_table_name", "foreign_column_name"], [
+                (rel["column"], rel["references_table"], rel["references_column"])
+                for rel in self.catalog.get(table, {}).get("relationships", [])
+            ]
+        if "information_schema.tables" in lowered:
+            return ["table_name"], [(table,) for table in sorted(self.catalog)]
+        if "from pg_class" in lowered:
+            return ["relname", "reltuples"], [
+                (table, float(self.table_rows)) for table in self.catalog if f"'{table}'" in sql
+            ]
+        if lowered.lstrip().startswith("explain"):
+            return ["QUERY PLAN"], [(self._plan(sql),)]
+
+        self.count("queries")
+        time.sleep(self.latency_s)
+        scenario = scenario_for_sql(sql)
+        if scenario is None:
+            return ["valor"], [(1,)]
+        return list(scenario.columns), list(self.rows[scenario.name])
+
+    def _comments(self) -> Tuple[List[str], List[Tuple]]:
+        rows = []
+        for table in sorted(self.catalog):
+            info = self.catalog[table]
+            for col in info["columns"]:
+                rows.append((table, col["name"], col.get("comment"), info.get("table_comment")))
+        return ["table_name", "column_name", "column_comment", "table_comment"], rows
+
+    def _plan(self, sql: str) -> List[Dict[str, Any]]:
+        scenario = scenario_for_sql(sql)
+        if scenario is not None:
+            tables = scenario.tables
+        else:
+            # SQL fuera de los escenarios (replay): un scan por tabla conocida que mencione
+            tables = [table for table in self.catalog if re.search(rf"\b{table}\b", sql, re.IGNORECASE)]
+        scans = [
+            {"Node Type": "Seq Scan", "Relation Name": table, "Total Cost": 120.0, "Plan Rows": 1000}
+            for table in tables
+        ]
+        return [{"Plan": {"Node Type": "Aggregate", "Total Cost": 250.0, "Plan Rows": 100, "Plans": scans}}]
+
+
+class FakeConnection:
+    """Conexión con el subconjunto de la API de psycopg2 que usa DBRouter"""
+
+    def __init__(self, database: FakePostgres):
+        self.database = database
+        self.prepared: Dict[str, str] = {}
+        self.closed = 0
+
+    def cursor(self) -> "FakeCursor":
+        return FakeCursor(self)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def cancel(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, connection: FakeConnection):
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self._rows: List[Tuple] = []
+
+    def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> None:
+        prepare = _PREPARE.match(sql)
+        if prepare:
+            self.connection.prepared[prepare.group(1)] = prepare.group(2)
+            self.connection.database.count("prepared")
+            self._set(None, [])
+            return
+
+        execute = _EXECUTE.match(sql)
+        if execute:
+            sql = self.connection.prepared[execute.group(1)]
+
+        columns, rows = self.connection.database.answer(sql)
+        self._set(columns, rows)
+
+    def _set(self, columns: Optional[List[str]], rows: List[Tuple]) -> None:
+        self.description = [(name,) for name in columns] if columns is not None else None
+        self.rowcount = len(rows) if columns is not None else 0
+        self._rows = rows
+
+    def fetchall(self) -> List[Tuple]:
+        if self.description is None:
+            raise psycopg2.ProgrammingError("no results to fetch")
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self) -> Optional[Tuple]:
+        if self.description is None:
+            raise psycopg2.ProgrammingError("no results to fetch")
+        return self._rows.pop(0) if self._rows else None
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,83 @@
+"""
+Proceso de la API para las herramientas de benchmarks (prueba de carga y replay).
+
+`spawn_api` lanza `benchmarks.loadtest.server` con el entorno dado; `wait_ready`
+espera a /health y `stop_api` lo detiene con SIGINT para que el lifespan vacíe
+el escritor de conversaciones y la cola de logs.
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+API_DIR = Path(__file__).resolve().parents[2]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Memoria residente del proceso (Linux /proc; psutil si está instalado)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import psutil
+
+        return round(psutil.Process(pid).memory_info().rss / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spawn_api(port: int, env: Dict[str, str], server_args: List[str]) -> subprocess.Popen:
+    """Lanza la API en `port` con el entorno actual más `env`"""
+    command = [sys.executable, "-m", "benchmarks.loadtest.server", "--port", str(port), *server_args]
+    return subprocess.Popen(command, cwd=API_DIR, env={**os.environ, **env})
+
+
+async def wait_ready(client: httpx.AsyncClient, process: subprocess.Popen, timeout_s: float) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"La API terminó al iniciar (código {process.returncode})")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"La API no respondió en {timeout_s:.0f} s")
+
+
+def stop_api(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        # SIGINT: uvicorn ejecuta el shutdown del lifespan (vacía el escritor de conversaciones)
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            process.kill()
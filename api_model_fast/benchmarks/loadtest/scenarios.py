@@ -0,0 +1,359 @@
+"""
+Escenarios de la prueba de carga: esquema, respuestas de Bedrock y datos.
+
+Cada escenario reúne lo que responden los dobles de Bedrock y de PostgreSQL para
+una familia de preguntas del CSV de entrenamiento: el JSON que devolvería el
+modelo (SQL, tipo de gráfico, campos) y las filas que devuelve la consulta. Las
+preguntas se asignan por palabras clave; el SQL usa solo tablas y columnas de
+`SCHEMA`, así que pasa la validación de seguridad, la de esquema y la guardia de
+costo como lo haría una respuesta real.
+
+Para usar un PostgreSQL real con el mismo esquema y datos generados:
+    python -m benchmarks.loadtest.scenarios --rows 5000 > loadtest.sql
+    psql -d loadtest -f loadtest.sql
+"""
+
+import argparse
+import datetime
+import random
+import re
+import sys
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# tabla -> [(columna, tipo)], claves foráneas y comentario
+SCHEMA: Dict[str, Dict[str, Any]] = {
+    "clientes": {
+        "columns": [
+            ("id", "integer"),
+            ("nombre", "character varying"),
+            ("email", "character varying"),
+            ("ciudad", "character varying"),
+            ("edad", "integer"),
+            ("fecha_alta", "date"),
+        ],
+        "foreign_keys": [],
+        "comment": "Clientes registrados",
+    },
+    "vendedores": {
+        "columns": [
+            ("id", "integer"),
+            ("nombre", "character varying"),
+            ("region", "character varying"),
+        ],
+        "foreign_keys": [],
+        "comment": "Vendedores y su región",
+    },
+    "productos": {
+        "columns": [
+            ("id", "integer"),
+            ("nombre", "character varying"),
+            ("categoria", "character varying"),
+            ("marca", "character varying"),
+            ("proveedor", "character varying"),
+            ("precio", "numeric"),
+            ("costo", "numeric"),
+            ("stock", "integer"),
+        ],
+        "foreign_keys": [],
+        "comment": "Catálogo de productos con precio, costo y stock",
+    },
+    "ventas": {
+        "columns": [
+            ("id", "integer"),
+            ("cliente_id", "integer"),
+            ("vendedor_id", "integer"),
+            ("fecha", "date"),
+            ("total", "numeric"),
+            ("metodo_pago", "character varying"),
+            ("estado", "character varying"),
+        ],
+        "foreign_keys": [("cliente_id", "clientes", "id"), ("vendedor_id", "vendedores", "id")],
+        "comment": "Ventas (comprobantes) con método de pago y estado",
+    },
+    "detalle_ventas": {
+        "columns": [
+            ("id", "integer"),
+            ("venta_id", "integer"),
+            ("producto_id", "integer"),
+            ("cantidad", "integer"),
+            ("precio_unitario", "numeric"),
+            ("descuento", "numeric"),
+        ],
+        "foreign_keys": [("venta_id", "ventas", "id"), ("producto_id", "productos", "id")],
+        "comment": "Productos vendidos en cada venta",
+    },
+}
+
+CATEGORIAS = ["Electrónica", "Hogar", "Deportes", "Juguetes", "Libros", "Moda", "Jardín", "Alimentos"]
+METODOS_PAGO = ["efectivo", "débito", "crédito", "transferencia", "billetera virtual"]
+CIUDADES = ["Córdoba", "Rosario", "Mendoza", "La Plata", "Salta", "Neuquén"]
+
+
+class Scenario:
+    """Respuesta del modelo y resultado de la consulta para una familia de preguntas"""
+
+    def __init__(
+        self,
+        name: str,
+        keywords: List[str],
+        sql: str,
+        chart_type: str,
+        chart_fields: Dict[str, Optional[str]],
+        tables: List[str],
+        columns: List[str],
+        row: Callable[[random.Random, int], Tuple],
+        title: str,
+    ):
+        self.name = name
+        self.keywords = keywords
+        self.sql = sql
+        self.chart_type = chart_type
+        self.chart_fields = chart_fields
+        self.tables = tables
+        self.columns = columns
+        self.row = row
+        self.title = title
+        # Alias que identifica el SQL del escenario aunque se sanitice o se prepare
+        self.marker = columns[-1]
+
+    def model_response(self) -> Dict[str, Any]:
+        """JSON que devuelve el doble de Bedrock"""
+        needs_chart = self.chart_type != "none"
+        return {
+            "sql_query": self.sql,
+            "needs_chart": needs_chart,
+            "chart_type": self.chart_type if needs_chart else "null",
+            "chart_fields": {
+                "x_axis": None,
+                "y_axis": None,
+                "category_field": None,
+                "color_field": None,
+                **self.chart_fields,
+            },
+            "confidence_score": 0.92,
+            "tables_used": self.tables,
+            "title": self.title,
+        }
+
+    def rows(self, count: int, seed: int = 0) -> List[Tuple]:
+        rng = random.Random(f"{seed}:{self.name}")
+        return [self.row(rng, index) for index in range(count)]
+
+
+def _money(rng: random.Random, low: float, high: float) -> Decimal:
+    return Decimal(f"{rng.uniform(low, high):.2f}")
+
+
+def _month(index: int) -> datetime.date:
+    return datetime.date(2020 + index // 12, index % 12 + 1, 1)
+
+
+def _label(values: List[str], index: int) -> str:
+    """Etiqueta distinta por fila aunque se pidan más filas que valores"""
+    label = values[index % len(values)]
+    return label if index < len(values) else f"{label} {index}"
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario(
+        name="ventas_mensuales",
+        keywords=["mensual", "mes", "evolución", "día", "hora", "año", "temporada", "tiempo", "línea", "lineal"],
+        sql=(
+            "SELECT date_trunc('month', v.fecha) AS mes, SUM(v.total) AS total_ventas "
+            "FROM ventas v GROUP BY 1 ORDER BY 1 LIMIT 120;"
+        ),
+        chart_type="line",
+        chart_fields={"x_axis": "mes", "y_axis": "total_ventas"},
+        tables=["ventas"],
+        columns=["mes", "total_ventas"],
+        row=lambda rng, i: (_month(i), _money(rng, 50_000, 250_000)),
+        title="Evolución mensual de ventas",
+    ),
+    Scenario(
+        name="metodos_pago",
+        keywords=["pago", "métodos", "comprobante", "participación", "mercado", "circular", "pastel", "torta"],
+        sql=(
+            "SELECT v.metodo_pago, COUNT(*) AS cantidad_ventas "
+            "FROM ventas v GROUP BY v.metodo_pago ORDER BY cantidad_ventas DESC;"
+        ),
+        chart_type="pie",
+        chart_fields={"x_axis": "metodo_pago", "y_axis": "cantidad_ventas"},
+        tables=["ventas"],
+        columns=["metodo_pago", "cantidad_ventas"],
+        row=lambda rng, i: (_label(METODOS_PAGO, i), rng.randint(10, 5000)),
+        title="Ventas por método de pago",
+    ),
+    Scenario(
+        name="distribucion_precios",
+        keywords=["distribución", "frecuencia", "histograma", "edad", "precio", "precios"],
+        sql="SELECT p.precio AS precio_producto FROM productos p WHERE p.precio > 0 LIMIT 1000;",
+        chart_type="histogram",
+        chart_fields={"x_axis": "precio_producto"},
+        tables=["productos"],
+        columns=["precio_producto"],
+        row=lambda rng, i: (_money(rng, 100, 90_000),),
+        title="Distribución de precios",
+    ),
+    Scenario(
+        name="precio_vs_costo",
+        keywords=["correlación", "dispersión", "margen", "descuentos", "relación"],
+        sql="SELECT p.precio, p.costo AS costo_producto FROM productos p LIMIT 500;",
+        chart_type="scatter",
+        chart_fields={"x_axis": "precio", "y_axis": "costo_producto"},
+        tables=["productos"],
+        columns=["precio", "costo_producto"],
+        row=lambda rng, i: (_money(rng, 100, 90_000), _money(rng, 50, 60_000)),
+        title="Precio contra costo",
+    ),
+    Scenario(
+        name="unidades_por_categoria",
+        keywords=["categoría", "stock", "inventario", "marca", "proveedor", "productos", "vendidos", "barras"],
+        sql=(
+            "SELECT p.categoria, SUM(dv.cantidad) AS unidades_vendidas "
+            "FROM productos p JOIN detalle_ventas dv ON dv.producto_id = p.id "
+            "GROUP BY p.categoria ORDER BY unidades_vendidas DESC LIMIT 10;"
+        ),
+        chart_type="bar",
+        chart_fields={"x_axis": "categoria", "y_axis": "unidades_vendidas"},
+        tables=["productos", "detalle_ventas"],
+        columns=["categoria", "unidades_vendidas"],
+        row=lambda rng, i: (_label(CATEGORIAS, i), rng.randint(10, 20_000)),
+        title="Unidades vendidas por categoría",
+    ),
+    Scenario(
+        name="ventas_por_vendedor",
+        keywords=["vendedor", "vendedores", "clientes", "transacciones", "estado", "compras", "ventas"],
+        sql=(
+            "SELECT ve.nombre AS vendedor, SUM(v.total) AS total_vendido "
+            "FROM ventas v JOIN vendedores ve ON ve.id = v.vendedor_id "
+            "GROUP BY ve.nombre ORDER BY total_vendido DESC LIMIT 10;"
+        ),
+        chart_type="bar",
+        chart_fields={"x_axis": "vendedor", "y_axis": "total_vendido"},
+        tables=["ventas", "vendedores"],
+        columns=["vendedor", "total_vendido"],
+        row=lambda rng, i: (f"Vendedor {i + 1}", _money(rng, 10_000, 900_000)),
+        title="Ventas por vendedor",
+    ),
+]
+
+# Sin palabra clave reconocida: consulta sin gráfico
+DEFAULT_SCENARIO = Scenario(
+    name="listado_clientes",
+    keywords=[],
+    sql=(
+        "SELECT c.nombre, c.email AS email_cliente FROM clientes c "
+        "WHERE c.ciudad = 'Córdoba' ORDER BY c.nombre LIMIT 50;"
+    ),
+    chart_type="none",
+    chart_fields={},
+    tables=["clientes"],
+    columns=["nombre", "email_cliente"],
+    row=lambda rng, i: (f"Cliente {i + 1}", f"cliente{i + 1}@example.com"),
+    title="Clientes de Córdoba",
+)
+
+ALL_SCENARIOS = SCENARIOS + [DEFAULT_SCENARIO]
+
+_WORD = re.compile(r"\w+")
+
+
+def scenario_for_question(question: str) -> Scenario:
+    """Escenario de la primera familia con alguna palabra clave en la pregunta"""
+    words = set(_WORD.findall(question.lower()))
+    for scenario in SCENARIOS:
+        if words.intersection(scenario.keywords):
+            return scenario
+    return DEFAULT_SCENARIO
+
+
+def scenario_for_sql(sql: str) -> Optional[Scenario]:
+    """Escenario cuyo SQL es `sql` (también sanitizado o como sentencia preparada)"""
+    lowered = sql.lower()
+    for scenario in ALL_SCENARIOS:
+        if re.search(rf"\b{scenario.marker}\b", lowered):
+            return scenario
+    return None
+
+
+# ----------------------------------------------------------------------
+# Script SQL para un PostgreSQL real
+# ----------------------------------------------------------------------
+
+_PG_TYPES = {"integer": "integer", "character varying": "varchar(120)", "numeric": "numeric(12,2)", "date": "date"}
+
+
+def _generated_value(rng: random.Random, table: str, column: str, kind: str, index: int, rows: int):
+    if column == "id":
+        return index + 1
+    if column.endswith("_id"):
+        return rng.randint(1, rows)
+    if column == "categoria":
+        return rng.choice(CATEGORIAS)
+    if column == "metodo_pago":
+        return rng.choice(METODOS_PAGO)
+    if column == "ciudad":
+        return rng.choice(CIUDADES)
+    if kind == "numeric":
+        return _money(rng, 1, 90_000)
+    if kind == "integer":
+        return rng.randint(1, 500)
+    if kind == "date":
+        return datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randint(0, 5 * 365))
+    return f"{column} {index + 1}"
+
+
+def _literal(value: Any) -> str:
+    if isinstance(value, (int, Decimal)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def schema_sql(rows: int, seed: int = 0) -> str:
+    """DDL con comentarios y claves foráneas, más `rows` filas generadas por tabla"""
+    rng = random.Random(seed)
+    lines = []
+    # Las tablas referenciadas van primero
+    order = ["clientes", "vendedores", "productos", "ventas", "detalle_ventas"]
+    for table in order:
+        spec = SCHEMA[table]
+        columns = [
+            f"    {name} {'integer PRIMARY KEY' if name == 'id' else _PG_TYPES[kind]}"
+            for name, kind in spec["columns"]
+        ]
+        columns += [
+            f"    FOREIGN KEY ({column}) REFERENCES {ref_table} ({ref_column})"
+            for column, ref_table, ref_column in spec["foreign_keys"]
+        ]
+        lines.append(f"CREATE TABLE {table} (\n" + ",\n".join(columns) + "\n);")
+        lines.append(f"COMMENT ON TABLE {table} IS {_literal(spec['comment'])};")
+
+    for table in order:
+        spec = SCHEMA[table]
+        names = ", ".join(name for name, _ in spec["columns"])
+        for start in range(0, rows, 1000):
+            values = [
+                "(" + ", ".join(
+                    _literal(_generated_value(rng, table, name, kind, index, rows))
+                    for name, kind in spec["columns"]
+                ) + ")"
+                for index in range(start, min(start + 1000, rows))
+            ]
+            lines.append(f"INSERT INTO {table} ({names}) VALUES\n" + ",\n".join(values) + ";")
+
+    lines.append("ANALYZE;")
+    return "\n".join(lines) + "\n"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="Filas generadas por tabla")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    sys.stdout.write(schema_sql(args.rows, args.seed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
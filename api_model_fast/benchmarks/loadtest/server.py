@@ -0,0 +1,48 @@
+"""
+Arranca la API para la prueba de carga (lo lanza `python -m benchmarks.loadtest`).
+
+Con --fake-db la base se reemplaza por el driver falso antes de importar la
+aplicación (el esquema se lee al crear los servicios); sin él se usa la base de
+DB_HOST/DB_NODES. --schema carga en el driver falso un esquema grabado (JSON con
+el formato de `SchemaSelector.schema_info`, lo usa `benchmarks/replay.py`). Bedrock y el servicio de conversaciones se configuran por
+entorno (BEDROCK_ENDPOINT_URL, CONVERSATIONS_URL).
+"""
+
+import argparse
+import json
+import sys
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fake-db", action="store_true", help="Usar el driver falso de PostgreSQL")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=50, help="Filas por consulta (driver falso)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--schema", help="Esquema grabado para el driver falso (JSON)")
+    args = parser.parse_args()
+
+    if args.fake_db:
+        from app.services.database_service import db_service
+        from app.services.db_router import DBRouter
+        from benchmarks.loadtest.fake_postgres import FakePostgres
+
+        schema = None
+        if args.schema:
+            with open(args.schema, encoding="utf-8") as schema_file:
+                schema = json.load(schema_file)
+        fake = FakePostgres(rows=args.rows, latency_ms=args.db_latency_ms, seed=args.seed, schema=schema)
+        db_service.router = DBRouter.from_config(connect_fn=fake.connect)
+
+    import uvicorn
+
+    from main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Servidores HTTP locales que reemplazan a Bedrock y al servicio de conversaciones.
+
+`StubBedrock` implementa InvokeModel e InvokeModelWithResponseStream (codificación
+application/vnd.amazon.eventstream) con latencia configurable: espera
+`latency_ms` antes del primer byte y `chunk_ms` entre fragmentos del stream. La
+respuesta es el JSON del escenario que corresponde a la pregunta del prompt, con
+un bloque `usage` aproximado. El cliente de la API se apunta aquí con
+BEDROCK_ENDPOINT_URL (la firma SigV4 se ignora).
+
+`StubConversations` acepta `POST .../multiple-messages` y `PATCH .../{id}` y
+cuenta lo recibido. Ambos corren en hilos del proceso de la prueba, fuera del
+proceso de la API.
+"""
+
+import base64
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from benchmarks.loadtest.scenarios import scenario_for_question
+
+# La pregunta va al final del prompt enriquecido, entre comillas
+_QUESTION = re.compile(r'# CONSULTA DEL USUARIO\s*"(.*)"\s*$', re.DOTALL)
+
+
+def encode_event(payload: bytes, headers: Dict[str, str]) -> bytes:
+    """Un mensaje de event stream de AWS (preludio, headers string, payload y CRC32)"""
+    encoded_headers = b""
+    for name, value in headers.items():
+        name_bytes, value_bytes = name.encode(), value.encode()
+        encoded_headers += (
+            bytes([len(name_bytes)]) + name_bytes + b"\x07" + struct.pack(">H", len(value_bytes)) + value_bytes
+        )
+    total_length = 12 + len(encoded_headers) + len(payload) + 4
+    prelude = struct.pack(">II", total_length, len(encoded_headers))
+    message = prelude + struct.pack(">I", zlib.crc32(prelude)) + encoded_headers + payload
+    return message + struct.pack(">I", zlib.crc32(message))
+
+
+def encode_chunk(body: Dict) -> bytes:
+    """Evento `chunk` de InvokeModelWithResponseStream con un evento de Anthropic"""
+    payload = json.dumps({"bytes": base64.b64encode(json.dumps(body).encode()).decode()}).encode()
+    return encode_event(
+        payload,
+        {":event-type": "chunk", ":content-type": "application/json", ":message-type": "event"},
+    )
+
+
+class _StubServer:
+    """Servidor HTTP en un hilo propio; `port=0` elige un puerto libre"""
+
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (self.handler_class,), {"stub": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {}
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + amount
+
+    def start(self) -> "_StubServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send_json(self, status: int, body) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class _BedrockHandler(_Handler):
+    def do_POST(self):
+        request = json.loads(self._read_body() or b"{}")
+        prompt = request.get("messages", [{}])[0].get("content", "")
+        match = _QUESTION.search(prompt)
+        scenario = scenario_for_question(match.group(1) if match else "")
+        text = json.dumps(scenario.model_response(), ensure_ascii=False)
+        usage = {"input_tokens": max(len(prompt) // 4, 1), "output_tokens": max(len(text) // 4, 1)}
+
+        self.stub.count("requests")
+        self.stub.count(f"scenario:{scenario.name}")
+        time.sleep(self.stub.delay())
+
+        if self.path.endswith("/invoke-with-response-stream"):
+            self._stream(text, usage)
+        else:
+            self._send_json(
+                200,
+                {
+                    "id": "msg_loadtest",
+                    "type": "message",
+                    "role": "assistant",
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": "end_turn",
+                    "usage": usage,
+                },
+            )
+
+    def _stream(self, text: str, usage: Dict[str, int]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        events = [
+            {"type": "message_start", "message": {"usage": {"input_tokens": usage["input_tokens"], "output_tokens": 1}}},
+            {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}},
+        ]
+        size = self.stub.chunk_chars
+        events += [
+            {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text[i:i + size]}}
+            for i in range(0, len(text), size)
+        ]
+        events += [
+            {"type": "content_block_stop", "index": 0},
+            {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": usage["output_tokens"]}},
+            {"type": "message_stop"},
+        ]
+
+        for event in events:
+            data = encode_chunk(event)
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            if event["type"] == "content_block_delta" and self.stub.chunk_s:
+                time.sleep(self.stub.chunk_s)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class StubBedrock(_StubServer):
+    handler_class = _BedrockHandler
+
+    def __init__(self, latency_ms: float = 800, jitter_ms: float = 200, chunk_ms: float = 10,
+                 chunk_chars: int = 24, seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_s = latency_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.chunk_s = chunk_ms / 1000
+        self.chunk_chars = chunk_chars
+        self._random = random.Random(seed)
+
+    def delay(self) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_s, self.jitter_s)
+        return max(self.latency_s + jitter, 0.0)
+
+
+class _ConversationsHandler(_Handler):
+    def do_POST(self):
+        body = json.loads(self._read_body() or b"{}")
+        time.sleep(self.stub.latency_s)
+        self.stub.count("batches")
+        self.stub.count("messages", len(body.get("messages", [])))
+        self._send_json(201, {"_id": body.get("_id")})
+
+    def do_PATCH(self):
+        self._read_body()
+        time.sleep(self.stub.latency_s)
+        self.stub.count("title_updates")
+        self._send_json(200, {"_id": self.path.rsplit("/", 1)[-1]})
+
+
+class StubConversations(_StubServer):
+    handler_class = _ConversationsHandler
+
+    def __init__(self, latency_ms: float = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_s = latency_ms / 1000
+
@@ -0,0 +1,394 @@
+"""
+Replay de tráfico real contra el pipeline para detectar regresiones antes de un deploy.
+
+Lee los logs JSON rotados de RAG (`rag_*.log*`, escritos con ENABLE_JSON_LOGGING=true)
+y vuelve a pasar las preguntas grabadas por POST /rag/nl-to-sql. Bedrock responde
+desde el cassette grabado en producción (BEDROCK_CASSETTE_MODE=record) y PostgreSQL
+es el driver falso de la prueba de carga, cargado con el esquema del cassette, o
+una base local (--real-db). Por cada pregunta compara contra la corrida grabada:
+
+- estado (éxito/error),
+- tablas elegidas por el selector de esquema (igualdad y recall),
+- SQL normalizado (con el cassette es el mismo texto salvo que cambie el parseo
+  o la sanitización),
+- latencia por etapa (p50/p95). Con la base falsa solo son comparables las etapas
+  locales previas a la base; bedrock solo cuenta con --delay.
+
+Termina con código 1 si la tasa de diferencias o la regresión de latencia superan
+los umbrales.
+
+Uso (desde api_model_fast/):
+    python -m benchmarks.replay --logs data/logs --cassette data/bedrock_cassette.jsonl
+        [--limit 500] [--unique] [--real-db] [--delay]
+        [--max-mismatch-rate 0.02] [--max-latency-regression-pct 25]
+        [--output replay.json] [--json]
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from app.services.bedrock_cassette import BedrockCassette, cassette_key
+from benchmarks.loadtest.process import (
+    API_DIR,
+    free_port,
+    git_commit,
+    spawn_api,
+    stop_api,
+    wait_ready,
+)
+from benchmarks.loadtest.stubs import StubConversations
+
+ENDPOINT = "/rag/nl-to-sql"
+REQUEST_PREFIX = "replay-"
+
+# Etapas que no dependen de Bedrock ni de la base: comparables con cualquier doble
+LOCAL_STAGES = ("schema_retrieval", "chart_detection", "prompt_build", "sql_validation")
+# Etapas que dependen de la base (y de los datos): solo con --real-db
+DB_STAGES = ("cost_check", "db_execution", "dataframe_build", "chart_render")
+
+
+# ----------------------------------------------------------------------
+# Logs
+# ----------------------------------------------------------------------
+
+
+def log_files(paths: Iterable[Path]) -> List[Path]:
+    """Archivos `rag_*.log*` (incluidas rotaciones) de las rutas dadas"""
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(Path(name) for name in glob.glob(str(path / "rag_*.log*")))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+
+def read_queries(files: Iterable[Path]) -> List[Dict[str, Any]]:
+    """Registros de consultas RAG (éxito o error) con su pregunta, en orden temporal"""
+    records = []
+    for path in files:
+        with open(path, encoding="utf-8", errors="replace") as log_file:
+            for line in log_file:
+                if not line.startswith("{"):
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if str(record.get("logger", "")).startswith("rag") and record.get("pregunta"):
+                    records.append(record)
+    records.sort(key=lambda record: record.get("timestamp", ""))
+    return records
+
+
+def normalize_sql(sql: Optional[str]) -> str:
+    """SQL sin espacios redundantes, `;` final ni diferencias de mayúsculas"""
+    return re.sub(r"\s+", " ", sql or "").strip().rstrip(";").strip().lower()
+
+
+def is_success(record: Dict[str, Any]) -> bool:
+    return record.get("level") not in ("ERROR", "CRITICAL")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Percentil por rango más cercano"""
+    ordered = sorted(values)
+    index = min(max(int(round(q * len(ordered) + 0.5)) - 1, 0), len(ordered) - 1)
+    return round(ordered[index], 2)
+
+
+# ----------------------------------------------------------------------
+# Replay
+# ----------------------------------------------------------------------
+
+
+def select_queries(records: List[Dict[str, Any]], cassette: BedrockCassette, args) -> Dict[str, Any]:
+    """Preguntas a reproducir (con respuesta en el cassette) y las que se descartan"""
+    selected, missing, seen = [], 0, set()
+    for record in records:
+        key = cassette_key(record["pregunta"])
+        if args.unique and key in seen:
+            continue
+        if cassette.lookup(record["pregunta"]) is None:
+            missing += 1
+            continue
+        seen.add(key)
+        selected.append(record)
+        if args.limit and len(selected) >= args.limit:
+            break
+    return {"selected": selected, "missing_in_cassette": missing}
+
+
+def latest_schema(cassette: BedrockCassette, records: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Esquema grabado de la respuesta más reciente entre las preguntas elegidas"""
+    schemas = cassette.schemas()
+    for record in reversed(records):
+        entry = cassette.lookup(record["pregunta"])
+        if entry and entry.get("schema_version") in schemas:
+            return schemas[entry["schema_version"]]
+    return next(reversed(schemas.values()), None) if schemas else None
+
+
+def start_api(args, port: int, conversations: StubConversations, workdir: str, schema_path: Optional[str]):
+    env = {
+        "BEDROCK_CASSETTE_PATH": str(args.cassette.resolve()),
+        "BEDROCK_CASSETTE_MODE": "replay",
+        "BEDROCK_CASSETTE_DELAY": "true" if args.delay else "false",
+        "BEDROCK_STREAMING": "false",
+        "CONVERSATIONS_URL": conversations.url,
+        "AWS_ACCESS_KEY_ID": os.environ.get("AWS_ACCESS_KEY_ID", "replay"),
+        "AWS_SECRET_ACCESS_KEY": os.environ.get("AWS_SECRET_ACCESS_KEY", "replay"),
+        # Los logs de la corrida se escriben igual que en producción para compararlos
+        "LOG_LEVEL": "WARNING",
+        "ENABLE_FILE_LOGGING": "true",
+        "ENABLE_JSON_LOGGING": "true",
+        "LOG_DIR": os.path.join(workdir, "logs"),
+        "LOG_SAMPLE_RATE": "1.0",
+        "TRACE_LOG": "false",
+        "ARTIFACT_DIR": os.path.join(workdir, "artifacts"),
+        "CONVERSATION_SPOOL_PATH": os.path.join(workdir, "conversation_spool.jsonl"),
+        "ANALYTICS_SNAPSHOT_INTERVAL_S": "0",
+    }
+    server_args = ["--db-latency-ms", "0"]
+    if not args.real_db:
+        server_args.append("--fake-db")
+        if schema_path:
+            server_args += ["--schema", schema_path]
+    return spawn_api(port, env, server_args)
+
+
+async def drive(args, queries: List[Dict[str, Any]], workdir: str, schema_path: Optional[str]) -> Dict[str, int]:
+    """Envía las preguntas en orden (una a la vez) y devuelve el status HTTP por request_id"""
+    conversations = StubConversations(latency_ms=0).start()
+    port = args.port or free_port()
+    process = start_api(args, port, conversations, workdir, schema_path)
+    statuses: Dict[str, int] = {}
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout) as client:
+            await wait_ready(client, process, args.startup_timeout)
+            for index, record in enumerate(queries):
+                request_id = f"{REQUEST_PREFIX}{index}"
+                try:
+                    response = await client.post(
+                        ENDPOINT,
+                        json={"pregunta": record["pregunta"]},
+                        headers={"X-Request-ID": request_id},
+                    )
+                    statuses[request_id] = response.status_code
+                except httpx.HTTPError:
+                    statuses[request_id] = 0
+    finally:
+        # SIGINT: el lifespan vacía la cola de logs antes de salir
+        stop_api(process)
+        conversations.stop()
+    return statuses
+
+
+# ----------------------------------------------------------------------
+# Comparación
+# ----------------------------------------------------------------------
+
+
+def compare_query(recorded: Dict[str, Any], replayed: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Diferencias de una pregunta entre la corrida grabada y el replay"""
+    if replayed is None:
+        return {"pregunta": recorded["pregunta"], "missing_log": True, "mismatch": True}
+
+    row: Dict[str, Any] = {"pregunta": recorded["pregunta"], "request_id": replayed.get("request_id")}
+    row["status_changed"] = is_success(recorded) != is_success(replayed)
+
+    before, after = recorded.get("schema_tables"), replayed.get("schema_tables")
+    if before is not None and after is not None:
+        row["tables_changed"] = list(before) != list(after)
+        row["tables_recall"] = round(len(set(before) & set(after)) / len(before), 3) if before else 1.0
+        if row["tables_changed"]:
+            row["tables"] = {"recorded": before, "replayed": after}
+
+    if is_success(recorded) and is_success(replayed):
+        row["sql_changed"] = normalize_sql(recorded.get("sql_query")) != normalize_sql(replayed.get("sql_query"))
+        if row["sql_changed"]:
+            row["sql"] = {"recorded": recorded.get("sql_query"), "replayed": replayed.get("sql_query")}
+
+    row["mismatch"] = any(row.get(key) for key in ("status_changed", "tables_changed", "sql_changed"))
+    return row
+
+
+def compare_stages(pairs: List[tuple], stages: Iterable[str]) -> Dict[str, Dict[str, Optional[float]]]:
+    """p50/p95 por etapa en ambas corridas y variación (%)"""
+    report = {}
+    for stage in stages:
+        before = [r["stages"][stage] for r, _ in pairs if stage in (r.get("stages") or {})]
+        after = [p["stages"][stage] for _, p in pairs if p and stage in (p.get("stages") or {})]
+        if not before or not after:
+            continue
+        row: Dict[str, Optional[float]] = {"samples": min(len(before), len(after))}
+        for q, name in ((0.50, "p50"), (0.95, "p95")):
+            then, now = _percentile(before, q), _percentile(after, q)
+            row[f"recorded_{name}"] = then
+            row[f"replayed_{name}"] = now
+            row[f"delta_{name}_pct"] = round((now - then) / then * 100, 1) if then else None
+        report[stage] = row
+    return report
+
+
+def build_report(args, selection, statuses, replay_records, duration_s) -> Dict[str, Any]:
+    queries = selection["selected"]
+    by_request = {record.get("request_id"): record for record in replay_records}
+    pairs = [(record, by_request.get(f"{REQUEST_PREFIX}{index}")) for index, record in enumerate(queries)]
+    rows = [compare_query(recorded, replayed) for recorded, replayed in pairs]
+
+    stages = list(LOCAL_STAGES)
+    if args.real_db:
+        stages += DB_STAGES
+    if args.delay:
+        stages.append("bedrock")
+    stage_report = compare_stages(pairs, stages)
+
+    mismatches = [row for row in rows if row["mismatch"]]
+    recalls = [row["tables_recall"] for row in rows if "tables_recall" in row]
+    mismatch_rate = len(mismatches) / len(rows) if rows else 0.0
+    regressions = {
+        stage: values["delta_p95_pct"]
+        for stage, values in stage_report.items()
+        if values["delta_p95_pct"] is not None and values["delta_p95_pct"] > args.max_latency_regression_pct
+    }
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": git_commit(),
+            "database": "real" if args.real_db else "fake",
+            "bedrock_delay": args.delay,
+            "cassette": str(args.cassette),
+            "duration_s": round(duration_s, 2),
+        },
+        "queries": len(rows),
+        "missing_in_cassette": selection["missing_in_cassette"],
+        "http_status": {str(code): list(statuses.values()).count(code) for code in sorted(set(statuses.values()))},
+        "missing_logs": sum(1 for row in rows if row.get("missing_log")),
+        "status_changed": sum(1 for row in rows if row.get("status_changed")),
+        "tables_changed": sum(1 for row in rows if row.get("tables_changed")),
+        "tables_recall_mean": round(sum(recalls) / len(recalls), 3) if recalls else None,
+        "sql_changed": sum(1 for row in rows if row.get("sql_changed")),
+        "mismatch_rate": round(mismatch_rate, 4),
+        "stages_ms": stage_report,
+        "latency_regressions": regressions,
+        "passed": mismatch_rate <= args.max_mismatch_rate and not regressions,
+        "mismatches": mismatches[: args.max_examples],
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    records = read_queries(log_files(args.logs))
+    cassette = BedrockCassette(str(args.cassette), "replay", False)
+    selection = select_queries(records, cassette, args)
+    if not selection["selected"]:
+        raise SystemExit(
+            f"Sin preguntas para reproducir: {len(records)} en los logs, "
+            f"{selection['missing_in_cassette']} sin respuesta en el cassette"
+        )
+
+    with tempfile.TemporaryDirectory(prefix="replay-") as workdir:
+        schema_path = None
+        schema = latest_schema(cassette, selection["selected"])
+        if schema is not None:
+            schema_path = os.path.join(workdir, "schema.json")
+            with open(schema_path, "w", encoding="utf-8") as schema_file:
+                json.dump(schema, schema_file, ensure_ascii=False)
+
+        started = time.perf_counter()
+        statuses = await drive(args, selection["selected"], workdir, schema_path)
+        duration_s = time.perf_counter() - started
+
+        replay_records = [
+            record
+            for record in read_queries(log_files([Path(workdir) / "logs"]))
+            if str(record.get("request_id", "")).startswith(REQUEST_PREFIX)
+        ]
+
+    return build_report(args, selection, statuses, replay_records, duration_s)
+
+
+# ----------------------------------------------------------------------
+# Salida
+# ----------------------------------------------------------------------
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    meta = report["meta"]
+    print(
+        f"Commit {meta['git_commit']} · DB {meta['database']} · {report['queries']} preguntas "
+        f"({report['missing_in_cassette']} sin cassette) · {meta['duration_s']} s"
+    )
+    print(
+        f"Estado cambiado {report['status_changed']} · tablas cambiadas {report['tables_changed']} "
+        f"(recall medio {report['tables_recall_mean']}) · SQL cambiado {report['sql_changed']} · "
+        f"sin log {report['missing_logs']} · tasa de diferencias {report['mismatch_rate']:.2%}"
+    )
+    if report["stages_ms"]:
+        print(f"\n{'etapa':<18} {'p50 antes':>10} {'p50 ahora':>10} {'Δp50 %':>8} {'p95 antes':>10} {'p95 ahora':>10} {'Δp95 %':>8}")
+        for stage, values in report["stages_ms"].items():
+            print(
+                f"{stage:<18} {values['recorded_p50']:>10} {values['replayed_p50']:>10} "
+                f"{str(values['delta_p50_pct']):>8} {values['recorded_p95']:>10} "
+                f"{values['replayed_p95']:>10} {str(values['delta_p95_pct']):>8}"
+            )
+    for row in report["mismatches"]:
+        print(f"\n≠ {row['pregunta'][:100]}")
+        if row.get("missing_log"):
+            print("  sin log de la corrida de replay")
+        if row.get("status_changed"):
+            print("  cambió el estado (éxito/error)")
+        if "tables" in row:
+            print(f"  tablas: {row['tables']['recorded']} → {row['tables']['replayed']}")
+        if "sql" in row:
+            print(f"  SQL antes: {row['sql']['recorded']}\n  SQL ahora: {row['sql']['replayed']}")
+    if report["latency_regressions"]:
+        print(f"\nRegresiones de latencia p95 (%): {report['latency_regressions']}")
+    print("\n✅ Sin regresiones" if report["passed"] else "\n❌ Regresión detectada")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=Path, nargs="+", default=[API_DIR / "data" / "logs"],
+                        help="Archivos o directorios con logs rag_*.log*")
+    parser.add_argument("--cassette", type=Path, required=True, help="Cassette JSONL de Bedrock")
+    parser.add_argument("--limit", type=int, default=0, help="Máximo de preguntas (0 = todas)")
+    parser.add_argument("--unique", action="store_true", help="Reproducir cada pregunta una sola vez")
+    parser.add_argument("--real-db", action="store_true", help="Usar la base de DB_HOST/DB_NODES")
+    parser.add_argument("--delay", action="store_true", help="Respetar la duración grabada de Bedrock")
+    parser.add_argument("--max-mismatch-rate", type=float, default=0.0)
+    parser.add_argument("--max-latency-regression-pct", type=float, default=25.0)
+    parser.add_argument("--max-examples", type=int, default=20, help="Diferencias a detallar")
+    parser.add_argument("--port", type=int, default=0, help="Puerto de la API (0 = libre)")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--output", type=Path, help="Guardar el reporte JSON")
+    parser.add_argument("--json", action="store_true", help="Imprimir el reporte como JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
+
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
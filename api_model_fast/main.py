@@ -1,12 +1,18 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from app.routes.rag_api import rag_router
 from app.routes.health import health_router
+from app.routes.metrics import metrics_router
+from app.routes.admin import admin_router
 from app.utils.logging_config import setup_logging_from_env
 from app.middleware.rate_limiter import setup_rate_limiting
+from app.middleware.metrics import setup_metrics
+from app.middleware.tracing import setup_tracing
+from app.middleware.profiling import setup_profiling
 
 # Obtiene el logger raíz configurado por setup_logging_from_env()
 logger = logging.getLogger(__name__)
@@ -18,6 +24,15 @@ async def lifespan(app: FastAPI):
     # --- STARTUP ---
     from app.routes.rag_api import get_rag_service
 
+    from app.services.conversation_service import conversation_writer
+    from app.services.database_service import db_service
+    from app.services.query_analytics import query_analytics
+    from app.utils.profiler import profiler
+
+    profiler.install(asyncio.get_running_loop())  # Atribución del profiler por petición
+    db_service.router.start_health_checks()  # Salud y retraso de réplicas
+    await conversation_writer.start()  # Persistencia de conversaciones en segundo plano
+    await query_analytics.start_snapshots()
     get_rag_service()  # Inicializa el singleton
     logger.info("✅ RAG Service inicializado en startup")
 
@@ -25,6 +40,9 @@ async def lifespan(app: FastAPI):
 
     # --- SHUTDOWN ---
     logger.info("🛑 Apagando aplicación...")
+    await query_analytics.stop_snapshots()
+    await conversation_writer.stop()
+    db_service.router.stop()
 
 
 def create_application() -> FastAPI:
@@ -45,14 +63,26 @@ def create_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],  # Permite todos los métodos
         allow_headers=["*"],  # Permite todos los headers
+        expose_headers=["X-Request-ID", "Server-Timing"],
     )
 
     # Configurar rate limiting
     setup_rate_limiting(app)
 
+    # Peticiones en curso y latencia por ruta (/metrics)
+    setup_metrics(app)
+
+    # Profiler bajo demanda (POST /admin/profile): latencia por petición para sus filtros
+    setup_profiling(app)
+
+    # X-Request-ID y Server-Timing (el último middleware agregado es el más externo)
+    setup_tracing(app)
+
     # Incluir routers
     app.include_router(rag_router)
     app.include_router(health_router)
+    app.include_router(metrics_router)
+    app.include_router(admin_router)
 
     return app
 
@@ -0,0 +1,42 @@
+"""Endpoints /admin: token obligatorio y consultas recientes fuera de /rag"""
+
+import pytest
+
+# app.routes importa todas las rutas, incluida la de RAG (torch/transformers)
+pytest.importorskip("torch")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config.config import Config
+from app.config.security import ADMIN_TOKEN_HEADER
+from app.routes.admin import admin_router
+from app.services.query_analytics import query_analytics
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "secreto")
+    app = FastAPI()
+    app.include_router(admin_router)
+    return TestClient(app)
+
+
+def test_recent_queries_require_token(client):
+    assert client.get("/admin/analytics/recent").status_code == 401
+    assert client.get("/admin/analytics/recent", headers={ADMIN_TOKEN_HEADER: "otro"}).status_code == 401
+
+
+def test_admin_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(Config, "ADMIN_TOKEN", "")
+    response = client.get("/admin/analytics/recent", headers={ADMIN_TOKEN_HEADER: "secreto"})
+    assert response.status_code == 404
+
+
+def test_recent_queries_with_token(client):
+    query_analytics.record("¿ventas de marzo?", "SELECT 1", 0.9, ["ventas"], False, "bar")
+    response = client.get("/admin/analytics/recent?limit=1", headers={ADMIN_TOKEN_HEADER: "secreto"})
+
+    assert response.status_code == 200
+    [entry] = response.json()["recent"]
+    assert entry["pregunta"] == "¿ventas de marzo?"
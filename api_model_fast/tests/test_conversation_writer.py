@@ -0,0 +1,150 @@
+"""Escritor de conversaciones: reintentos, spool y rechazos contra un servicio falso"""
+
+import asyncio
+import json
+import re
+
+import httpx
+import pytest
+
+from app.config.config import Config
+from app.services.conversation_service import (
+    CONVERSATION_ID_PATTERN,
+    ConversationWriter,
+    build_messages,
+    new_conversation_id,
+)
+
+CONVERSATION_ID = "65f0c0ffee0000000000abcd"
+
+
+class FakeService:
+    """Servicio de conversaciones en memoria; `fail` fija respuestas por método"""
+
+    def __init__(self):
+        self.calls = []
+        self.messages = {}
+        self.titles = {}
+        self.fail = {"POST": [], "PATCH": []}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request.method)
+        if self.fail[request.method]:
+            return httpx.Response(self.fail[request.method].pop(0))
+        body = json.loads(request.content)
+        if request.method == "POST":
+            self.messages.setdefault(body["_id"], []).extend(body["messages"])
+        else:
+            self.titles[request.url.path.rsplit("/", 1)[1]] = body["title"]
+        return httpx.Response(200, json={})
+
+
+def _item(conversation_id=CONVERSATION_ID, title="Ventas por mes"):
+    response = {"pregunta": "¿ventas?", "sql_generado": "SELECT 1", "resultados": {"data": []}}
+    return {
+        "_id": conversation_id,
+        "messages": build_messages(response),
+        "title": title,
+        "request_id": "req-1",
+    }
+
+
+@pytest.fixture
+def service():
+    return FakeService()
+
+
+@pytest.fixture
+def writer(service, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CONVERSATION_ARTIFACTS", False)
+    writer = ConversationWriter(
+        base_url="http://conversations",
+        max_retries=2,
+        backoff_s=0,
+        spool_path=str(tmp_path / "spool.jsonl"),
+    )
+    writer._client = httpx.AsyncClient(transport=httpx.MockTransport(service.handler))
+    return writer
+
+
+def _spooled(path):
+    try:
+        with open(path) as spool:
+            return [json.loads(line) for line in spool]
+    except FileNotFoundError:
+        return []
+
+
+def test_title_retry_does_not_resend_messages(writer, service):
+    service.fail["PATCH"] = [503]
+    assert asyncio.run(writer._flush([_item()]))
+
+    assert service.calls == ["POST", "PATCH", "PATCH"]
+    assert len(service.messages[CONVERSATION_ID]) == 2
+    assert service.titles[CONVERSATION_ID] == "Ventas por mes"
+    assert _spooled(writer.spool_path) == []
+
+
+def test_failing_title_spools_only_the_title(writer, service):
+    service.fail["PATCH"] = [503, 503, 503]
+    assert not asyncio.run(writer._flush([_item()]))
+
+    spooled = _spooled(writer.spool_path)
+    assert [(group["_id"], group["messages"], group["title"]) for group in spooled] == [
+        (CONVERSATION_ID, [], "Ventas por mes")
+    ]
+
+    # Al reenviar el spool solo se fija el título: los mensajes no se duplican
+    service.calls.clear()
+    asyncio.run(writer._replay_spool())
+    assert service.calls == ["PATCH"]
+    assert len(service.messages[CONVERSATION_ID]) == 2
+    assert service.titles[CONVERSATION_ID] == "Ventas por mes"
+    assert _spooled(writer.spool_path) == []
+
+
+def test_server_errors_are_retried_then_spooled(writer, service):
+    service.fail["POST"] = [503, 502, 500]
+    assert not asyncio.run(writer._flush([_item()]))
+
+    assert service.calls == ["POST", "POST", "POST"]
+    assert len(_spooled(writer.spool_path)) == 1
+
+    asyncio.run(writer._replay_spool())
+    assert len(service.messages[CONVERSATION_ID]) == 2
+    assert _spooled(writer.spool_path) == []
+
+
+def test_rejected_group_is_dead_lettered_not_replayed(writer, service):
+    service.fail["POST"] = [400]
+    assert asyncio.run(writer._flush([_item("no-es-un-id")]))
+
+    assert service.calls == ["POST"]
+    assert _spooled(writer.spool_path) == []
+    assert [group["_id"] for group in _spooled(f"{writer.spool_path}.rejected")] == ["no-es-un-id"]
+    assert writer.get_stats()["rejected"] == 1
+
+    # Un flush posterior no vuelve a enviar el grupo rechazado
+    service.calls.clear()
+    asyncio.run(writer._flush([_item()]))
+    asyncio.run(writer._replay_spool())
+    assert service.calls == ["POST", "PATCH"]
+
+
+def test_rate_limited_is_retried(writer, service):
+    service.fail["POST"] = [429]
+    assert asyncio.run(writer._flush([_item(title=None)]))
+    assert service.calls == ["POST", "POST"]
+
+
+def test_conversation_id_pattern():
+    assert re.fullmatch(CONVERSATION_ID_PATTERN, new_conversation_id())
+    assert re.fullmatch(CONVERSATION_ID_PATTERN, CONVERSATION_ID.upper())
+    assert re.fullmatch(CONVERSATION_ID_PATTERN, "")
+    for invalid in ("123", "no-es-un-id", CONVERSATION_ID + "0", "z" * 24, "../" + CONVERSATION_ID[3:]):
+        assert not re.fullmatch(CONVERSATION_ID_PATTERN, invalid)
+
+
+def test_message_timestamps_are_utc():
+    messages = build_messages({"pregunta": "p", "sql_generado": "SELECT 1", "resultados": {}})
+    assert all(re.fullmatch(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?Z", m["timestamp"]) for m in messages)
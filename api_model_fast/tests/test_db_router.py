@@ -0,0 +1,226 @@
+"""Enrutamiento primario/réplicas con un driver falso (connect_fn inyectado)"""
+
+import psycopg2
+import pytest
+
+from app.services.db_router import MAX_FAILURES, DBNode, DBRouter
+from app.utils.exceptions import ConfigurationError, DatabaseError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        self.conn.executed.append(query)
+
+    def fetchone(self):
+        return self.conn.server.health
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.closed = 0
+        self.executed = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeServer:
+    def __init__(self, in_recovery=False, lag=0):
+        self.up = True
+        self.health = (in_recovery, lag)
+        self.connections = []
+
+
+class FakeDriver:
+    """psycopg2.connect falso: un servidor por host"""
+
+    def __init__(self, **servers):
+        self.servers = servers
+
+    def connect(self, host, **params):
+        server = self.servers[host]
+        if not server.up:
+            raise psycopg2.OperationalError(f"could not connect to server: {host}")
+        conn = FakeConnection(server)
+        server.connections.append(conn)
+        return conn
+
+
+def _router(driver, replicas=("r1", "r2"), pool_size=2, **options):
+    nodes = [DBNode("primary", "primary", {"host": "primary"}, pool_size)]
+    nodes += [DBNode(name, "replica", {"host": name}, pool_size) for name in replicas]
+    options.setdefault("strategy", "least_loaded")
+    options.setdefault("max_replica_lag_s", 30)
+    return DBRouter(
+        nodes,
+        connect_fn=driver.connect,
+        health_check_interval_s=60,
+        routes={"primary": "primary", "read": "replica", "catalog": "replica"},
+        **options,
+    )
+
+
+@pytest.fixture
+def driver():
+    return FakeDriver(primary=FakeServer(), r1=FakeServer(True), r2=FakeServer(True))
+
+
+def test_requires_one_primary(driver):
+    with pytest.raises(ConfigurationError):
+        DBRouter([DBNode("r1", "replica", {"host": "r1"}, 1)], connect_fn=driver.connect)
+
+
+def test_primary_route_never_uses_replicas(driver):
+    router = _router(driver)
+    with router.connection("primary") as conn:
+        assert conn.node.name == "primary"
+
+
+def test_read_route_prefers_least_loaded_replica(driver):
+    router = _router(driver)
+    with router.connection("read") as first:
+        with router.connection("read") as second:
+            assert {first.node.name, second.node.name} == {"r1", "r2"}
+    with router.connection("read") as third:
+        assert third.node.role == "replica"
+    assert router.primary.total_queries == 0
+    assert sorted(node.total_queries for node in router.replicas) == [1, 2]
+
+
+def test_round_robin_alternates(driver):
+    router = _router(driver, strategy="round_robin")
+    names = []
+    for _ in range(4):
+        with router.connection("read") as conn:
+            names.append(conn.node.name)
+    assert names == ["r1", "r2", "r1", "r2"]
+
+
+def test_failover_to_next_node_and_mark_down(driver):
+    router = _router(driver, replicas=("r1",))
+    driver.servers["r1"].up = False
+
+    for _ in range(MAX_FAILURES):
+        with router.connection("read") as conn:
+            assert conn.node.name == "primary"
+
+    replica = router.nodes[1]
+    assert not replica.healthy
+    assert replica.in_use == 0
+    assert "could not connect" in replica.last_error
+
+    # Caído: ya no se intenta hasta que el health check lo recupere
+    attempts = len(driver.servers["r1"].connections)
+    driver.servers["r1"].up = True
+    with router.connection("read") as conn:
+        assert conn.node.name == "primary"
+    router.check_health()
+    assert replica.healthy
+    with router.connection("read") as conn:
+        assert conn.node.name == "r1"
+    assert len(driver.servers["r1"].connections) > attempts
+
+
+def test_all_nodes_down_raises(driver):
+    router = _router(driver)
+    for server in driver.servers.values():
+        server.up = False
+    with pytest.raises(DatabaseError):
+        with router.connection("read"):
+            pass
+    assert all(node.in_use == 0 for node in router.nodes)
+
+
+def test_lagging_replica_is_excluded(driver):
+    router = _router(driver)
+    driver.servers["r1"].health = (True, 120)
+    router.check_health()
+
+    assert router.nodes[1].lag_s == 120
+    for _ in range(3):
+        with router.connection("catalog") as conn:
+            assert conn.node.name == "r2"
+
+
+def test_unreachable_replica_has_unknown_lag(driver):
+    router = _router(driver)
+    driver.servers["r1"].up = False
+    driver.servers["r2"].health = (True, 90)
+    router.check_health()
+
+    assert router.nodes[1].lag_s is None and not router.nodes[1].healthy
+    with router.connection("read") as conn:
+        assert conn.node.name == "primary"
+
+
+def test_connection_is_reused(driver):
+    router = _router(driver, replicas=())
+    with router.connection("primary") as conn:
+        raw = conn.raw
+        statements = conn.statements
+    with router.connection("primary") as conn:
+        assert conn.raw is raw
+        assert conn.statements is statements
+    assert len(driver.servers["primary"].connections) == 1
+
+
+def test_connection_error_discards_connection(driver):
+    router = _router(driver, replicas=())
+    with pytest.raises(psycopg2.OperationalError):
+        with router.connection("primary") as conn:
+            raw = conn.raw
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    primary = router.primary
+    assert raw.closed
+    assert len(primary.idle) == 0 and primary.in_use == 0
+    assert primary.failures == 1
+    with router.connection("primary") as conn:
+        assert conn.raw is not raw
+
+
+def test_query_error_rolls_back_and_keeps_connection(driver):
+    router = _router(driver, replicas=())
+    with pytest.raises(psycopg2.ProgrammingError):
+        with router.connection("primary") as conn:
+            raw = conn.raw
+            raise psycopg2.ProgrammingError("column does not exist")
+
+    assert raw.rollbacks == 1 and not raw.closed
+    assert router.primary.failures == 0
+    assert list(router.primary.idle)[0][0] is raw
+
+
+def test_pool_size_limits_idle_connections_only(driver):
+    router = _router(driver, replicas=(), pool_size=2)
+    contexts = [router.connection("primary") for _ in range(3)]
+    borrowed = [context.__enter__() for context in contexts]
+
+    # Las prestadas no tienen tope; al devolverlas solo se conservan pool_size
+    assert router.primary.in_use == 3
+    for context in contexts:
+        context.__exit__(None, None, None)
+
+    assert router.primary.in_use == 0
+    assert len(router.primary.idle) == 2
+    assert sum(conn.raw.closed for conn in borrowed) == 1
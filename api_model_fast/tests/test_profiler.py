@@ -0,0 +1,117 @@
+"""Atribución de muestras del profiler a las peticiones filtradas"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.middleware.profiling import ProfilingMiddleware
+from app.utils.profiler import SamplingProfiler, profiler
+
+
+def _spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def busy_matching():
+    _spin(0.15)
+
+
+def busy_other():
+    _spin(0.15)
+
+
+def busy_background(stop: threading.Event):
+    while not stop.is_set():
+        _spin(0.01)
+
+
+async def _app(scope, receive, send):
+    if scope["path"].startswith("/rag"):
+        # Trabajo en un hilo de to_thread y en una tarea hija, como las rutas reales
+        await asyncio.gather(asyncio.to_thread(busy_matching), asyncio.create_task(_loop_work()))
+    else:
+        await asyncio.to_thread(busy_other)
+
+
+async def _loop_work():
+    _spin(0.05)
+
+
+async def _profile(**options):
+    profiler.install(asyncio.get_running_loop())
+    session = profiler.start(seconds=5, interval_ms=2, **options)
+    middleware = ProfilingMiddleware(_app)
+    stop = threading.Event()
+    background = threading.Thread(target=busy_background, args=(stop,), daemon=True)
+    background.start()
+    try:
+        await asyncio.gather(
+            middleware({"type": "http", "path": "/rag/nl-to-sql"}, None, None),
+            middleware({"type": "http", "path": "/health"}, None, None),
+        )
+    finally:
+        stop.set()
+        profiler.stop(session)
+    return session
+
+
+@pytest.fixture(autouse=True)
+def _no_session():
+    yield
+    if profiler.session is not None:
+        profiler.stop(profiler.session)
+
+
+def test_path_filter_keeps_only_the_matching_request():
+    session = asyncio.run(_profile(path_prefix="/rag"))
+    collapsed = session.collapsed()
+
+    assert "busy_matching" in collapsed
+    assert "_loop_work" in collapsed
+    assert "busy_other" not in collapsed
+    assert "busy_background" not in collapsed
+    assert session.requests_seen == 1
+
+
+def test_latency_filter_drops_fast_requests():
+    session = asyncio.run(_profile(path_prefix="/rag", min_latency_ms=60_000))
+    assert session.requests_seen == 1
+    assert session.requests_kept == 0
+    assert session.collapsed() == ""
+
+
+def test_counts_are_integers():
+    session = asyncio.run(_profile(min_latency_ms=1))
+    counts = list(session.stacks.values())
+
+    assert counts and all(isinstance(count, int) for count in counts)
+    # Cada muestra cuenta una vez por hilo: ninguna pila supera el número de muestras
+    assert max(counts) <= session.samples
+    for line in session.collapsed().splitlines():
+        assert line.rsplit(" ", 1)[1].isdigit()
+
+
+def test_unfiltered_profile_includes_background_threads():
+    session = asyncio.run(_profile())
+    assert "busy_background" in session.collapsed()
+
+
+def test_install_keeps_previous_task_factory():
+    created = []
+
+    def factory(loop, coro, context=None):
+        created.append(coro)
+        return asyncio.Task(coro, loop=loop, context=context)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.set_task_factory(factory)
+        SamplingProfiler().install(loop)
+        await asyncio.create_task(asyncio.sleep(0))
+
+    asyncio.run(main())
+    assert created[0].__name__ == "sleep"
@@ -0,0 +1,63 @@
+"""Análisis de SQL y verificación de referencias contra el esquema cacheado"""
+
+import pytest
+
+from app.services.rag.schema_selector import TableMetadata
+from app.services.schema_checker import SchemaReferenceChecker
+from app.services.sql_analyzer import analyze_sql
+from app.utils.exceptions import SchemaReferenceError
+
+DATE_PARTS = ["DOW", "ISODOW", "EPOCH", "DOY", "CENTURY", "DECADE", "QUARTER", "WEEK", "YEAR", "MONTH"]
+
+
+class _Selector:
+    """Selector de esquema mínimo: solo lo que usa el verificador"""
+
+    schema_version = "test"
+
+    def __init__(self, tables):
+        self.tables_metadata = {
+            name: TableMetadata(name=name, keywords=set(), columns=columns, relationships={}, description="")
+            for name, columns in tables.items()
+        }
+
+
+@pytest.fixture
+def checker():
+    return SchemaReferenceChecker(
+        _Selector({"ventas": ["id", "fecha", "total", "cliente_id"], "clientes": ["id", "nombre"]})
+    )
+
+
+@pytest.mark.parametrize("part", DATE_PARTS)
+def test_extract_field_is_not_a_column(part):
+    analysis = analyze_sql(f"SELECT EXTRACT({part} FROM fecha) FROM ventas")
+    assert [column.name for column in analysis.columns] == ["fecha"]
+
+
+def test_extract_keeps_qualified_source_column():
+    analysis = analyze_sql("SELECT extract(epoch from v.fecha) FROM ventas v")
+    assert [(c.qualifier, c.name) for c in analysis.columns] == [("v", "fecha")]
+
+
+@pytest.mark.parametrize("part", DATE_PARTS)
+def test_checker_accepts_extract_date_parts(checker, part):
+    checker.check(f"SELECT EXTRACT({part} FROM fecha) AS p, SUM(total) FROM ventas GROUP BY 1")
+
+
+def test_checker_still_rejects_unknown_column_inside_extract(checker):
+    with pytest.raises(SchemaReferenceError) as error:
+        checker.check("SELECT EXTRACT(DOW FROM fecha_venta) FROM ventas")
+    assert "fecha_venta" in str(error.value)
+
+
+def test_checker_rejects_unknown_table_and_column(checker):
+    with pytest.raises(SchemaReferenceError):
+        checker.check("SELECT v.totl FROM ventas v JOIN cliente c ON c.id = v.cliente_id")
+
+
+def test_checker_accepts_aliases_and_joins(checker):
+    checker.check(
+        "SELECT c.nombre, SUM(v.total) AS total_ventas FROM ventas v "
+        "JOIN clientes c ON c.id = v.cliente_id GROUP BY c.nombre ORDER BY total_ventas DESC"
+    )
@@ -0,0 +1,81 @@
+"""Codificación JSON compartida (orjson + hook para tipos de PostgreSQL)"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+import orjson
+import pytest
+
+from app.utils.serialization import JSONBytesResponse, PreEncodedDict, dumps, loads
+
+UTC_MINUS_5 = timezone(timedelta(hours=-5))
+
+
+def test_decimal_as_number():
+    assert loads(dumps({"total": Decimal("12.50")})) == {"total": 12.5}
+
+
+def test_dates_and_times():
+    value = {
+        "fecha": date(2024, 3, 1),
+        "creado": datetime(2024, 3, 1, 8, 30, 15, 250000),
+        "creado_tz": datetime(2024, 3, 1, 8, 30, tzinfo=timezone.utc),
+        "hora": time(8, 30),
+        "duracion": timedelta(minutes=2, seconds=3),
+    }
+    assert loads(dumps(value)) == {
+        "fecha": "2024-03-01",
+        "creado": "2024-03-01T08:30:15.250000",
+        "creado_tz": "2024-03-01T08:30:00+00:00",
+        "hora": "08:30:00",
+        "duracion": 123.0,
+    }
+
+
+def test_time_with_timezone():
+    # timetz de PostgreSQL: orjson lo rechaza sin pasar por el hook
+    row = [1, time(8, 30, tzinfo=UTC_MINUS_5), datetime(2024, 3, 1, tzinfo=UTC_MINUS_5), date(2024, 3, 1)]
+    assert loads(dumps({"data": [row]})) == {
+        "data": [[1, "08:30:00-05:00", "2024-03-01T00:00:00-05:00", "2024-03-01"]]
+    }
+
+
+def test_time_with_timezone_in_pre_encoded_dict():
+    result = PreEncodedDict({"columns": ["hora"], "data": [[time(23, 59, tzinfo=timezone.utc)]]})
+    assert loads(result.json) == {"columns": ["hora"], "data": [["23:59:00+00:00"]]}
+
+
+def test_bytea_as_base64():
+    assert loads(dumps({"archivo": b"\x00\xffdatos", "vista": memoryview(b"abc")})) == {
+        "archivo": "AP9kYXRvcw==",
+        "vista": "YWJj",
+    }
+
+
+def test_numpy_arrays_and_scalars():
+    value = {"serie": np.array([1, 2, 3]), "media": np.float64(2.5), "n": np.int64(3)}
+    assert loads(dumps(value)) == {"serie": [1, 2, 3], "media": 2.5, "n": 3}
+
+
+def test_unsupported_type_raises():
+    with pytest.raises(TypeError):
+        dumps({"valor": object.__new__(type("Opaco", (), {"__slots__": ()}))})
+
+
+@pytest.mark.skipif(not hasattr(orjson, "Fragment"), reason="orjson.Fragment requiere orjson >= 3.9")
+def test_pre_encoded_dict_nested():
+    result = PreEncodedDict({"columns": ["id", "total"], "data": [[1, Decimal("9.90")]]})
+    document = {"status": "ok", "query_result": result, "items": [result]}
+    expected = {"columns": ["id", "total"], "data": [[1, 9.9]]}
+
+    assert loads(dumps(document)) == {"status": "ok", "query_result": expected, "items": [expected]}
+    assert loads(JSONBytesResponse(content=document).body)["query_result"] == expected
+
+
+@pytest.mark.skipif(not hasattr(orjson, "Fragment"), reason="orjson.Fragment requiere orjson >= 3.9")
+def test_pre_encoded_dict_reuses_bytes():
+    result = PreEncodedDict({"data": [[1]]})
+    # Los bytes guardados son los que se incrustan, aunque el dict cambie después
+    dict.__setitem__(result, "data", [[2]])
+    assert loads(dumps({"query_result": result})) == {"query_result": {"data": [[1]]}}
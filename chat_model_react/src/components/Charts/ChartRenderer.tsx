@@ -1,5 +1,6 @@
 import React from 'react';
 import { Card } from 'antd';
+import { resolveApiUrl } from '../../utils';
 
 
 interface ChartRendererProps {
@@ -11,7 +12,7 @@ const ChartRenderer: React.FC<ChartRendererProps> = ({ chartData }) => {
     
       return (
         <img 
-          src={chartData} 
+          src={resolveApiUrl(chartData)} 
           alt="Chart" 
           style={{ maxWidth: '100%', height: 'auto' }}
         />
@@ -1,9 +1,9 @@
-import React from 'react';
-import { Card, Tag, Space, Table } from 'antd';
+import React, { useState } from 'react';
+import { Alert, Button, Card, Tag, Space, Table } from 'antd';
 import { UserOutlined, RobotOutlined } from '@ant-design/icons';
-import type { Message } from '../../types';
+import type { Message, ResultData } from '../../types';
 import ChartRenderer from '../Charts/ChartRenderer';
-import { isContent } from '../../utils';
+import { isContent, resolveApiUrl } from '../../utils';
 import { Prism as SyntaxHighlighter } from 'react-syntax-highlighter';
 import { vscDarkPlus } from 'react-syntax-highlighter/dist/esm/styles/prism';
 
@@ -13,6 +13,26 @@ interface MessageBubbleProps {
 
 const MessageBubble: React.FC<MessageBubbleProps> = ({ message }) => {
   const isUser = message.isUser;
+  // Resultado completo cargado desde el artefacto (conversaciones guardadas)
+  const [fullResult, setFullResult] = useState<ResultData | null>(null);
+  const [loadingFull, setLoadingFull] = useState(false);
+  const [fullError, setFullError] = useState<string | null>(null);
+
+  const loadFullResult = async (url: string) => {
+    setLoadingFull(true);
+    setFullError(null);
+    try {
+      const response = await fetch(resolveApiUrl(url));
+      if (!response.ok) {
+        throw new Error(response.status === 404 ? 'el resultado ya no está disponible' : `error ${response.status}`);
+      }
+      setFullResult(await response.json());
+    } catch (error) {
+      setFullError(error instanceof Error ? error.message : 'error desconocido');
+    } finally {
+      setLoadingFull(false);
+    }
+  };
 
   return (
     <div style={{
@@ -76,17 +96,39 @@ const MessageBubble: React.FC<MessageBubbleProps> = ({ message }) => {
           {
             (() => {
               const content = message.content;
-              return isContent(content) && content && (
+              if (!isContent(content) || !content) return null;
+              const result = fullResult ?? content.query_result;
+              const artifact = content.query_result.artifact;
+              return (
                 <Card size="small" title="Results" style={{ marginTop: '8px' }}>
+                  {artifact && !fullResult && (
+                    <Alert
+                      type="info"
+                      showIcon
+                      style={{ marginBottom: '8px' }}
+                      message={`Vista previa: primeras ${content.query_result.preview_rows ?? result.data.length} filas del resultado`}
+                      description={fullError ? `No se pudo cargar el resultado completo: ${fullError}` : undefined}
+                      action={
+                        <Space>
+                          <Button size="small" loading={loadingFull} onClick={() => loadFullResult(artifact.url)}>
+                            Cargar todo
+                          </Button>
+                          <Button size="small" type="link" href={resolveApiUrl(artifact.url)} target="_blank">
+                            Descargar
+                          </Button>
+                        </Space>
+                      }
+                    />
+                  )}
                   <Table
-                    dataSource={content.query_result.data.map((row, index) => {
+                    dataSource={result.data.map((row, index) => {
                       const rowData: Record<string, any> = { key: index };
-                      content.query_result.columns.forEach((col, colIndex) => {
+                      result.columns.forEach((col, colIndex) => {
                         rowData[col] = row[colIndex];
                       });
                       return rowData;
                     })}
-                    columns={content.query_result.columns.map((col) => ({
+                    columns={result.columns.map((col) => ({
                       title: col,
                       dataIndex: col,
                       key: col,
@@ -5,9 +5,19 @@ export interface ChartData {
   needs_chart: boolean;
 }
 
+export interface ArtifactRef {
+  artifact: string;
+  url: string;
+  content_type: string;
+  size: number;
+}
+
 export interface ResultData {
   columns: string[];
   data: any[][];
+  // Conversaciones guardadas: solo las primeras filas y la referencia al resultado completo
+  preview_rows?: number;
+  artifact?: ArtifactRef;
 }
 
 export interface ApiResponse {
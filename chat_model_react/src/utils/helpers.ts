@@ -2,3 +2,16 @@ import type { Content } from '../types/chat.type';
 
 export const isContent = (value: any): value is Content =>
   value && typeof value === 'object' && 'query_sql' in value;
+
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL;
+
+// Las URLs de artefactos pueden venir relativas (/rag/artifacts/...) cuando la API
+// no tiene ARTIFACT_BASE_URL: se resuelven contra el origen de la API, no del frontend
+export const resolveApiUrl = (url: string): string => {
+  if (!url || url.startsWith('data:') || !API_BASE_URL) return url;
+  try {
+    return new URL(url, API_BASE_URL).toString();
+  } catch {
+    return url;
+  }
+};